@@ -1,18 +1,29 @@
 import os
+import re
 import json
 import time
 import asyncio
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, Future
 from datetime import datetime
-from typing import Dict, Any, List, Optional, Union, Generator
+from typing import Dict, Any, List, Optional, Union, AsyncGenerator, Coroutine, Callable, Deque
 from dataclasses import dataclass, field
-import openai
+from functools import lru_cache, reduce
+import importlib.util
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
+try:
+    import httpx
+except ImportError:  # Sem httpx o SDK gerencia o próprio pool de conexões
+    httpx = None
+
 from models.models import Thread, Message, ToolCall, Event, Result, MessageRole
-from agent.memory import get_memory, AgentMemory
+from agent.memory import get_memory, AgentMemory, BackgroundThreadWriter
 from agent.context import create_context_manager, ContextManager
 from agent.tools import get_tool_registry, ToolRegistry, parse_function_call
 from agent.logger import get_logger, log_operation, StructuredLogger
+from agent.llm_cache import get_llm_cache, LLMCache
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -31,25 +42,40 @@ class AgentConfig:
     model: str = "mistralai/mistral-7b-instruct"
     api_key: Optional[str] = field(default_factory=lambda: os.getenv("OPENROUTER_API_KEY"))
     api_base: str = "https://openrouter.ai/api/v1"
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    request_timeout_seconds: float = 30.0  # Timeout por requisição (retries ficam com o agente)
     max_tokens: int = 2000
     temperature: float = 0.7
     
     # Agent Behavior
     max_conversation_turns: int = 100
     max_function_calls_per_turn: int = 5
+    usage_report_interval: int = 10  # Turnos entre registros agregados de uso de tokens
+    
+    # Batch Processing
+    batch_concurrency: int = 8  # Requisições simultâneas em batch_process
+    batch_requests_per_minute: int = 500
     enable_function_calling: bool = True
+    tool_concurrency_limit: int = 8  # Máximo de ferramentas executando em paralelo
     auto_save_memory: bool = True
+    enable_streaming: bool = True  # Tokens exibidos à medida que chegam
     
     # Context Management
     max_context_length: int = 8000
     max_messages_in_context: int = 50
-    context_strategy: str = "default"  # "default", "recent_only", "compressed", "minimal"
+    context_strategy: str = "default"  # "default", "recent_only", "compressed", "minimal", "stable_prefix"
     
     # Retry and Resilience
     max_retries: int = 3
     retry_delay_seconds: float = 1.0
     exponential_backoff: bool = True
     
+    # LLM Response Cache
+    enable_llm_cache: bool = True
+    llm_cache_max_temperature: float = 0.2  # Acima disso (respostas amostradas) não há cache
+    llm_cache_ttl_seconds: int = 86400
+    
     # Memory and Persistence
     memory_db_path: str = "memory.db"
     enable_memory_persistence: bool = True
@@ -69,9 +95,21 @@ class AgentConfig:
         if self.temperature < 0 or self.temperature > 2:
             errors.append("temperature deve estar entre 0 e 2")
         
+        if self.request_timeout_seconds <= 0:
+            errors.append("request_timeout_seconds deve ser positivo")
+        
         if self.max_conversation_turns < 1:
             errors.append("max_conversation_turns deve ser pelo menos 1")
         
+        if self.tool_concurrency_limit < 1:
+            errors.append("tool_concurrency_limit deve ser pelo menos 1")
+        
+        if self.usage_report_interval < 1:
+            errors.append("usage_report_interval deve ser pelo menos 1")
+        
+        if self.batch_concurrency < 1 or self.batch_requests_per_minute < 1:
+            errors.append("batch_concurrency e batch_requests_per_minute devem ser pelo menos 1")
+        
         if errors:
             return Result.error("; ".join(errors))
         
@@ -94,7 +132,12 @@ class FunctionalAgent:
     - Tratamento robusto de erros
     """
     
-    def __init__(self, config: Optional[AgentConfig] = None, session_id: Optional[str] = None):
+    # Comandos do loop interativo (comparados já em minúsculas)
+    _QUIT_CMDS = frozenset({"quit", "exit", "sair", "q"})
+    _HELP_CMDS = frozenset({"help", "ajuda", "h"})
+    
+    def __init__(self, config: Optional[AgentConfig] = None, session_id: Optional[str] = None,
+                 client: Optional[AsyncOpenAI] = None):
         # Configuração
         self.config = config or AgentConfig()
         
@@ -106,21 +149,69 @@ class FunctionalAgent:
         # Componentes principais
         self.logger = get_logger()
         self.memory = get_memory(self.config.memory_db_path)
+        # Sem o ContextCache global: _prepare_context já memoiza por versão da thread
         self.context_manager = create_context_manager(
             max_context_length=self.config.max_context_length,
-            max_messages=self.config.max_messages_in_context
+            max_messages=self.config.max_messages_in_context,
+            use_cache=False
         )
         self.tool_registry = get_tool_registry()
+        self._memory_writer = BackgroundThreadWriter(self.memory) if self.config.enable_memory_persistence else None
+        self.llm_cache: Optional[LLMCache] = (
+            get_llm_cache(self.config.memory_db_path, self.config.llm_cache_ttl_seconds)
+            if self.config.enable_llm_cache else None
+        )
         
         # Estado do agente
         self.session_id = session_id or f"session_{datetime.utcnow().timestamp()}"
         self.current_thread: Optional[Thread] = None
         self.is_running = False
+        self.is_closed = False
         self.total_turns = 0
         
-        # Configurar OpenAI
-        openai.api_key = self.config.api_key
-        openai.api_base = self.config.api_base
+        # Middlewares (hooks pré-compostos; ver use_middlewares)
+        self.middlewares: List["AgentMiddleware"] = []
+        self._middleware = MiddlewareChain()
+        
+        # Uso de tokens acumulado desde o último registro (ver _flush_usage)
+        self._usage = self._empty_usage()
+        
+        # Payload de ferramentas no formato da API, derivado da lista memoizada do registro
+        self._tools_source: Optional[List[Dict[str, Any]]] = None
+        self._tools_payload: Optional[List[Dict[str, Any]]] = None
+        
+        # Comandos especiais sem argumentos (métodos ligados uma única vez)
+        self._command_handlers: Dict[str, Callable[[], None]] = {
+            "/stats": self._show_stats,
+            "/tools": self._show_tools,
+            "/memory": self._show_memory_info,
+            "/context": self._show_context_info,
+            "/clear": self._clear_conversation
+        }
+        
+        # Memoização por versão da thread: (thread, chave, valor)
+        self._context_cache: Optional[tuple] = None
+        self._context_metadata_cache: Optional[tuple] = None
+        
+        # Cliente LLM por instância (sem estado global no módulo openai).
+        # Um cliente injetado (ex.: compartilhado com subagentes) não é fechado aqui.
+        self._owns_client = client is None
+        self._client = client or create_llm_client(self.config)
+        
+        # Loop de eventos da interface síncrona, reutilizado entre chamadas
+        # para manter o pool de conexões HTTP do cliente
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Fechamento do cliente agendado no loop do chamador (uso só assíncrono)
+        self._client_close_task: Optional[asyncio.Task] = None
+        
+        # Pool dedicado para ferramentas síncronas (não bloqueiam o loop)
+        self._tool_pool = ThreadPoolExecutor(
+            max_workers=self.config.tool_concurrency_limit,
+            thread_name_prefix="agent-tool"
+        )
+        
+        # Pool para exportações (serialização + escrita fora do loop de input)
+        self._export_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="agent-export")
         
         # Inicialização
         self._initialize_agent()
@@ -141,7 +232,7 @@ class FunctionalAgent:
                         self.session_id = self.current_thread.session_id
                         self.logger.log_info(
                             f"Thread carregada da memória: {self.session_id}",
-                            message_count=len(self.current_thread.messages)
+                            message_count=self.current_thread.message_count
                         )
                     else:
                         # Criar nova thread
@@ -186,14 +277,16 @@ class FunctionalAgent:
                     user_input = input("👤 Você: ").strip()
                     
                     # Comandos especiais
-                    if user_input.lower() in ['quit', 'exit', 'sair', 'q']:
+                    lowered = user_input.lower()
+                    
+                    if lowered in self._QUIT_CMDS:
                         break
                     
-                    if user_input.lower() in ['help', 'ajuda', 'h']:
+                    if lowered in self._HELP_CMDS:
                         self._show_help()
                         continue
                     
-                    if user_input.lower().startswith('/'):
+                    if lowered.startswith('/'):
                         self._handle_command(user_input)
                         continue
                     
@@ -201,11 +294,32 @@ class FunctionalAgent:
                         print("💭 Digite uma mensagem ou 'help' para ver comandos disponíveis.\n")
                         continue
                     
-                    # Processar mensagem do usuário
-                    response_result = self.process_user_message(user_input)
+                    # Processar mensagem do usuário (tokens impressos ao chegar)
+                    streamed_parts: List[str] = []
+                    
+                    def print_token(token: str) -> None:
+                        if not streamed_parts:
+                            print("🤖 Agente: ", end="", flush=True)
+                        streamed_parts.append(token)
+                        print(token, end="", flush=True)
+                    
+                    response_result = self.process_user_message(user_input, on_token=print_token)
+                    
+                    if streamed_parts:
+                        print()
                     
                     if response_result.success:
-                        print(f"🤖 Agente: {response_result.data}")
+                        streamed_text = "".join(streamed_parts)
+                        
+                        if not streamed_parts:
+                            print(f"🤖 Agente: {response_result.data}")
+                        elif response_result.data.startswith(streamed_text):
+                            # Complemento gerado após o stream (ex.: resultados de ferramentas)
+                            remainder = response_result.data[len(streamed_text):].strip()
+                            if remainder:
+                                print(remainder)
+                        else:
+                            print(f"🤖 Agente: {response_result.data}")
                     else:
                         print(f"❌ Erro: {response_result.error}")
                     
@@ -223,28 +337,113 @@ class FunctionalAgent:
                     continue
         
         finally:
-            self._shutdown()
+            self.close()
     
-    def process_user_message(self, message: str) -> Result:
+    def close(self) -> None:
+        """
+        Encerra o agente: salva o estado, drena gravações e libera recursos.
+        Idempotente; também chamado ao sair de um bloco with.
+        """
+        self._shutdown()
+    
+    def __enter__(self) -> "FunctionalAgent":
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+    
+    def use_middlewares(self, middlewares: List["AgentMiddleware"]) -> None:
+        """
+        Define os middlewares do agente e pré-compõe seus hooks.
+        A composição ocorre aqui, não a cada mensagem.
+        """
+        self.middlewares = list(middlewares)
+        self._middleware = MiddlewareChain.compile(self.middlewares)
+    
+    def process_user_message(self, message: str,
+                             on_token: Optional[Callable[[str], None]] = None) -> Result:
         """
         Processa uma mensagem do usuário e retorna resposta.
-        Função principal para integração programática.
+        Interface síncrona para CLI e integrações legadas.
+        """
+        return self._run_sync(self.process_user_message_async(message, on_token))
+    
+    def batch_process(self, messages_list: List[str]) -> List[Result]:
+        """
+        Processa várias mensagens independentes em paralelo.
+        Interface síncrona de abatch_process.
+        """
+        return self._run_sync(self.abatch_process(messages_list))
+    
+    async def abatch_process(self, messages_list: List[str]) -> List[Result]:
+        """
+        Responde cada mensagem em uma thread própria, sem ferramentas e sem
+        alterar a conversa atual. Concorrência limitada por batch_concurrency
+        e taxa por batch_requests_per_minute; resultados na ordem de entrada.
+        """
+        semaphore = asyncio.Semaphore(self.config.batch_concurrency)
+        limiter = AsyncRequestLimiter(self.config.batch_requests_per_minute)
+        
+        async def answer(message: str) -> Result:
+            thread = Thread(
+                messages=[Message(role="user", content=message)],
+                session_id=self.session_id
+            )
+            
+            try:
+                context_result = self.context_manager.prepare_context(
+                    thread,
+                    strategy=self.config.context_strategy
+                )
+                if not context_result.success:
+                    return Result.error(f"Erro ao preparar contexto: {context_result.error}")
+                
+                async with semaphore:
+                    llm_result = await self._acall_with_retry(
+                        context_result.data["messages"],
+                        limiter=limiter
+                    )
+            except Exception as e:
+                return Result.error(f"Erro ao processar mensagem: {str(e)}")
+            
+            return llm_result.map(lambda data: data["content"])
+        
+        results = await asyncio.gather(*(answer(message) for message in messages_list))
+        
+        self.logger.log_info(
+            "Lote processado",
+            total=len(results),
+            failed=sum(1 for result in results if not result.success),
+            session_id=self.session_id
+        )
+        self._flush_usage()
+        
+        return list(results)
+    
+    async def process_user_message_async(self, message: str,
+                                         on_token: Optional[Callable[[str], None]] = None) -> Result:
+        """
+        Versão assíncrona do processamento de mensagens.
+        Função principal para integração programática; on_token recebe
+        os fragmentos de texto durante o streaming.
         """
         if not self.current_thread:
             return Result.error("Agente não inicializado")
         
-        start_time = datetime.utcnow()
+        middleware = self._middleware
         
         with log_operation(self.logger, "process_user_message", self.session_id):
             try:
+                if middleware.before_user_message:
+                    message = middleware.before_user_message(message, self.session_id)
+                
                 # Adicionar mensagem do usuário à thread
                 user_message = Message(
                     role="user",
-                    content=message,
-                    timestamp=start_time
+                    content=message
                 )
                 
-                self.current_thread = self.current_thread.add_message(user_message)
+                self.current_thread.append_message(user_message)
                 self.total_turns += 1
                 
                 # Log da mensagem do usuário
@@ -255,13 +454,18 @@ class FunctionalAgent:
                 ))
                 
                 # Gerar resposta do agente
-                response_result = self._generate_agent_response()
+                response_result = await self._generate_agent_response(on_token)
                 
                 if not response_result.success:
                     return response_result
                 
                 assistant_response = response_result.data
                 
+                if middleware.after_user_message:
+                    assistant_response = middleware.after_user_message(
+                        assistant_response, message, self.session_id
+                    )
+                
                 # Adicionar resposta à thread
                 assistant_message = Message(
                     role="assistant",
@@ -269,7 +473,7 @@ class FunctionalAgent:
                     timestamp=datetime.utcnow()
                 )
                 
-                self.current_thread = self.current_thread.add_message(assistant_message)
+                self.current_thread.append_message(assistant_message)
                 
                 # Salvar na memória se habilitado
                 if self.config.auto_save_memory and self.config.enable_memory_persistence:
@@ -282,70 +486,191 @@ class FunctionalAgent:
                     session_id=self.session_id
                 ))
                 
+                if self.total_turns % self.config.usage_report_interval == 0:
+                    self._flush_usage()
+                
                 return Result.ok(assistant_response)
                 
+            except MiddlewareReject as reject:
+                # Recusa de middleware: convertida em Result uma única vez, aqui
+                return Result.error(reject.reason)
+                
             except Exception as e:
+                if middleware.on_error:
+                    middleware.on_error(e, "process_user_message", self.session_id)
+                
                 error_msg = f"Erro ao processar mensagem: {str(e)}"
                 self.logger.log_error(error_msg, session_id=self.session_id)
                 return Result.error(error_msg)
     
-    def _generate_agent_response(self) -> Result:
+    def _run_sync(self, coro: Coroutine) -> Any:
+        """
+        Executa corrotina no loop de eventos do agente.
+        O loop é criado sob demanda e reutilizado até o shutdown.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass  # Nenhum loop rodando nesta thread: caminho normal
+        else:
+            coro.close()
+            raise RuntimeError(
+                "Interface síncrona chamada dentro de um loop de eventos em execução "
+                "(ex.: Jupyter, FastAPI); use process_user_message_async / abatch_process"
+            )
+        
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        
+        return self._loop.run_until_complete(coro)
+    
+    async def _generate_agent_response(self, on_token: Optional[Callable[[str], None]] = None) -> Result:
         """
         Gera resposta do agente usando o LLM com tool use.
-        Implementa retry logic e tratamento de function calls.
+        Retries ficam em _acall_with_retry; ferramentas executam uma única vez.
         """
+        try:
+            # Preparar contexto
+            context_result = self._prepare_context()
+            
+            if not context_result.success:
+                return Result.error(f"Erro ao preparar contexto: {context_result.error}")
+            
+            messages = context_result.data["messages"]
+            
+            # Preparar ferramentas se habilitadas
+            tools = None
+            if self.config.enable_function_calling:
+                available_tools = self.tool_registry.get_available_tools()
+                if available_tools:
+                    tools = available_tools
+            
+            # Chamar LLM
+            llm_result = await self._acall_with_retry(messages, tools, on_token)
+            
+            if not llm_result.success:
+                return llm_result
+            
+            # Processar resposta (pode incluir function calls)
+            final_response = await self._process_llm_response(llm_result.data)
+            
+            return Result.ok(final_response)
+            
+        except Exception as e:
+            return Result.error(f"Erro ao gerar resposta: {str(e)}")
+    
+    async def _acall_with_retry(self, messages: List[Dict[str, Any]],
+                                tools: Optional[List[Dict[str, Any]]] = None,
+                                on_token: Optional[Callable[[str], None]] = None,
+                                limiter: Optional["AsyncRequestLimiter"] = None) -> Result:
+        """
+        Chama o LLM com retry e backoff; compõe com asyncio.gather.
+        limiter, se informado, é consultado antes de cada tentativa. Não há
+        retry depois que on_token recebeu texto (evita saída duplicada).
+        """
+        middleware = self._middleware
+        
+        tokens_emitted = False
+        if on_token:
+            forward_token = on_token
+            
+            def on_token(token: str) -> None:
+                nonlocal tokens_emitted
+                tokens_emitted = True
+                forward_token(token)
+        
+        if middleware.before_llm_call:
+            hook_result = middleware.before_llm_call(messages, self.session_id)
+            if not hook_result.success:
+                return hook_result
+            messages = hook_result.data
+        
         for attempt in range(self.config.max_retries):
             try:
-                # Preparar contexto
-                context_result = self.context_manager.prepare_context(
-                    self.current_thread,
-                    strategy=self.config.context_strategy
-                )
-                
-                if not context_result.success:
-                    return Result.error(f"Erro ao preparar contexto: {context_result.error}")
-                
-                context_data = context_result.data
-                messages = context_data["messages"]
-                
-                # Preparar ferramentas se habilitadas
-                tools = None
-                if self.config.enable_function_calling:
-                    available_tools = self.tool_registry.get_available_tools()
-                    if available_tools:
-                        tools = available_tools
-                
-                # Chamar LLM
-                llm_result = self._call_llm(messages, tools)
+                if limiter:
+                    await limiter.acquire()
                 
-                if not llm_result.success:
-                    if attempt < self.config.max_retries - 1:
-                        delay = self._calculate_retry_delay(attempt)
-                        self.logger.log_info(f"Tentativa {attempt + 1} falhou, tentando novamente em {delay}s")
-                        time.sleep(delay)
-                        continue
-                    else:
-                        return llm_result
+                llm_result = await self._acall_llm(messages, tools, on_token)
                 
-                response_data = llm_result.data
+                if llm_result.success:
+                    if middleware.after_llm_call:
+                        return middleware.after_llm_call(llm_result.data, self.session_id)
+                    return llm_result
                 
-                # Processar resposta (pode incluir function calls)
-                final_response = self._process_llm_response(response_data)
+                if tokens_emitted:
+                    return Result.error(f"Stream interrompido após emitir texto parcial: {llm_result.error}")
                 
-                return Result.ok(final_response)
+                if attempt < self.config.max_retries - 1:
+                    delay = self._calculate_retry_delay(attempt)
+                    self.logger.log_info(f"Tentativa {attempt + 1} falhou, tentando novamente em {delay}s")
+                    await asyncio.sleep(delay)
+                else:
+                    return llm_result
                 
             except Exception as e:
+                if tokens_emitted:
+                    return Result.error(f"Stream interrompido após emitir texto parcial: {str(e)}")
+                
                 if attempt < self.config.max_retries - 1:
                     delay = self._calculate_retry_delay(attempt)
                     self.logger.log_error(f"Tentativa {attempt + 1} falhou: {str(e)}, tentando novamente em {delay}s")
-                    time.sleep(delay)
-                    continue
+                    await asyncio.sleep(delay)
                 else:
                     return Result.error(f"Falha após {self.config.max_retries} tentativas: {str(e)}")
         
         return Result.error("Número máximo de tentativas excedido")
     
-    def _call_llm(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None) -> Result:
+    def _context_key(self) -> tuple:
+        """
+        Chave de memoização do contexto da thread atual.
+        Função pura de derivação.
+        """
+        return (
+            self.current_thread.version_id,
+            self.config.context_strategy,
+            self.config.max_context_length,
+            self.config.max_messages_in_context
+        )
+    
+    def _prepare_context(self) -> Result:
+        """
+        Prepara contexto da thread atual, memoizado pela versão da thread.
+        Só é recalculado quando a thread muda.
+        """
+        thread = self.current_thread
+        key = self._context_key()
+        
+        cached = self._context_cache
+        if cached and cached[0] is thread and cached[1] == key:
+            return cached[2]
+        
+        context_result = self.context_manager.prepare_context(
+            thread,
+            strategy=self.config.context_strategy
+        )
+        
+        if context_result.success:
+            self._context_cache = (thread, key, context_result)
+        
+        return context_result
+    
+    def _get_context_metadata(self) -> Dict[str, Any]:
+        """
+        Metadados do contexto atual, memoizados pela versão da thread.
+        """
+        thread = self.current_thread
+        key = self._context_key()
+        
+        cached = self._context_metadata_cache
+        if cached and cached[0] is thread and cached[1] == key:
+            return cached[2]
+        
+        metadata = self.context_manager.builder.extract_context_metadata(thread)
+        self._context_metadata_cache = (thread, key, metadata)
+        return metadata
+    
+    async def _acall_llm(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None,
+                         on_token: Optional[Callable[[str], None]] = None) -> Result:
         """
         Chama o LLM (OpenAI/OpenRouter) com os parâmetros configurados.
         Função com efeito colateral de rede.
@@ -361,8 +686,22 @@ class FunctionalAgent:
             
             # Adicionar ferramentas se disponíveis
             if tools and self.config.enable_function_calling:
-                call_params["functions"] = tools
-                call_params["function_call"] = "auto"
+                call_params["tools"] = self._get_tools_payload(tools)
+                call_params["tool_choice"] = "auto"
+            
+            # Consultar cache apenas para chamadas (quase) determinísticas
+            cache_key = None
+            if self.llm_cache and self.config.temperature <= self.config.llm_cache_max_temperature:
+                cache_key = LLMCache.make_key(call_params)
+                cached_response = await self.llm_cache.aget(cache_key)
+                
+                if cached_response is not None:
+                    self.logger.log_info(
+                        "Resposta LLM obtida do cache",
+                        model=self.config.model,
+                        session_id=self.session_id
+                    )
+                    return Result.ok(cached_response)
             
             # Log da chamada (sem exibir API key)
             self.logger.log_info(
@@ -373,31 +712,38 @@ class FunctionalAgent:
                 session_id=self.session_id
             )
             
-            # Fazer a chamada
-            response = openai.ChatCompletion.create(**call_params)
+            # Fazer a chamada (não bloqueia o loop de eventos)
+            started_ns = time.perf_counter_ns()
             
-            # Extrair dados da resposta
-            choice = response.choices[0]
-            message = choice.message
+            if self.config.enable_streaming:
+                stream = await self._client.chat.completions.create(
+                    **call_params,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                response_data = await self._consume_stream(stream, on_token)
+            else:
+                response = await self._client.chat.completions.create(**call_params)
+                
+                # Extrair dados da resposta
+                choice = response.choices[0]
+                message = choice.message
+                
+                response_data = {
+                    "content": message.content or "",
+                    "tool_calls": [tc.model_dump() for tc in message.tool_calls] if message.tool_calls else None,
+                    "finish_reason": choice.finish_reason,
+                    "usage": response.usage.model_dump() if response.usage else {}
+                }
             
-            response_data = {
-                "content": message.get("content", ""),
-                "function_call": message.get("function_call"),
-                "finish_reason": choice.finish_reason,
-                "usage": response.get("usage", {})
-            }
+            # Acumular uso de tokens e latência (registrados em lote)
+            self._record_usage(
+                response_data["usage"],
+                (time.perf_counter_ns() - started_ns) / 1e6
+            )
             
-            # Log do uso de tokens
-            usage = response_data["usage"]
-            if usage:
-                self.logger.log_info(
-                    "Resposta LLM recebida",
-                    prompt_tokens=usage.get("prompt_tokens", 0),
-                    completion_tokens=usage.get("completion_tokens", 0),
-                    total_tokens=usage.get("total_tokens", 0),
-                    finish_reason=response_data["finish_reason"],
-                    session_id=self.session_id
-                )
+            if cache_key:
+                await self.llm_cache.aset(cache_key, self.config.model, response_data)
             
             return Result.ok(response_data)
             
@@ -406,58 +752,211 @@ class FunctionalAgent:
             self.logger.log_error(error_msg, session_id=self.session_id)
             return Result.error(error_msg)
     
-    def _process_llm_response(self, response_data: Dict[str, Any]) -> str:
+    def _get_tools_payload(self, tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Envolve os schemas no formato tools da API.
+        Recalculado apenas quando o registro devolve uma nova lista.
+        """
+        if tools is not self._tools_source:
+            self._tools_source = tools
+            self._tools_payload = [{"type": "function", "function": schema} for schema in tools]
+        
+        return self._tools_payload
+    
+    @staticmethod
+    def _empty_usage() -> Dict[str, Any]:
+        """Contadores zerados de uso do LLM"""
+        return {
+            "llm_calls": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0,
+            "llm_latency_ms": 0.0
+        }
+    
+    def _record_usage(self, usage: Dict[str, Any], latency_ms: float) -> None:
+        """
+        Acumula uso de tokens e latência de uma chamada ao LLM.
+        Sem I/O - o registro ocorre em _flush_usage.
+        """
+        totals = self._usage
+        totals["llm_calls"] += 1
+        totals["llm_latency_ms"] += latency_ms
+        
+        if usage:
+            totals["prompt_tokens"] += usage.get("prompt_tokens") or 0
+            totals["completion_tokens"] += usage.get("completion_tokens") or 0
+            totals["total_tokens"] += usage.get("total_tokens") or 0
+    
+    def _flush_usage(self) -> None:
+        """
+        Registra o uso acumulado em um único evento e zera os contadores.
+        Chamado a cada usage_report_interval turnos e no shutdown.
         """
-        Processa resposta do LLM, incluindo execução de function calls.
-        Retorna resposta final formatada.
+        totals = self._usage
+        if not totals["llm_calls"]:
+            return
+        
+        self._usage = self._empty_usage()
+        self.logger.log_info(
+            "Uso do LLM",
+            model=self.config.model,
+            llm_calls=totals["llm_calls"],
+            prompt_tokens=totals["prompt_tokens"],
+            completion_tokens=totals["completion_tokens"],
+            total_tokens=totals["total_tokens"],
+            llm_latency_ms=round(totals["llm_latency_ms"], 3),
+            session_id=self.session_id
+        )
+    
+    async def _consume_stream(self, stream: Any, on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Consome o stream de chunks repassando o texto para on_token.
+        Tool calls são montadas a partir dos fragmentos e só ficam
+        disponíveis ao final do stream.
+        """
+        content_parts: List[str] = []
+        tool_calls_by_index: Dict[int, Dict[str, Any]] = {}
+        finish_reason = None
+        usage: Dict[str, Any] = {}
+        
+        async for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage.model_dump()
+            
+            if not chunk.choices:
+                continue
+            
+            choice = chunk.choices[0]
+            delta = choice.delta
+            
+            if delta.content:
+                content_parts.append(delta.content)
+                if on_token:
+                    on_token(delta.content)
+            
+            for tool_call_delta in delta.tool_calls or []:
+                entry = tool_calls_by_index.setdefault(tool_call_delta.index, {
+                    "id": None,
+                    "type": "function",
+                    "function": {"name": "", "arguments": ""}
+                })
+                
+                if tool_call_delta.id:
+                    entry["id"] = tool_call_delta.id
+                
+                if tool_call_delta.function:
+                    if tool_call_delta.function.name:
+                        entry["function"]["name"] += tool_call_delta.function.name
+                    if tool_call_delta.function.arguments:
+                        entry["function"]["arguments"] += tool_call_delta.function.arguments
+            
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+        
+        return {
+            "content": "".join(content_parts),
+            "tool_calls": [tool_calls_by_index[i] for i in sorted(tool_calls_by_index)] or None,
+            "finish_reason": finish_reason,
+            "usage": usage
+        }
+    
+    async def _process_llm_response(self, response_data: Dict[str, Any]) -> str:
+        """
+        Processa resposta do LLM, incluindo execução de tool calls.
+        Chamadas independentes executam em paralelo; a ordem é preservada.
         """
         content = response_data.get("content", "")
-        function_call = response_data.get("function_call")
+        tool_calls = response_data.get("tool_calls") or []
         
-        # Se não há function call, retornar conteúdo diretamente
-        if not function_call:
+        # Se não há tool calls, retornar conteúdo diretamente
+        if not tool_calls:
             return content or "Desculpe, não consegui gerar uma resposta."
         
         try:
-            # Processar function call
-            function_result = self._execute_function_call(function_call)
+            # Limitar fan-out por turno; a concorrência é limitada pelo _tool_pool
+            tool_calls = tool_calls[:self.config.max_function_calls_per_turn]
+            
+            execution_results = await asyncio.gather(*(
+                self._aexecute_function_call(tool_call_data["function"], tool_call_data.get("id"))
+                for tool_call_data in tool_calls
+            ))
             
-            if function_result.success:
-                # Adicionar resultado da função à thread
+            # Adicionar resultados à thread na ordem original das chamadas
+            responses = []
+            for tool_call_data, execution_result in zip(tool_calls, execution_results):
+                function_name = tool_call_data["function"].get("name", "")
+                
+                if not execution_result.success:
+                    error_msg = f"Erro ao executar função {function_name}: {execution_result.error}"
+                    self.logger.log_error(error_msg, session_id=self.session_id)
+                    responses.append(f"Desculpe, ocorreu um erro ao executar a função solicitada: {execution_result.error}")
+                    continue
+                
+                executed_call = execution_result.data
+                self.current_thread.append_tool_call(executed_call)
+                
+                if self._middleware.on_tool_execution:
+                    self._middleware.on_tool_execution(
+                        executed_call.name,
+                        executed_call.arguments,
+                        executed_call.result if executed_call.status == "success" else executed_call.error,
+                        self.session_id
+                    )
+                
+                if executed_call.status != "success":
+                    error = executed_call.error or "Erro desconhecido na execução da função"
+                    error_msg = f"Erro ao executar função {function_name}: {error}"
+                    self.logger.log_error(error_msg, session_id=self.session_id)
+                    responses.append(f"Desculpe, ocorreu um erro ao executar a função solicitada: {error}")
+                    continue
+                
                 function_message = Message(
                     role="function",
-                    name=function_call["name"],
-                    content=str(function_result.data),
+                    name=function_name,
+                    content=str(executed_call.result),
                     timestamp=datetime.utcnow()
                 )
+                self.current_thread.append_message(function_message)
                 
-                self.current_thread = self.current_thread.add_message(function_message)
-                
-                # Se o LLM também retornou conteúdo junto com function call
+                # Se o LLM também retornou conteúdo junto com tool calls
                 if content:
-                    return f"{content}\n\n[Resultado da função {function_call['name']}: {function_result.data}]"
+                    responses.append(f"[Resultado da função {function_name}: {executed_call.result}]")
                 else:
-                    # Gerar nova resposta considerando o resultado da função
-                    return self._generate_response_with_function_result(function_call["name"], function_result.data)
+                    responses.append(self._generate_response_with_function_result(function_name, executed_call.result))
             
-            else:
-                error_msg = f"Erro ao executar função {function_call['name']}: {function_result.error}"
-                self.logger.log_error(error_msg, session_id=self.session_id)
-                return f"Desculpe, ocorreu um erro ao executar a função solicitada: {function_result.error}"
+            if content:
+                return f"{content}\n\n" + "\n".join(responses)
+            
+            return "\n".join(responses)
                 
         except Exception as e:
-            error_msg = f"Erro no processamento de function call: {str(e)}"
+            error_msg = f"Erro no processamento de tool calls: {str(e)}"
             self.logger.log_error(error_msg, session_id=self.session_id)
             return f"Desculpe, ocorreu um erro inesperado ao processar sua solicitação."
     
-    def _execute_function_call(self, function_call: Dict[str, Any]) -> Result:
+    async def _aexecute_function_call(self, function_call: Dict[str, Any],
+                                      call_id: Optional[str]) -> Result:
+        """
+        Executa uma function call no pool de ferramentas.
+        O pool (max_workers=tool_concurrency_limit) limita a concorrência; falhas ficam no Result.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._tool_pool, self._execute_function_call, function_call, call_id
+            )
+        except Exception as e:
+            return Result.error(f"Erro na execução da função: {str(e)}")
+    
+    def _execute_function_call(self, function_call: Dict[str, Any], call_id: Optional[str] = None) -> Result:
         """
         Executa uma function call específica.
-        Wrapper para o sistema de ferramentas.
+        Wrapper para o sistema de ferramentas; não altera a thread.
         """
         try:
             # Parsear function call
-            parse_result = parse_function_call(function_call)
+            parse_result = parse_function_call(function_call, call_id)
             if not parse_result.success:
                 return parse_result
             
@@ -465,14 +964,7 @@ class FunctionalAgent:
             
             # Executar através do registry
             executed_call = self.tool_registry.execute_tool_call(tool_call, self.session_id)
-            
-            # Adicionar à thread
-            self.current_thread = self.current_thread.add_tool_call(executed_call)
-            
-            if executed_call.status == "success":
-                return Result.ok(executed_call.result)
-            else:
-                return Result.error(executed_call.error or "Erro desconhecido na execução da função")
+            return Result.ok(executed_call)
                 
         except Exception as e:
             return Result.error(f"Erro na execução da função: {str(e)}")
@@ -498,13 +990,17 @@ class FunctionalAgent:
     
     def _save_to_memory(self) -> None:
         """
-        Salva thread atual na memória.
-        Efeito colateral controlado de persistência.
+        Agenda gravação da thread atual na memória.
+        A escrita acontece em segundo plano, fora do caminho da resposta.
         """
         if not self.current_thread:
             return
         
         try:
+            if self._memory_writer:
+                self._memory_writer.submit(self.current_thread.snapshot())
+                return
+            
             result = self.memory.save_thread(self.current_thread)
             if not result.success:
                 self.logger.log_error(f"Erro ao salvar na memória: {result.error}")
@@ -526,22 +1022,15 @@ class FunctionalAgent:
     
     def _handle_command(self, command: str) -> None:
         """Processa comandos especiais do usuário"""
-        cmd = command.lower().strip()
-        
-        if cmd == "/stats":
-            self._show_stats()
-        elif cmd == "/tools":
-            self._show_tools()
-        elif cmd == "/memory":
-            self._show_memory_info()
-        elif cmd == "/context":
-            self._show_context_info()
-        elif cmd == "/clear":
-            self._clear_conversation()
-        elif cmd.startswith("/export"):
-            parts = cmd.split()
-            format_type = parts[1] if len(parts) > 1 else "yaml"
-            self._export_conversation(format_type)
+        cmd, *args = command.lower().split()
+        
+        if cmd == "/export":
+            self._export_conversation(args[0] if args else "yaml")
+            return
+        
+        handler = self._command_handlers.get(cmd)
+        if handler is not None and not args:
+            handler()
         else:
             print(f"❓ Comando desconhecido: {command}")
             print("Digite 'help' para ver comandos disponíveis.")
@@ -558,9 +1047,9 @@ class FunctionalAgent:
         
         print("📊 Estatísticas da Sessão:")
         print(f"  🆔 ID da sessão: {self.session_id}")
-        print(f"  💬 Total de mensagens: {len(self.current_thread.messages)}")
+        print(f"  💬 Total de mensagens: {self.current_thread.message_count}")
         print(f"  🔄 Turnos de conversa: {self.total_turns}")
-        print(f"  🛠️  Ferramentas executadas: {len(self.current_thread.tools_calls)}")
+        print(f"  🛠️  Ferramentas executadas: {self.current_thread.tool_call_count}")
         print(f"  🧠 Modelo usado: {self.config.model}")
         print(f"  💾 Ferramentas disponíveis: {tools_stats.get('total_tools', 0)}")
         print(f"  📚 Total de threads na memória: {memory_stats.get('total_threads', 0)}")
@@ -568,17 +1057,15 @@ class FunctionalAgent:
     
     def _show_tools(self) -> None:
         """Lista ferramentas disponíveis"""
-        tools = self.tool_registry.get_available_tools()
         categories = self.tool_registry.executor.list_tools_by_category()
         
         print("🛠️  Ferramentas Disponíveis:")
         for category, tool_names in categories.items():
             print(f"  📁 {category.title()}:")
             for tool_name in tool_names:
-                # Encontrar a ferramenta na lista completa
-                tool_info = next((t for t in tools if t["name"] == tool_name), None)
-                if tool_info:
-                    print(f"    • {tool_name}: {tool_info['description']}")
+                metadata = self.tool_registry.executor.get_tool_metadata(tool_name)
+                if metadata:
+                    print(f"    • {tool_name}: {metadata.description}")
         print()
     
     def _show_memory_info(self) -> None:
@@ -602,7 +1089,12 @@ class FunctionalAgent:
             print("📝 Nenhuma thread ativa.")
             return
         
-        metadata = self.context_manager.builder.extract_context_metadata(self.current_thread)
+        metadata = self._get_context_metadata()
+        
+        # Tempo desde a última mensagem é calculado na hora (não memoizável)
+        if self.current_thread.messages:
+            elapsed = time.time() - self.current_thread.messages[-1].timestamp_epoch
+            metadata = {**metadata, "time_since_last_message_minutes": elapsed / 60}
         
         print("📝 Informações do Contexto:")
         print(f"  📊 Tokens estimados: {metadata.get('estimated_tokens', 0)}")
@@ -624,45 +1116,72 @@ class FunctionalAgent:
             print("❌ Operação cancelada.")
         print()
     
-    def _export_conversation(self, format_type: str) -> None:
-        """Exporta a conversa atual"""
+    # Formato de exportação -> método de ContextExporter
+    _EXPORT_FORMATS = {"yaml": "to_yaml", "md": "to_markdown", "json": "to_json"}
+    
+    def _export_conversation(self, format_type: str) -> Optional[Future]:
+        """
+        Agenda a exportação da conversa atual em segundo plano.
+        Retorna o Future com o nome do arquivo, ou None se não agendada.
+        """
         if not self.current_thread:
             print("❌ Nenhuma conversa para exportar.")
-            return
+            return None
+        
+        if format_type not in self._EXPORT_FORMATS:
+            print(f"❌ Formato não suportado: {format_type}\n")
+            return None
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"conversa_{self.session_id}_{timestamp}.{format_type}"
+        
+        print(f"📤 Exportação iniciada: {filename}\n")
         
+        future = self._export_pool.submit(
+            self._write_export,
+            format_type,
+            self.current_thread.snapshot(),
+            filename
+        )
+        future.add_done_callback(self._report_export)
+        return future
+    
+    def _write_export(self, format_type: str, thread: Thread, filename: str) -> str:
+        """
+        Serializa a thread e grava o arquivo com escrita direta no descritor.
+        Executado no pool de exportação.
+        """
+        from agent.context import ContextExporter
+        
+        serializer = getattr(ContextExporter, self._EXPORT_FORMATS[format_type])
+        data = memoryview(serializer(thread).encode("utf-8"))
+        
+        fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
         try:
-            from agent.context import ContextExporter
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            
-            if format_type == "yaml":
-                content = ContextExporter.to_yaml(self.current_thread)
-                filename = f"conversa_{self.session_id}_{timestamp}.yaml"
-            elif format_type == "md":
-                content = ContextExporter.to_markdown(self.current_thread)
-                filename = f"conversa_{self.session_id}_{timestamp}.md"
-            elif format_type == "json":
-                content = ContextExporter.to_json(self.current_thread)
-                filename = f"conversa_{self.session_id}_{timestamp}.json"
-            else:
-                print(f"❌ Formato não suportado: {format_type}")
-                return
-            
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            print(f"✅ Conversa exportada para: {filename}")
-            
+            while data:
+                data = data[os.write(fd, data):]
+        finally:
+            os.close(fd)
+        
+        return filename
+    
+    def _report_export(self, future: Future) -> None:
+        """Informa o resultado de uma exportação concluída"""
+        try:
+            print(f"✅ Conversa exportada para: {future.result()}")
         except Exception as e:
+            self.logger.log_error(f"Erro ao exportar conversa: {str(e)}", session_id=self.session_id)
             print(f"❌ Erro ao exportar: {str(e)}")
-        print()
     
     def _shutdown(self) -> None:
         """
         Encerra o agente graciosamente.
-        Salva estado e limpa recursos.
+        Salva estado e limpa recursos (apenas na primeira chamada).
         """
         self.is_running = False
+        if self.is_closed:
+            return
+        self.is_closed = True
         
         with log_operation(self.logger, "shutdown_agent", self.session_id):
             try:
@@ -670,18 +1189,30 @@ class FunctionalAgent:
                 if self.current_thread and self.config.enable_memory_persistence:
                     self._save_to_memory()
                 
+                # Registrar uso de tokens ainda não reportado
+                self._flush_usage()
+                
+                # Drenar gravações pendentes antes de encerrar
+                if self._memory_writer:
+                    self._memory_writer.close()
+                
                 # Cleanup opcional
                 if self.config.auto_cleanup_old_data:
                     cleanup_result = self.memory.cleanup_old_data(self.config.cleanup_days_threshold)
                     if cleanup_result.success:
                         self.logger.log_info("Cleanup automático realizado", **cleanup_result.data)
                 
+                # Concluir exportações pendentes; liberar conexões HTTP, loop e pools
+                self._export_pool.shutdown(wait=True)
+                self._close_client()
+                self._tool_pool.shutdown(wait=True)
+                
                 # Log final
                 self.logger.log_info(
                     "Agente encerrado graciosamente",
                     session_id=self.session_id,
                     total_turns=self.total_turns,
-                    total_messages=len(self.current_thread.messages) if self.current_thread else 0
+                    total_messages=self.current_thread.message_count if self.current_thread else 0
                 )
                 
                 print("👋 Agente encerrado. Até logo!")
@@ -689,17 +1220,104 @@ class FunctionalAgent:
             except Exception as e:
                 self.logger.log_error(f"Erro no shutdown: {str(e)}")
                 print(f"⚠️  Aviso: Erro durante encerramento: {str(e)}")
+        
+        # Gravar logs ainda em buffer
+        self.logger.flush()
+
+    def _close_client(self) -> None:
+        """
+        Fecha o cliente LLM e o loop de eventos da interface síncrona.
+        Efeito colateral controlado de limpeza.
+        """
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            if self._owns_client:
+                loop.run_until_complete(self._client.close())
+            loop.close()
+            return
+        
+        if not self._owns_client:
+            return
+        
+        # Agente usado só pela API assíncrona: fechar no loop do chamador, se houver
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self._client.close())
+        else:
+            self._client_close_task = running_loop.create_task(self._client.close())
+
+# ============================================================================
+# LIMITADOR DE TAXA ASSÍNCRONO
+# ============================================================================
+
+class AsyncRequestLimiter:
+    """
+    Token bucket para limitar requisições por período em corrotinas.
+    Permite rajadas até max_requests e repõe tokens continuamente.
+    """
+    
+    def __init__(self, max_requests: int, period_seconds: float = 60.0):
+        self.capacity = float(max_requests)
+        self.refill_rate = max_requests / period_seconds
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self) -> None:
+        """Aguarda até haver um token disponível e o consome"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_rate)
+                self._updated = now
+                
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                
+                await asyncio.sleep((1 - self._tokens) / self.refill_rate)
 
 # ============================================================================
 # FACTORY FUNCTIONS E UTILITÁRIOS
 # ============================================================================
 
-def create_agent(config: Optional[AgentConfig] = None, session_id: Optional[str] = None) -> FunctionalAgent:
+def create_http_client(config: AgentConfig) -> Optional["httpx.AsyncClient"]:
+    """
+    Cria o pool HTTP keep-alive usado pelo cliente LLM.
+    HTTP/2 é habilitado quando o pacote h2 está disponível.
+    """
+    if httpx is None:
+        return None
+    
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=config.http_max_connections,
+            max_keepalive_connections=config.http_max_keepalive_connections
+        ),
+        http2=_module_available("h2")
+    )
+
+def create_llm_client(config: AgentConfig) -> AsyncOpenAI:
+    """
+    Cria o cliente LLM assíncrono de um agente.
+    Retries do SDK desabilitados: o agente aplica sua própria política.
+    """
+    return AsyncOpenAI(
+        api_key=config.api_key,
+        base_url=config.api_base,
+        max_retries=0,
+        timeout=config.request_timeout_seconds,
+        http_client=create_http_client(config)
+    )
+
+def create_agent(config: Optional[AgentConfig] = None, session_id: Optional[str] = None,
+                 client: Optional[AsyncOpenAI] = None) -> FunctionalAgent:
     """
     Factory function para criar instância do agente.
     Função pura de criação com configuração personalizada.
     """
-    return FunctionalAgent(config, session_id)
+    return FunctionalAgent(config, session_id, client)
 
 def create_default_config() -> AgentConfig:
     """
@@ -708,24 +1326,71 @@ def create_default_config() -> AgentConfig:
     """
     return AgentConfig()
 
-def load_config_from_env() -> AgentConfig:
+# Variáveis de ambiente lidas por load_config_from_env (ordem do snapshot)
+CONFIG_ENV_VARS = (
+    "AGENT_MODEL",
+    "OPENROUTER_API_KEY",
+    "OPENAI_API_BASE",
+    "AGENT_MAX_TOKENS",
+    "AGENT_TEMPERATURE",
+    "AGENT_MAX_TURNS",
+    "AGENT_ENABLE_TOOLS",
+    "AGENT_MEMORY_DB",
+    "AGENT_CONTEXT_STRATEGY",
+    "AGENT_MAX_RETRIES",
+)
+
+@lru_cache(maxsize=4)
+def _config_from_env_snapshot(env_snapshot: tuple) -> AgentConfig:
     """
-    Carrega configuração a partir de variáveis de ambiente.
-    Função pura de configuração.
+    Converte um snapshot das variáveis de ambiente em AgentConfig.
+    Função pura, memoizada por snapshot (AgentConfig é imutável).
     """
+    env = {name: value for name, value in zip(CONFIG_ENV_VARS, env_snapshot) if value is not None}
+    
     return AgentConfig(
-        model=os.getenv("AGENT_MODEL", "mistralai/mistral-7b-instruct"),
-        api_key=os.getenv("OPENROUTER_API_KEY"),
-        api_base=os.getenv("OPENAI_API_BASE", "https://openrouter.ai/api/v1"),
-        max_tokens=int(os.getenv("AGENT_MAX_TOKENS", "2000")),
-        temperature=float(os.getenv("AGENT_TEMPERATURE", "0.7")),
-        max_conversation_turns=int(os.getenv("AGENT_MAX_TURNS", "100")),
-        enable_function_calling=os.getenv("AGENT_ENABLE_TOOLS", "true").lower() == "true",
-        memory_db_path=os.getenv("AGENT_MEMORY_DB", "memory.db"),
-        context_strategy=os.getenv("AGENT_CONTEXT_STRATEGY", "default"),
-        max_retries=int(os.getenv("AGENT_MAX_RETRIES", "3"))
+        model=env.get("AGENT_MODEL", "mistralai/mistral-7b-instruct"),
+        api_key=env.get("OPENROUTER_API_KEY"),
+        api_base=env.get("OPENAI_API_BASE", "https://openrouter.ai/api/v1"),
+        max_tokens=int(env.get("AGENT_MAX_TOKENS", "2000")),
+        temperature=float(env.get("AGENT_TEMPERATURE", "0.7")),
+        max_conversation_turns=int(env.get("AGENT_MAX_TURNS", "100")),
+        enable_function_calling=env.get("AGENT_ENABLE_TOOLS", "true").lower() == "true",
+        memory_db_path=env.get("AGENT_MEMORY_DB", "memory.db"),
+        context_strategy=env.get("AGENT_CONTEXT_STRATEGY", "default"),
+        max_retries=int(env.get("AGENT_MAX_RETRIES", "3"))
     )
 
+def _env_snapshot() -> tuple:
+    """Valores atuais das variáveis de CONFIG_ENV_VARS"""
+    return tuple(os.environ.get(name) for name in CONFIG_ENV_VARS)
+
+@lru_cache(maxsize=1)
+def _stable_env_snapshot() -> tuple:
+    """Snapshot lido uma única vez (AGENT_CONFIG_CACHE_ENABLED=true)"""
+    return _env_snapshot()
+
+def load_config_from_env() -> AgentConfig:
+    """
+    Carrega configuração a partir de variáveis de ambiente.
+    O parsing é memoizado pelo snapshot do ambiente; com
+    AGENT_CONFIG_CACHE_ENABLED=true o ambiente é lido uma única vez.
+    """
+    if os.environ.get("AGENT_CONFIG_CACHE_ENABLED", "false").lower() == "true":
+        snapshot = _stable_env_snapshot()
+    else:
+        snapshot = _env_snapshot()
+    
+    return _config_from_env_snapshot(snapshot)
+
+@lru_cache(maxsize=None)
+def _module_available(module_name: str) -> bool:
+    """
+    Verifica se um módulo opcional pode ser importado, sem importá-lo.
+    Resultado memoizado por nome de módulo.
+    """
+    return importlib.util.find_spec(module_name) is not None
+
 def validate_environment() -> Result:
     """
     Valida se o ambiente está configurado corretamente.
@@ -738,19 +1403,15 @@ def validate_environment() -> Result:
     if not os.getenv("OPENROUTER_API_KEY"):
         errors.append("OPENROUTER_API_KEY não configurada")
     
-    # Verificar dependências opcionais
-    try:
-        import yaml
-    except ImportError:
+    # Verificar dependências opcionais (sem executar o código dos módulos)
+    if not _module_available("yaml"):
         warnings.append("PyYAML não instalado - funcionalidades YAML limitadas")
     
-    # Verificar permissões de escrita
-    try:
-        test_file = "test_write_permission.tmp"
-        with open(test_file, 'w') as f:
-            f.write("test")
-        os.remove(test_file)
-    except Exception:
+    if not _module_available("orjson"):
+        warnings.append("orjson não instalado - serialização JSON usa o módulo padrão (mais lento)")
+    
+    # Verificar permissões de escrita (access(2): sem criar/remover arquivo)
+    if not os.access(os.getcwd(), os.W_OK):
         warnings.append("Permissões de escrita limitadas - logging pode ser afetado")
     
     if errors:
@@ -789,9 +1450,9 @@ class AsyncFunctionalAgent:
         # TODO: Implementar lógica assíncrona
         return Result.error("Implementação assíncrona ainda não disponível")
     
-    async def start_conversation_stream(self, session_id: str) -> Generator[str, None, None]:
+    async def start_conversation_stream(self, session_id: str) -> AsyncGenerator[str, None]:
         """
-        Stream assíncrono de conversa.
+        Stream assíncrono de conversa (consumir com `async for`).
         Para implementação futura com WebSockets/SSE.
         """
         # TODO: Implementar streaming assíncrono
@@ -801,12 +1462,37 @@ class AsyncFunctionalAgent:
 # SISTEMA DE MIDDLEWARE (EXTENSIBILIDADE)
 # ============================================================================
 
+class MiddlewareReject(Exception):
+    """
+    Recusa de uma mensagem/resposta por um middleware.
+    Lançada pelos hooks rápidos; o agente a converte em Result.error.
+    """
+    
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
 class AgentMiddleware:
     """
     Classe base para middleware do agente.
     Permite interceptar e modificar fluxo de processamento.
+    Hooks *_fast retornam o novo valor (None = inalterado) ou lançam MiddlewareReject.
     """
     
+    def before_user_message_fast(self, message: str, session_id: str) -> Optional[str]:
+        """Versão rápida de before_user_message (por padrão, adapta o hook Result)"""
+        result = self.before_user_message(message, session_id)
+        if not result.success:
+            raise MiddlewareReject(result.error)
+        return result.data
+    
+    def after_user_message_fast(self, message: str, response: str, session_id: str) -> Optional[str]:
+        """Versão rápida de after_user_message (por padrão, adapta o hook Result)"""
+        result = self.after_user_message(message, response, session_id)
+        if not result.success:
+            raise MiddlewareReject(result.error)
+        return result.data
+    
     def before_user_message(self, message: str, session_id: str) -> Result:
         """Hook chamado antes de processar mensagem do usuário"""
         return Result.ok(message)
@@ -841,34 +1527,60 @@ class ContentFilterMiddleware(AgentMiddleware):
     def __init__(self, blocked_words: List[str] = None):
         self.blocked_words = blocked_words or []
         self.logger = get_logger()
+        
+        # Lista compilada em uma única alternação case-insensitive (uma passada por texto)
+        self._pattern: Optional[re.Pattern] = (
+            re.compile("|".join(map(re.escape, self.blocked_words)), re.IGNORECASE)
+            if self.blocked_words else None
+        )
     
-    def before_user_message(self, message: str, session_id: str) -> Result:
+    def _find_blocked(self, text: str) -> Optional[str]:
+        """Primeiro trecho bloqueado encontrado no texto, se houver"""
+        if self._pattern is None:
+            return None
+        
+        match = self._pattern.search(text)
+        return match.group(0) if match else None
+    
+    def before_user_message_fast(self, message: str, session_id: str) -> Optional[str]:
         """Filtra conteúdo da mensagem do usuário"""
-        message_lower = message.lower()
+        blocked_word = self._find_blocked(message)
         
-        for blocked_word in self.blocked_words:
-            if blocked_word.lower() in message_lower:
-                self.logger.log_info(
-                    f"Conteúdo bloqueado detectado: {blocked_word}",
-                    session_id=session_id
-                )
-                return Result.error(f"Mensagem contém conteúdo não permitido")
+        if blocked_word is not None:
+            self.logger.log_info(
+                f"Conteúdo bloqueado detectado: {blocked_word}",
+                session_id=session_id
+            )
+            raise MiddlewareReject("Mensagem contém conteúdo não permitido")
         
-        return Result.ok(message)
+        return None
     
-    def after_user_message(self, message: str, response: str, session_id: str) -> Result:
+    def after_user_message_fast(self, message: str, response: str, session_id: str) -> Optional[str]:
         """Filtra conteúdo da resposta do agente"""
-        response_lower = response.lower()
+        blocked_word = self._find_blocked(response)
         
-        for blocked_word in self.blocked_words:
-            if blocked_word.lower() in response_lower:
-                self.logger.log_info(
-                    f"Resposta bloqueada por conteúdo: {blocked_word}",
-                    session_id=session_id
-                )
-                return Result.ok("Desculpe, não posso fornecer essa informação.")
+        if blocked_word is not None:
+            self.logger.log_info(
+                f"Resposta bloqueada por conteúdo: {blocked_word}",
+                session_id=session_id
+            )
+            return "Desculpe, não posso fornecer essa informação."
         
-        return Result.ok(response)
+        return None
+    
+    def before_user_message(self, message: str, session_id: str) -> Result:
+        """Compatibilidade: hook Result sobre before_user_message_fast"""
+        try:
+            return Result.ok(_unchanged_or(self.before_user_message_fast(message, session_id), message))
+        except MiddlewareReject as reject:
+            return Result.error(reject.reason)
+    
+    def after_user_message(self, message: str, response: str, session_id: str) -> Result:
+        """Compatibilidade: hook Result sobre after_user_message_fast"""
+        try:
+            return Result.ok(_unchanged_or(self.after_user_message_fast(message, response, session_id), response))
+        except MiddlewareReject as reject:
+            return Result.error(reject.reason)
 
 class RateLimitMiddleware(AgentMiddleware):
     """
@@ -876,27 +1588,27 @@ class RateLimitMiddleware(AgentMiddleware):
     Exemplo de implementação de middleware.
     """
     
-    def __init__(self, max_requests_per_minute: int = 30):
+    def __init__(self, max_requests_per_minute: int = 30, window_seconds: float = 60.0):
         self.max_requests = max_requests_per_minute
-        self.requests_log: Dict[str, List[datetime]] = {}
+        self.window_seconds = window_seconds
+        # Janela deslizante por sessão: instantes monotônicos, no máximo max_requests
+        self.requests_log: Dict[str, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=self.max_requests)
+        )
         self.logger = get_logger()
     
-    def before_user_message(self, message: str, session_id: str) -> Result:
+    def before_user_message_fast(self, message: str, session_id: str) -> Optional[str]:
         """Verifica rate limit antes de processar mensagem"""
-        now = datetime.utcnow()
-        cutoff = now - timedelta(minutes=1)
-        
-        # Limpar requisições antigas
-        if session_id in self.requests_log:
-            self.requests_log[session_id] = [
-                req_time for req_time in self.requests_log[session_id]
-                if req_time > cutoff
-            ]
-        else:
-            self.requests_log[session_id] = []
+        now = time.monotonic()
+        cutoff = now - self.window_seconds
+        requests = self.requests_log[session_id]
+        
+        # Descartar requisições fora da janela (O(1) amortizado)
+        while requests and requests[0] <= cutoff:
+            requests.popleft()
         
         # Verificar limite
-        current_requests = len(self.requests_log[session_id])
+        current_requests = len(requests)
         
         if current_requests >= self.max_requests:
             self.logger.log_info(
@@ -904,11 +1616,139 @@ class RateLimitMiddleware(AgentMiddleware):
                 current_requests=current_requests,
                 max_requests=self.max_requests
             )
-            return Result.error(f"Muitas requisições. Limite: {self.max_requests}/minuto")
+            raise MiddlewareReject(f"Muitas requisições. Limite: {self.max_requests}/minuto")
         
         # Registrar nova requisição
-        self.requests_log[session_id].append(now)
-        return Result.ok(message)
+        requests.append(now)
+        return None
+    
+    def before_user_message(self, message: str, session_id: str) -> Result:
+        """Compatibilidade: hook Result sobre before_user_message_fast"""
+        try:
+            return Result.ok(_unchanged_or(self.before_user_message_fast(message, session_id), message))
+        except MiddlewareReject as reject:
+            return Result.error(reject.reason)
+
+def _unchanged_or(value: Optional[Any], original: Any) -> Any:
+    """Valor retornado por um hook rápido; None significa inalterado"""
+    return original if value is None else value
+
+def _fast_hooks(middlewares: List[AgentMiddleware], hook_name: str) -> List[Callable]:
+    """
+    Hooks rápidos dos middlewares que sobrescrevem o hook rápido ou o hook Result.
+    Para os demais (no-op herdado), nada é chamado.
+    """
+    fast_name = f"{hook_name}_fast"
+    base_hook = getattr(AgentMiddleware, hook_name)
+    base_fast = getattr(AgentMiddleware, fast_name)
+    return [
+        getattr(middleware, fast_name)
+        for middleware in middlewares
+        if getattr(type(middleware), fast_name) is not base_fast
+        or getattr(type(middleware), hook_name) is not base_hook
+    ]
+
+def _chain_fast_hooks(hooks: List[Callable]) -> Optional[Callable]:
+    """
+    Compõe hooks rápidos (valor, *contexto) -> Optional[valor] em uma única função.
+    MiddlewareReject interrompe a cadeia; None para cadeia vazia.
+    """
+    if not hooks:
+        return None
+    
+    hooks = tuple(hooks)
+    
+    def run_chain(value: Any, *context: Any) -> Any:
+        for hook in hooks:
+            new_value = hook(value, *context)
+            if new_value is not None:
+                value = new_value
+        return value
+    
+    return run_chain
+
+def _overridden_hooks(middlewares: List[AgentMiddleware], hook_name: str) -> List[Callable]:
+    """
+    Métodos ligados dos middlewares que sobrescrevem o hook.
+    Hooks herdados da base (no-op) são descartados.
+    """
+    base_hook = getattr(AgentMiddleware, hook_name)
+    return [
+        getattr(middleware, hook_name)
+        for middleware in middlewares
+        if getattr(type(middleware), hook_name) is not base_hook
+    ]
+
+def _fold_result_hooks(hooks: List[Callable]) -> Optional[Callable]:
+    """
+    Compõe hooks (valor, *contexto) -> Result em uma única função.
+    Interrompe no primeiro erro; None para cadeia vazia.
+    """
+    if not hooks:
+        return None
+    
+    def chain(inner: Callable, hook: Callable) -> Callable:
+        def composed(value: Any, *context: Any) -> Result:
+            result = inner(value, *context)
+            if not result.success:
+                return result
+            return hook(result.data, *context)
+        return composed
+    
+    return reduce(chain, hooks[1:], hooks[0])
+
+def _fan_out_hooks(hooks: List[Callable]) -> Optional[Callable]:
+    """
+    Agrupa hooks de notificação (sem retorno) em uma única função.
+    None para cadeia vazia.
+    """
+    if not hooks:
+        return None
+    
+    if len(hooks) == 1:
+        return hooks[0]
+    
+    hooks = tuple(hooks)
+    
+    def notify_all(*args: Any) -> None:
+        for hook in hooks:
+            hook(*args)
+    
+    return notify_all
+
+@dataclass(frozen=True)
+class MiddlewareChain:
+    """
+    Hooks de middleware pré-compostos, montados uma vez por agente.
+    Hooks sem middleware que os sobrescreva ficam None e são ignorados.
+    """
+    before_user_message: Optional[Callable[[str, str], str]] = None  # Pode lançar MiddlewareReject
+    after_user_message: Optional[Callable[[str, str, str], str]] = None  # (resposta, mensagem, sessão)
+    before_llm_call: Optional[Callable[[List[Dict[str, Any]], str], Result]] = None
+    after_llm_call: Optional[Callable[[Dict[str, Any], str], Result]] = None
+    on_tool_execution: Optional[Callable[[str, Dict[str, Any], Any, str], None]] = None
+    on_error: Optional[Callable[[Exception, str, str], None]] = None
+    
+    @classmethod
+    def compile(cls, middlewares: List[AgentMiddleware]) -> 'MiddlewareChain':
+        """
+        Compõe os hooks na ordem de registro dos middlewares.
+        Função pura de construção.
+        """
+        # after_user_message recebe a resposta como valor encadeado
+        after_user_hooks = [
+            (lambda hook: lambda response, message, session_id: hook(message, response, session_id))(hook)
+            for hook in _fast_hooks(middlewares, "after_user_message")
+        ]
+        
+        return cls(
+            before_user_message=_chain_fast_hooks(_fast_hooks(middlewares, "before_user_message")),
+            after_user_message=_chain_fast_hooks(after_user_hooks),
+            before_llm_call=_fold_result_hooks(_overridden_hooks(middlewares, "before_llm_call")),
+            after_llm_call=_fold_result_hooks(_overridden_hooks(middlewares, "after_llm_call")),
+            on_tool_execution=_fan_out_hooks(_overridden_hooks(middlewares, "on_tool_execution")),
+            on_error=_fan_out_hooks(_overridden_hooks(middlewares, "on_error"))
+        )
 
 # ============================================================================
 # AGENT BUILDER COM FLUENT INTERFACE
@@ -921,69 +1761,57 @@ class AgentBuilder:
     """
     
     def __init__(self):
-        self.config = AgentConfig()
+        # Alterações acumuladas; AgentConfig é materializado uma vez em build()
+        self._overrides: Dict[str, Any] = {}
         self.middlewares: List[AgentMiddleware] = []
     
+    @property
+    def config(self) -> AgentConfig:
+        """Configuração resultante das alterações acumuladas"""
+        return AgentConfig(**self._overrides)
+    
     def with_model(self, model: str) -> 'AgentBuilder':
         """Configura modelo LLM"""
-        self.config = AgentConfig(
-            **{**self.config.__dict__, 'model': model}
-        )
+        self._overrides['model'] = model
         return self
     
     def with_api_key(self, api_key: str) -> 'AgentBuilder':
         """Configura API key"""
-        self.config = AgentConfig(
-            **{**self.config.__dict__, 'api_key': api_key}
-        )
+        self._overrides['api_key'] = api_key
         return self
     
     def with_temperature(self, temperature: float) -> 'AgentBuilder':
         """Configura temperatura do modelo"""
-        self.config = AgentConfig(
-            **{**self.config.__dict__, 'temperature': temperature}
-        )
+        self._overrides['temperature'] = temperature
         return self
     
     def with_max_tokens(self, max_tokens: int) -> 'AgentBuilder':
         """Configura máximo de tokens"""
-        self.config = AgentConfig(
-            **{**self.config.__dict__, 'max_tokens': max_tokens}
-        )
+        self._overrides['max_tokens'] = max_tokens
         return self
     
     def with_memory_persistence(self, enabled: bool = True, db_path: str = "memory.db") -> 'AgentBuilder':
         """Configura persistência de memória"""
-        self.config = AgentConfig(
-            **{**self.config.__dict__, 
-               'enable_memory_persistence': enabled,
-               'memory_db_path': db_path}
-        )
+        self._overrides['enable_memory_persistence'] = enabled
+        self._overrides['memory_db_path'] = db_path
         return self
     
     def with_function_calling(self, enabled: bool = True) -> 'AgentBuilder':
         """Configura tool use/function calling"""
-        self.config = AgentConfig(
-            **{**self.config.__dict__, 'enable_function_calling': enabled}
-        )
+        self._overrides['enable_function_calling'] = enabled
         return self
     
     def with_context_strategy(self, strategy: str) -> 'AgentBuilder':
         """Configura estratégia de contexto"""
-        self.config = AgentConfig(
-            **{**self.config.__dict__, 'context_strategy': strategy}
-        )
+        self._overrides['context_strategy'] = strategy
         return self
     
     def with_retry_config(self, max_retries: int = 3, delay: float = 1.0, 
                          exponential_backoff: bool = True) -> 'AgentBuilder':
         """Configura política de retry"""
-        self.config = AgentConfig(
-            **{**self.config.__dict__, 
-               'max_retries': max_retries,
-               'retry_delay_seconds': delay,
-               'exponential_backoff': exponential_backoff}
-        )
+        self._overrides['max_retries'] = max_retries
+        self._overrides['retry_delay_seconds'] = delay
+        self._overrides['exponential_backoff'] = exponential_backoff
         return self
     
     def with_middleware(self, middleware: AgentMiddleware) -> 'AgentBuilder':
@@ -1001,11 +1829,10 @@ class AgentBuilder:
     
     def build(self, session_id: Optional[str] = None) -> FunctionalAgent:
         """Constrói o agente com configurações definidas"""
-        agent = FunctionalAgent(self.config, session_id)
+        agent = FunctionalAgent(AgentConfig(**self._overrides), session_id)
         
-        # TODO: Integrar middlewares ao agente
-        # Esta funcionalidade seria implementada como uma extensão
         if self.middlewares:
+            agent.use_middlewares(self.middlewares)
             agent.logger.log_info(f"Agente criado com {len(self.middlewares)} middlewares")
         
         return agent
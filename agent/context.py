@@ -1,15 +1,73 @@
-import yaml
+import io
+import threading
+import time
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from itertools import accumulate
+from operator import itemgetter
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional, Callable
+from typing import List, Dict, Any, Optional, Callable, Iterable, Sequence, TextIO, Tuple, Union
+from copy import deepcopy
 from dataclasses import asdict
 
 from models.models import Thread, Message, ToolCall, Result
 from agent.logger import get_logger
+from agent.serialization import Compressor, dumps, dumps_bytes, get_compressor, loads
+
+@lru_cache(maxsize=None)
+def _yaml() -> Tuple[Any, Any]:
+    """
+    Importa PyYAML sob demanda (só quem serializa paga o import).
+    Retorna (módulo yaml, Dumper) com o emissor C quando disponível.
+    """
+    import yaml
+    try:
+        from yaml import CSafeDumper as YamlDumper  # Emissor C (libyaml)
+    except ImportError:
+        from yaml import SafeDumper as YamlDumper
+    return yaml, YamlDumper
+
+def dump_yaml(data: Any, **options: Any) -> str:
+    """
+    Serializa em YAML com YamlDumper (libyaml quando disponível).
+    Objetos fora do subconjunto seguro usam o Dumper padrão.
+    """
+    yaml, dumper = _yaml()
+    try:
+        return yaml.dump(data, Dumper=dumper, **options)
+    except yaml.representer.RepresenterError:
+        return yaml.dump(data, **options)
 
 # ============================================================================
 # SISTEMA DE CONTEXTO ESTRUTURADO COM YAML
 # ============================================================================
 
+# Valores aceitos pelo ContextValidator (espelham MessageRole / ToolCallStatus)
+VALID_MESSAGE_ROLES = frozenset(("system", "user", "assistant", "function"))
+VALID_TOOL_CALL_STATUSES = frozenset(("pending", "success", "error"))
+
+# Partes fixas do prompt de sistema (em volta do bloco YAML)
+SYSTEM_PROMPT_HEADER = """Você é um agente inteligente funcional com as seguintes características e contexto:
+
+---
+"""
+
+# Cabeçalho do bloco de contexto da sessão (estratégia stable_prefix)
+SESSION_CONTEXT_HEADER = "Contexto atual da sessão:"
+
+SYSTEM_PROMPT_INSTRUCTIONS = """---
+
+## Instruções de Comportamento:
+
+1. **Memória Consistente**: Use o histórico da conversa para manter contexto entre mensagens
+2. **Tool Use Responsável**: Execute funções apenas quando necessário e apropriado
+3. **Logs Estruturados**: Todas as ações são registradas automaticamente
+4. **Respostas Úteis**: Seja preciso, didático e organizado
+5. **Tratamento de Erros**: Gerencie falhas graciosamente com retry quando apropriado
+
+Responda de forma natural e útil, considerando todo o contexto fornecido acima."""
+
 class ContextBuilder:
     """
     Construtor de contexto estruturado para o agente.
@@ -17,78 +75,154 @@ class ContextBuilder:
     Segue princípios funcionais - todas as operações são puras.
     """
     
+    # Metadados estáticos, alocados uma única vez por processo
+    _AGENT_INFO: Dict[str, Any] = {
+        "name": "Agente Funcional",
+        "version": "1.0.0",
+        "description": "Agente inteligente com memória persistente e tool use",
+        "capabilities": (
+            "Memória de longo prazo",
+            "Execução de funções estruturadas",
+            "Logging detalhado",
+            "Contexto persistente"
+        )
+    }
+    
+    _TOOLS_INFO: Dict[str, Any] = {
+        "total_tools": 0,  # Será preenchido pelo sistema de tools
+        "categories": (
+            "utilities",
+            "search", 
+            "calculations",
+            "file_operations"
+        ),
+        "note": "Tools específicas são carregadas dinamicamente pelo sistema"
+    }
+    
+    _BEHAVIOR_GUIDELINES: Tuple[str, ...] = (
+        "Seja útil, didático e organizado em suas respostas",
+        "Use a memória da conversa para fornecer contexto consistente", 
+        "Execute funções apenas quando necessário e apropriado",
+        "Explique seu raciocínio quando executar ações complexas",
+        "Trate erros graciosamente e informe sobre problemas",
+        "Mantenha respostas concisas mas completas",
+        "Priorize a segurança em todas as operações"
+    )
+    
+    _FALLBACK_PROMPT = """Você é um agente inteligente funcional com as seguintes características:
+
+- Memória persistente entre conversas
+- Capacidade de executar funções estruturadas  
+- Sistema de logging automático
+- Tratamento robusto de erros
+
+Seja útil, didático e organizado em suas respostas. Use contexto de conversas anteriores quando relevante."""
+    
     def __init__(self, max_context_length: int = 8000, max_messages: int = 50):
         self.max_context_length = max_context_length
         self.max_messages = max_messages
+        # Com prefixo estável, o histórico é cortado em degraus deste tamanho
+        self.history_trim_step = max(1, max_messages // 4)
         self.logger = get_logger()
+        
+        # Último resultado de _filter_recent_messages: (lista, tamanho, limites, (filtradas, caracteres))
+        self._filter_cache: Optional[Tuple[List[Message], int, Tuple[int, int], Tuple[List[Message], int]]] = None
+        
+        # Seções invariantes do YAML serializadas uma única vez
+        self._static_head_yaml = self._dump_yaml({"agent_info": self._get_agent_info()})
+        self._static_tail_yaml = self._dump_yaml({
+            "available_tools": self._get_available_tools_info(),
+            "behavior_guidelines": self._get_behavior_guidelines()
+        })
+        
+        # Prompt sem seções da sessão: prefixo byte-idêntico entre chamadas
+        self._stable_system_prompt = "".join((
+            SYSTEM_PROMPT_HEADER,
+            self._static_head_yaml,
+            self._static_tail_yaml,
+            "\n",
+            SYSTEM_PROMPT_INSTRUCTIONS
+        ))
+    
+    @staticmethod
+    def _dump_yaml(data: Dict[str, Any]) -> str:
+        """
+        Serializa um mapeamento de topo em YAML em bloco.
+        Seções serializadas separadamente podem ser concatenadas.
+        """
+        return dump_yaml(
+            data,
+            default_flow_style=False,
+            allow_unicode=True,
+            sort_keys=False,
+            indent=2
+        )
     
     def build_system_prompt(self, thread: Thread, additional_context: Optional[Dict[str, Any]] = None) -> str:
         """
         Constrói o prompt de sistema em formato YAML estruturado.
-        Função pura - não modifica o estado.
+        Apenas as seções da sessão são serializadas a cada chamada.
         """
         try:
-            # Estrutura base do contexto
-            context_data = {
-                "agent_info": {
-                    "name": "Agente Funcional",
-                    "version": "1.0.0",
-                    "description": "Agente inteligente com memória persistente e tool use",
-                    "capabilities": [
-                        "Memória de longo prazo",
-                        "Execução de funções estruturadas",
-                        "Logging detalhado",
-                        "Contexto persistente"
-                    ]
-                },
-                "session_info": {
-                    "session_id": thread.session_id,
-                    "created_at": thread.created_at.isoformat(),
-                    "updated_at": thread.updated_at.isoformat(),
-                    "message_count": len(thread.messages),
-                    "tools_used": len(thread.tools_calls)
-                },
-                "conversation_history": self._build_conversation_summary(thread),
-                "available_tools": self._get_available_tools_info(),
-                "behavior_guidelines": self._get_behavior_guidelines()
-            }
+            # Seções dinâmicas do contexto
+            dynamic_yaml = self._dump_yaml({
+                "session_info": self._build_session_info(thread),
+                "conversation_history": self._build_conversation_summary(thread)
+            })
             
             # Adicionar contexto adicional se fornecido
-            if additional_context:
-                context_data["additional_context"] = additional_context
-            
-            # Converter para YAML formatado
-            yaml_context = yaml.dump(
-                context_data,
-                default_flow_style=False,
-                allow_unicode=True,
-                sort_keys=False,
-                indent=2
+            additional_yaml = (
+                self._dump_yaml({"additional_context": additional_context})
+                if additional_context else ""
             )
             
-            # Construir prompt final
-            system_prompt = f"""Você é um agente inteligente funcional com as seguintes características e contexto:
-
----
-{yaml_context}
----
-
-## Instruções de Comportamento:
-
-1. **Memória Consistente**: Use o histórico da conversa para manter contexto entre mensagens
-2. **Tool Use Responsável**: Execute funções apenas quando necessário e apropriado
-3. **Logs Estruturados**: Todas as ações são registradas automaticamente
-4. **Respostas Úteis**: Seja preciso, didático e organizado
-5. **Tratamento de Erros**: Gerencie falhas graciosamente com retry quando apropriado
-
-Responda de forma natural e útil, considerando todo o contexto fornecido acima."""
-
-            return system_prompt
+            # Construir prompt final (mesma ordem de seções do YAML completo)
+            return "".join((
+                SYSTEM_PROMPT_HEADER,
+                self._static_head_yaml,
+                dynamic_yaml,
+                self._static_tail_yaml,
+                additional_yaml,
+                "\n",
+                SYSTEM_PROMPT_INSTRUCTIONS
+            ))
             
         except Exception as e:
             self.logger.log_error(f"Erro ao construir contexto: {str(e)}")
             return self._get_fallback_system_prompt()
     
+    def build_stable_system_prompt(self) -> str:
+        """
+        Prompt de sistema apenas com as seções invariantes.
+        Idêntico entre chamadas (prefixo para cache de prompt do provedor).
+        """
+        return self._stable_system_prompt
+    
+    def build_session_context(self, thread: Thread,
+                              additional_context: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Seções que mudam a cada turno (sessão e contexto adicional) em YAML.
+        Vão na última mensagem do usuário, depois do histórico.
+        """
+        data = {"session_info": self._build_session_info(thread)}
+        if additional_context:
+            data["additional_context"] = additional_context
+        
+        return SESSION_CONTEXT_HEADER + "\n\n" + self._dump_yaml(data)
+    
+    def _build_session_info(self, thread: Thread) -> Dict[str, Any]:
+        """
+        Informações da sessão para o prompt.
+        Função pura de transformação.
+        """
+        return {
+            "session_id": thread.session_id,
+            "created_at": thread.created_at_iso,
+            "updated_at": thread.updated_at_iso,
+            "message_count": len(thread.messages),
+            "tools_used": len(thread.tools_calls)
+        }
+    
     def _build_conversation_summary(self, thread: Thread) -> Dict[str, Any]:
         """
         Constrói resumo da conversa de forma estruturada.
@@ -115,7 +249,7 @@ Responda de forma natural e útil, considerando todo o contexto fornecido acima.
             "total_messages": len(thread.messages),
             "recent_messages_shown": len(recent_messages),
             "message_types": message_types,
-            "last_activity": thread.updated_at.isoformat(),
+            "last_activity": thread.updated_at_iso,
             "messages": []
         }
         
@@ -123,7 +257,7 @@ Responda de forma natural e útil, considerando todo o contexto fornecido acima.
         for msg in recent_messages:
             message_data = {
                 "role": msg.role,
-                "timestamp": msg.timestamp.isoformat(),
+                "timestamp": msg.timestamp_iso,
                 "content_preview": self._truncate_content(msg.content, 200),
                 "has_function_call": bool(msg.function_call)
             }
@@ -138,67 +272,86 @@ Responda de forma natural e útil, considerando todo o contexto fornecido acima.
     def _filter_recent_messages(self, messages: List[Message]) -> List[Message]:
         """
         Filtra mensagens recentes baseado em limites configurados.
-        Função pura de filtragem.
+        Memoizado por lista/tamanho: as threads só crescem por append.
+        """
+        return self._filter_recent_with_length(messages)[0]
+    
+    def _filter_recent_with_length(self, messages: List[Message]) -> Tuple[List[Message], int]:
+        """
+        Como _filter_recent_messages, retornando também o total de caracteres.
+        O total sai das mesmas somas usadas no corte.
         """
         if not messages:
-            return []
+            return [], 0
+        
+        limits = (self.max_messages, self.max_context_length)
+        cached = self._filter_cache
+        if (cached is not None and cached[0] is messages
+                and cached[1] == len(messages) and cached[2] == limits):
+            return cached[3]
         
+        filtered = self._compute_recent_messages(messages)
+        self._filter_cache = (messages, len(messages), limits, filtered)
+        return filtered
+    
+    def _compute_recent_messages(self, messages: List[Message]) -> Tuple[List[Message], int]:
+        """
+        Aplica os limites de quantidade e de tamanho do contexto.
+        Função pura de filtragem.
+        """
         # Aplicar limite de quantidade
         limited_messages = messages[-self.max_messages:] if len(messages) > self.max_messages else messages
         
-        # Verificar limite de tamanho do contexto
-        total_length = sum(len(msg.content) for msg in limited_messages)
+        # Somas de tamanho a partir da mensagem mais recente (sufixos)
+        suffix_lengths = list(accumulate(msg.content_len for msg in reversed(limited_messages)))
         
-        if total_length <= self.max_context_length:
-            return limited_messages
+        if suffix_lengths[-1] <= self.max_context_length:
+            return limited_messages, suffix_lengths[-1]
         
-        # Reduzir mensagens até caber no limite
-        filtered_messages = []
-        current_length = 0
+        # Maior sufixo que cabe no limite (busca binária, somas crescentes)
+        keep = bisect_right(suffix_lengths, self.max_context_length)
+        if not keep:
+            return [], 0
         
-        # Começar das mensagens mais recentes
-        for msg in reversed(limited_messages):
-            msg_length = len(msg.content)
-            
-            if current_length + msg_length <= self.max_context_length:
-                filtered_messages.insert(0, msg)
-                current_length += msg_length
-            else:
-                break
+        return limited_messages[len(limited_messages) - keep:], suffix_lengths[keep - 1]
+    
+    def _stable_recent_messages(self, messages: List[Message]) -> List[Message]:
+        """
+        Janela de _filter_recent_messages com início arredondado para
+        history_trim_step: o prefixo só se desloca a cada degrau.
+        """
+        recent = self._filter_recent_messages(messages)
+        start = len(messages) - len(recent)
+        if not start:
+            return recent
         
-        return filtered_messages
+        step = self.history_trim_step
+        stepped_start = -(-start // step) * step
+        
+        # Nunca descartar a mensagem mais recente por causa do arredondamento
+        return messages[stepped_start:] if stepped_start < len(messages) else recent
+    
+    def _get_agent_info(self) -> Dict[str, Any]:
+        """
+        Retorna a identificação do agente.
+        Constante compartilhada da classe (não modificar).
+        """
+        return self._AGENT_INFO
     
     def _get_available_tools_info(self) -> Dict[str, Any]:
         """
         Retorna informações sobre ferramentas disponíveis.
-        Função pura de metadados.
+        Constante compartilhada da classe (não modificar).
         """
         # Em uma implementação real, isso viria do sistema de tools
-        return {
-            "total_tools": 0,  # Será preenchido pelo sistema de tools
-            "categories": [
-                "utilities",
-                "search", 
-                "calculations",
-                "file_operations"
-            ],
-            "note": "Tools específicas são carregadas dinamicamente pelo sistema"
-        }
+        return self._TOOLS_INFO
     
-    def _get_behavior_guidelines(self) -> List[str]:
+    def _get_behavior_guidelines(self) -> Tuple[str, ...]:
         """
         Retorna diretrizes de comportamento do agente.
-        Função pura de configuração.
-        """
-        return [
-            "Seja útil, didático e organizado em suas respostas",
-            "Use a memória da conversa para fornecer contexto consistente", 
-            "Execute funções apenas quando necessário e apropriado",
-            "Explique seu raciocínio quando executar ações complexas",
-            "Trate erros graciosamente e informe sobre problemas",
-            "Mantenha respostas concisas mas completas",
-            "Priorize a segurança em todas as operações"
-        ]
+        Tupla imutável compartilhada (YAML a serializa como lista).
+        """
+        return self._BEHAVIOR_GUIDELINES
     
     def _truncate_content(self, content: str, max_length: int = 200) -> str:
         """
@@ -215,54 +368,81 @@ Responda de forma natural e útil, considerando todo o contexto fornecido acima.
         Prompt de sistema de fallback em caso de erro.
         Função pura de contingência.
         """
-        return """Você é um agente inteligente funcional com as seguintes características:
-
-- Memória persistente entre conversas
-- Capacidade de executar funções estruturadas  
-- Sistema de logging automático
-- Tratamento robusto de erros
-
-Seja útil, didático e organizado em suas respostas. Use contexto de conversas anteriores quando relevante."""
+        return self._FALLBACK_PROMPT
 
-    def build_messages_for_llm(self, thread: Thread, include_system: bool = True) -> List[Dict[str, Any]]:
+    def build_messages_for_llm(self, thread: Thread, include_system: bool = True,
+                               stable_prefix: bool = False,
+                               additional_context: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
         Constrói lista de mensagens no formato esperado pelo LLM.
-        Função pura de transformação para API do OpenAI.
+        Com stable_prefix: [sistema invariante] + histórico, com o contexto da
+        sessão anexado à última mensagem do usuário; o histórico é cortado em
+        degraus de history_trim_step, então o prefixo só muda a cada degrau.
         """
         messages = []
         
         # Adicionar prompt de sistema se solicitado
         if include_system:
-            system_prompt = self.build_system_prompt(thread)
+            system_prompt = (
+                self.build_stable_system_prompt() if stable_prefix
+                else self.build_system_prompt(thread, additional_context)
+            )
             messages.append({
                 "role": "system",
                 "content": system_prompt
             })
         
         # Adicionar mensagens da conversa
-        recent_messages = self._filter_recent_messages(thread.messages)
+        recent_messages = (
+            self._stable_recent_messages(thread.messages) if stable_prefix
+            else self._filter_recent_messages(thread.messages)
+        )
         
         for message in recent_messages:
-            msg_dict = message.to_dict()
-            
-            # Filtrar campos desnecessários para o LLM
+            # Apenas os campos usados pelo LLM, lidos direto da mensagem
             llm_message = {
-                "role": msg_dict["role"],
-                "content": msg_dict["content"]
+                "role": message.role,
+                "content": message.content
             }
             
             # Adicionar function_call se presente
-            if msg_dict.get("function_call"):
-                llm_message["function_call"] = msg_dict["function_call"]
+            if message.function_call:
+                llm_message["function_call"] = message.function_call
             
             # Adicionar name se presente (para mensagens de função)
-            if msg_dict.get("name"):
-                llm_message["name"] = msg_dict["name"]
+            if message.name:
+                llm_message["name"] = message.name
             
             messages.append(llm_message)
         
+        # Parte variável por último, para não invalidar o prefixo em cache.
+        # Vai na mensagem do usuário: vários provedores recusam (ou dão pouco
+        # peso a) uma mensagem de sistema depois da conversa
+        if include_system and stable_prefix:
+            self._attach_session_context(
+                messages, self.build_session_context(thread, additional_context)
+            )
+        
         return messages
     
+    @staticmethod
+    def last_user_index(messages: List[Dict[str, Any]]) -> int:
+        """
+        Índice da última mensagem do usuário (onde vai o contexto da sessão).
+        0 (prompt de sistema) se não houver mensagem do usuário.
+        """
+        return next(
+            (index for index in range(len(messages) - 1, -1, -1) if messages[index]["role"] == "user"),
+            0
+        )
+    
+    @classmethod
+    def _attach_session_context(cls, messages: List[Dict[str, Any]], session_context: str) -> None:
+        """Anexa o contexto da sessão à última mensagem do usuário (cópia do dict)"""
+        index = cls.last_user_index(messages)
+        target = messages[index]
+        messages[index] = {**target, "content": f"{target['content']}\n\n{session_context}"}
+    
     def extract_context_metadata(self, thread: Thread) -> Dict[str, Any]:
         """
         Extrai metadados do contexto para análise.
@@ -275,20 +455,16 @@ Seja útil, didático e organizado em suas respostas. Use contexto de conversas
                 "conversation_length": 0
             }
         
-        recent_messages = self._filter_recent_messages(thread.messages)
+        recent_messages, total_chars = self._filter_recent_with_length(thread.messages)
         
         # Estimativa grosseira de tokens (1 token ≈ 4 caracteres)
-        total_chars = sum(len(msg.content) for msg in recent_messages)
-        estimated_tokens = total_chars // 4
+        estimated_tokens = total_chars >> 2
         
         # Análise de padrões
-        roles_distribution = {}
-        for msg in recent_messages:
-            roles_distribution[msg.role] = roles_distribution.get(msg.role, 0) + 1
+        roles_distribution = dict(Counter(msg.role for msg in recent_messages))
         
-        # Tempo desde última mensagem
-        last_message_time = thread.messages[-1].timestamp if thread.messages else thread.created_at
-        time_since_last = datetime.utcnow() - last_message_time
+        # Tempo desde última mensagem (float: sem datetime/timedelta por chamada)
+        seconds_since_last = time.time() - thread.messages[-1].timestamp_epoch
         
         return {
             "is_empty": False,
@@ -296,7 +472,7 @@ Seja útil, didático e organizado em suas respostas. Use contexto de conversas
             "conversation_length": len(recent_messages),
             "total_messages": len(thread.messages),
             "roles_distribution": roles_distribution,
-            "time_since_last_message_minutes": time_since_last.total_seconds() / 60,
+            "time_since_last_message_minutes": seconds_since_last / 60,
             "context_window_utilization": min(estimated_tokens / 4000, 1.0)  # Assumindo context window de ~4k tokens
         }
 
@@ -314,59 +490,108 @@ class ContextFilter:
     def by_time_window(messages: List[Message], hours: int = 24) -> List[Message]:
         """
         Filtra mensagens por janela de tempo.
-        Função pura de filtragem temporal.
+        Retorna a própria lista quando nada é removido.
         """
         cutoff = datetime.utcnow() - timedelta(hours=hours)
-        return [msg for msg in messages if msg.timestamp >= cutoff]
+        recent = [msg for msg in messages if msg.timestamp >= cutoff]
+        return messages if len(recent) == len(messages) else recent
     
     @staticmethod  
     def by_importance(messages: List[Message], 
-                     importance_fn: Callable[[Message], float]) -> List[Message]:
+                     importance_fn: Callable[[Message], float],
+                     threshold: float = 0.5) -> List[Message]:
         """
         Filtra mensagens por importância usando função customizada.
-        Função de alta ordem para filtragem customizada.
+        Cada mensagem é pontuada uma vez; só as aprovadas são ordenadas.
         """
-        scored_messages = [(msg, importance_fn(msg)) for msg in messages]
-        scored_messages.sort(key=lambda x: x[1], reverse=True)
-        return [msg for msg, score in scored_messages if score > 0.5]
+        scored_messages = [
+            (score, msg)
+            for msg in messages
+            for score in (importance_fn(msg),)
+            if score > threshold
+        ]
+        scored_messages.sort(key=itemgetter(0), reverse=True)
+        return [msg for _, msg in scored_messages]
     
     @staticmethod
-    def remove_system_messages(messages: List[Message]) -> List[Message]:
+    def remove_system_messages(messages: Iterable[Message]) -> List[Message]:
         """
         Remove mensagens de sistema para economia de contexto.
-        Função pura de filtragem por tipo.
+        Aceita qualquer iterável; uma lista sem remoções é retornada como está.
         """
-        return [msg for msg in messages if msg.role != "system"]
+        kept = [msg for msg in messages if msg.role != "system"]
+        if isinstance(messages, list) and len(kept) == len(messages):
+            return messages
+        return kept
     
     @staticmethod
-    def compress_repeated_patterns(messages: List[Message]) -> List[Message]:
+    def compress_repeated_patterns(messages: List[Message],
+                                   threshold: float = 0.8) -> List[Message]:
         """
         Comprime padrões repetidos na conversa.
-        Função pura de compressão inteligente.
+        O conjunto de palavras de cada mensagem é calculado uma única vez.
         """
         if len(messages) <= 2:
             return messages
         
         compressed = [messages[0]]  # Sempre manter primeira mensagem
+        previous = messages[0]
+        previous_words: Optional[frozenset] = None
         
-        for i in range(1, len(messages)):
-            current = messages[i]
-            previous = messages[i-1]
+        for current in messages[1:]:
+            current_words = None
             
             # Evitar mensagens muito similares consecutivas
             if (current.role == previous.role and 
-                len(current.content) > 10 and 
-                len(previous.content) > 10):
+                current.content_len > 10 and 
+                previous.content_len > 10):
                 
-                # Calcular similaridade básica
-                similarity = ContextFilter._calculate_similarity(current.content, previous.content)
+                if current.content == previous.content:
+                    # Repetição exata: similaridade 1.0 sem tokenizar (0.0 se só espaços)
+                    current_words = previous_words
+                    similarity = 0.0 if current.content.isspace() else 1.0
+                else:
+                    if previous_words is None:
+                        previous_words = ContextFilter._word_set(previous.content)
+                    current_words = ContextFilter._word_set(current.content)
+                    
+                    # Calcular similaridade básica
+                    similarity = ContextFilter._jaccard(current_words, previous_words, threshold)
                 
-                if similarity < 0.8:  # Manter se suficientemente diferente
+                if similarity < threshold:  # Manter se suficientemente diferente
                     compressed.append(current)
             else:
                 compressed.append(current)
+            
+            previous, previous_words = current, current_words
         
-        return compressed
+        # Nada removido: devolver a própria lista (permite curto-circuito no chamador)
+        return messages if len(compressed) == len(messages) else compressed
+    
+    @staticmethod
+    def _word_set(text: str) -> frozenset:
+        """
+        Conjunto de palavras (minúsculas) de um texto.
+        Função auxiliar pura.
+        """
+        return frozenset(text.lower().split())
+    
+    @staticmethod
+    def _jaccard(words1: frozenset, words2: frozenset, threshold: float = 0.0) -> float:
+        """
+        Índice de Jaccard entre dois conjuntos de palavras.
+        Pares cuja razão de tamanhos já fica abaixo de threshold não são intersectados.
+        """
+        if not words1 or not words2:
+            return 0.0
+        
+        smaller, larger = sorted((len(words1), len(words2)))
+        if smaller < threshold * larger:
+            # |A ∩ B| / |A ∪ B| <= min / max: abaixo do limiar sem intersectar
+            return smaller / larger
+        
+        intersection = len(words1 & words2)
+        return intersection / (len(words1) + len(words2) - intersection)
     
     @staticmethod
     def _calculate_similarity(text1: str, text2: str) -> float:
@@ -378,16 +603,9 @@ class ContextFilter:
             return 0.0
         
         # Implementação simples baseada em palavras comuns
-        words1 = set(text1.lower().split())
-        words2 = set(text2.lower().split())
-        
-        if not words1 or not words2:
-            return 0.0
-        
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        
-        return len(intersection) / len(union)
+        return ContextFilter._jaccard(
+            ContextFilter._word_set(text1), ContextFilter._word_set(text2)
+        )
 
 # ============================================================================
 # CONTEXT MANAGER E FACTORY
@@ -399,73 +617,132 @@ class ContextManager:
     Combina builder e filters para contexto otimizado.
     """
     
+    # Janela temporal (horas) das estratégias que filtram por idade da mensagem
+    TIME_WINDOW_HOURS: Dict[str, int] = {"recent_only": 6, "default": 48}
+    
     def __init__(self, 
                  max_context_length: int = 8000,
                  max_messages: int = 50,
-                 compression_enabled: bool = True):
+                 compression_enabled: bool = True,
+                 use_cache: bool = True):
         self.builder = ContextBuilder(max_context_length, max_messages)
         self.compression_enabled = compression_enabled
+        self.cache: Optional["ContextCache"] = get_context_cache() if use_cache else None
         self.logger = get_logger()
+        
+        # Tabela de estratégias: nome -> função (mensagens) -> mensagens
+        self._strategies: Dict[str, Callable[[List[Message]], List[Message]]] = {
+            "recent_only": self._recent_only_strategy,
+            "compressed": self._compressed_strategy,
+            "no_system": ContextFilter.remove_system_messages,
+            "stable_prefix": self._stable_prefix_strategy,
+            "minimal": self._minimal_strategy,
+            "default": self._default_strategy
+        }
     
     def prepare_context(self, thread: Thread, 
                        strategy: str = "default",
                        additional_context: Optional[Dict[str, Any]] = None) -> Result:
         """
         Prepara contexto usando estratégia específica.
-        Função de coordenação com tratamento de erros.
+        Resultados sem additional_context são memoizados no ContextCache.
         """
         try:
+            # Cache compartilhado: a chave inclui os limites deste builder
+            cache_key = None
+            if self.cache is not None and additional_context is None:
+                cache_key = (
+                    f"{self.builder.max_messages}x{self.builder.max_context_length}"
+                    f"{'c' if self.compression_enabled else ''}:"
+                    f"{self.cache.get_cache_key(thread, strategy)}"
+                )
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return Result.ok(self._refresh_cached_context(cached))
+            
             # Aplicar estratégia de filtragem
             filtered_thread = self._apply_strategy(thread, strategy)
             
             # Construir contexto estruturado
-            system_prompt = self.builder.build_system_prompt(filtered_thread, additional_context)
-            messages = self.builder.build_messages_for_llm(filtered_thread)
             metadata = self.builder.extract_context_metadata(filtered_thread)
             
-            return Result.ok({
+            if strategy == "stable_prefix":
+                system_prompt = self.builder.build_stable_system_prompt()
+                messages = self.builder.build_messages_for_llm(
+                    filtered_thread, stable_prefix=True, additional_context=additional_context
+                )
+                # Última mensagem do prefixo estável, antes da que leva o contexto
+                # da sessão (ponto para cache_control/ephemeral)
+                session_index = ContextBuilder.last_user_index(messages)
+                metadata = {**metadata, "cache_breakpoints": [max(session_index - 1, 0)]}
+            else:
+                system_prompt = self.builder.build_system_prompt(filtered_thread, additional_context)
+                messages = self.builder.build_messages_for_llm(filtered_thread)
+            
+            context_data = {
                 "system_prompt": system_prompt,
                 "messages": messages,
                 "metadata": metadata,
                 "strategy_used": strategy
-            })
+            }
+            
+            if cache_key is not None:
+                self.cache.set(
+                    cache_key,
+                    {
+                        "context": context_data,
+                        "last_message_epoch": (
+                            filtered_thread.messages[-1].timestamp_epoch
+                            if filtered_thread.messages else None
+                        )
+                    },
+                    valid_until=self._window_valid_until(filtered_thread, strategy)
+                )
+            
+            return Result.ok(context_data)
             
         except Exception as e:
             error_msg = f"Erro ao preparar contexto: {str(e)}"
             self.logger.log_error(error_msg)
             return Result.error(error_msg)
     
+    def _window_valid_until(self, thread: Thread, strategy: str) -> Optional[float]:
+        """
+        Instante (epoch) em que a mensagem mais antiga mantida sai da janela
+        temporal da estratégia; None se a estratégia não filtra por tempo.
+        """
+        hours = self.TIME_WINDOW_HOURS.get(
+            strategy if strategy in self._strategies else "default"
+        )
+        if hours is None or not thread.messages:
+            return None
+        
+        oldest = min(message.timestamp_epoch for message in thread.messages)
+        return oldest + hours * 3600
+    
+    @staticmethod
+    def _refresh_cached_context(cached: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Contexto de uma entrada do cache (cópia) com os campos que dependem
+        do relógio recalculados.
+        """
+        context_data = cached["context"]
+        metadata = context_data["metadata"]
+        if cached["last_message_epoch"] is not None and "time_since_last_message_minutes" in metadata:
+            metadata["time_since_last_message_minutes"] = (time.time() - cached["last_message_epoch"]) / 60
+        return context_data
+    
     def _apply_strategy(self, thread: Thread, strategy: str) -> Thread:
         """
         Aplica estratégia específica de filtragem.
-        Função pura de transformação.
+        Estratégias desconhecidas usam a padrão (balanceada).
         """
-        messages = thread.messages
+        apply = self._strategies.get(strategy, self._default_strategy)
+        messages = apply(thread.messages)
         
-        if strategy == "recent_only":
-            # Apenas mensagens das últimas 6 horas
-            messages = ContextFilter.by_time_window(messages, hours=6)
-            
-        elif strategy == "compressed":
-            # Compressão inteligente de padrões
-            if self.compression_enabled:
-                messages = ContextFilter.compress_repeated_patterns(messages)
-            
-        elif strategy == "no_system":
-            # Remover mensagens de sistema para economia
-            messages = ContextFilter.remove_system_messages(messages)
-            
-        elif strategy == "minimal":
-            # Contexto mínimo - apenas últimas mensagens essenciais
-            messages = messages[-5:] if len(messages) > 5 else messages
-            messages = ContextFilter.remove_system_messages(messages)
-            
-        # Estratégia padrão - balanceada
-        # Aplica filtragem temporal suave e compressão se habilitada
-        else:  # strategy == "default"
-            if self.compression_enabled:
-                messages = ContextFilter.compress_repeated_patterns(messages)
-            messages = ContextFilter.by_time_window(messages, hours=48)  # 48h de janela
+        # Nenhuma filtragem efetiva: a thread original serve como está
+        if messages is thread.messages:
+            return thread
         
         # Retornar nova thread com mensagens filtradas
         return Thread(
@@ -475,6 +752,36 @@ class ContextManager:
             created_at=thread.created_at,
             updated_at=thread.updated_at
         )
+    
+    def _recent_only_strategy(self, messages: List[Message]) -> List[Message]:
+        """Apenas mensagens das últimas 6 horas"""
+        return ContextFilter.by_time_window(messages, hours=self.TIME_WINDOW_HOURS["recent_only"])
+    
+    def _compressed_strategy(self, messages: List[Message]) -> List[Message]:
+        """Compressão inteligente de padrões"""
+        if self.compression_enabled:
+            return ContextFilter.compress_repeated_patterns(messages)
+        return messages
+    
+    def _stable_prefix_strategy(self, messages: List[Message]) -> List[Message]:
+        """
+        Histórico só cresce por append: sem compressão/janela temporal que
+        alterem o meio da lista (prefixo estável para cache de prompt).
+        """
+        return messages
+    
+    def _minimal_strategy(self, messages: List[Message]) -> List[Message]:
+        """Contexto mínimo - apenas últimas mensagens essenciais"""
+        return ContextFilter.remove_system_messages(messages[-5:])
+    
+    def _default_strategy(self, messages: List[Message]) -> List[Message]:
+        """
+        Estratégia padrão - balanceada.
+        Aplica filtragem temporal suave e compressão se habilitada.
+        """
+        if self.compression_enabled:
+            messages = ContextFilter.compress_repeated_patterns(messages)
+        return ContextFilter.by_time_window(messages, hours=self.TIME_WINDOW_HOURS["default"])  # 48h de janela
 
 # ============================================================================
 # CONTEXT SERIALIZERS E EXPORTERS
@@ -486,6 +793,16 @@ class ContextExporter:
     Útil para debugging, análise e backups.
     """
     
+    # Builder compartilhado só para metadados (evita reserializar as seções estáticas por exportação)
+    _metadata_builder: Optional[ContextBuilder] = None
+    
+    @classmethod
+    def _get_metadata_builder(cls) -> ContextBuilder:
+        """Builder padrão reutilizado entre exportações"""
+        if cls._metadata_builder is None:
+            cls._metadata_builder = ContextBuilder()
+        return cls._metadata_builder
+    
     @staticmethod
     def to_yaml(thread: Thread, include_metadata: bool = True) -> str:
         """
@@ -495,8 +812,8 @@ class ContextExporter:
         data = {
             "session_info": {
                 "session_id": thread.session_id,
-                "created_at": thread.created_at.isoformat(),
-                "updated_at": thread.updated_at.isoformat(),
+                "created_at": thread.created_at_iso,
+                "updated_at": thread.updated_at_iso,
                 "total_messages": len(thread.messages),
                 "total_tool_calls": len(thread.tools_calls)
             },
@@ -508,7 +825,7 @@ class ContextExporter:
             message_data = {
                 "index": i + 1,
                 "role": msg.role,
-                "timestamp": msg.timestamp.isoformat(),
+                "timestamp": msg.timestamp_iso,
                 "content": msg.content
             }
             
@@ -529,94 +846,75 @@ class ContextExporter:
                     "name": tc.name,
                     "arguments": tc.arguments,
                     "status": tc.status,
-                    "timestamp": tc.timestamp.isoformat(),
+                    "timestamp": tc.timestamp_iso,
                     "result": tc.result,
                     "error": tc.error
                 })
         
         # Adicionar metadados se solicitado
         if include_metadata:
-            builder = ContextBuilder()
-            metadata = builder.extract_context_metadata(thread)
-            data["metadata"] = metadata
+            data["metadata"] = ContextExporter._get_metadata_builder().extract_context_metadata(thread)
         
-        return yaml.dump(data, default_flow_style=False, allow_unicode=True, sort_keys=False)
+        return dump_yaml(data, default_flow_style=False, allow_unicode=True, sort_keys=False)
+    
+    # Cabeçalho de seção por role (demais roles usam o nome capitalizado)
+    _ROLE_HEADERS = {
+        "user": "## 👤 Usuário",
+        "assistant": "## 🤖 Assistente",
+        "system": "## ⚙️ Sistema"
+    }
+    
+    _STATUS_EMOJIS = {"success": "✅", "error": "❌"}
     
     @staticmethod
-    def to_markdown(thread: Thread) -> str:
+    def to_markdown(thread: Thread, out: Optional[TextIO] = None) -> Optional[str]:
         """
         Exporta thread para formato Markdown legível.
-        Função pura de formatação.
+        Escreve em `out` se fornecido (retorna None); senão retorna a string.
         """
-        lines = []
+        buf = out if out is not None else io.StringIO()
+        write = buf.write
+        role_headers = ContextExporter._ROLE_HEADERS
         
         # Cabeçalho
-        lines.append(f"# Conversa: {thread.session_id}")
-        lines.append(f"**Criada em:** {thread.created_at.strftime('%d/%m/%Y %H:%M:%S')}")
-        lines.append(f"**Atualizada em:** {thread.updated_at.strftime('%d/%m/%Y %H:%M:%S')}")
-        lines.append(f"**Total de mensagens:** {len(thread.messages)}")
-        lines.append("")
-        lines.append("---")
-        lines.append("")
+        write(
+            f"# Conversa: {thread.session_id}\n"
+            f"**Criada em:** {thread.created_at.strftime('%d/%m/%Y %H:%M:%S')}\n"
+            f"**Atualizada em:** {thread.updated_at.strftime('%d/%m/%Y %H:%M:%S')}\n"
+            f"**Total de mensagens:** {len(thread.messages)}\n"
+            "\n---\n\n"
+        )
         
         # Mensagens
-        for i, msg in enumerate(thread.messages):
-            timestamp = msg.timestamp.strftime('%H:%M:%S')
-            
-            if msg.role == "user":
-                lines.append(f"## 👤 Usuário ({timestamp})")
-            elif msg.role == "assistant":
-                lines.append(f"## 🤖 Assistente ({timestamp})")
-            elif msg.role == "system":
-                lines.append(f"## ⚙️ Sistema ({timestamp})")
-            else:
-                lines.append(f"## 🔧 {msg.role.title()} ({timestamp})")
-            
-            lines.append("")
-            lines.append(msg.content)
-            lines.append("")
+        for msg in thread.messages:
+            header = role_headers.get(msg.role) or f"## 🔧 {msg.role.title()}"
+            # HH:MM:SS recortado do ISO memoizado (mesmo texto de strftime('%H:%M:%S'))
+            write(f"{header} ({msg.timestamp_iso[11:19]})\n\n{msg.content}\n\n")
             
             # Adicionar info de function call se existir
             if msg.function_call:
-                lines.append("**Chamada de Função:**")
-                lines.append(f"```json")
-                lines.append(yaml.dump(msg.function_call, default_flow_style=False))
-                lines.append("```")
-                lines.append("")
+                write(f"**Chamada de Função:**\n```json\n{dumps(msg.function_call, indent=2)}\n```\n\n")
         
         # Tool calls se existirem
         if thread.tools_calls:
-            lines.append("---")
-            lines.append("")
-            lines.append("## 🛠️ Histórico de Ferramentas")
-            lines.append("")
+            write("---\n\n## 🛠️ Histórico de Ferramentas\n\n")
             
             for tc in thread.tools_calls:
-                status_emoji = "✅" if tc.status == "success" else "❌" if tc.status == "error" else "⏳"
-                lines.append(f"### {status_emoji} {tc.name} ({tc.timestamp.strftime('%H:%M:%S')})")
-                lines.append("")
-                lines.append("**Argumentos:**")
-                lines.append(f"```yaml")
-                lines.append(yaml.dump(tc.arguments, default_flow_style=False))
-                lines.append("```")
+                status_emoji = ContextExporter._STATUS_EMOJIS.get(tc.status, "⏳")
+                write(
+                    f"### {status_emoji} {tc.name} ({tc.timestamp_iso[11:19]})\n\n"
+                    f"**Argumentos:**\n```yaml\n{dump_yaml(tc.arguments, default_flow_style=False)}\n```\n"
+                )
                 
                 if tc.result:
-                    lines.append("")
-                    lines.append("**Resultado:**")
-                    lines.append(f"```")
-                    lines.append(str(tc.result))
-                    lines.append("```")
+                    write(f"\n**Resultado:**\n```\n{tc.result}\n```\n")
                 
                 if tc.error:
-                    lines.append("")
-                    lines.append("**Erro:**")
-                    lines.append(f"```")
-                    lines.append(tc.error)
-                    lines.append("```")
+                    write(f"\n**Erro:**\n```\n{tc.error}\n```\n")
                 
-                lines.append("")
+                write("\n")
         
-        return "\n".join(lines)
+        return buf.getvalue() if out is None else None
     
     @staticmethod
     def to_json(thread: Thread, pretty: bool = True) -> str:
@@ -627,9 +925,9 @@ class ContextExporter:
         data = thread.to_dict()
         
         if pretty:
-            return json.dumps(data, ensure_ascii=False, indent=2, sort_keys=False, default=str)
+            return dumps(data, indent=2)
         else:
-            return json.dumps(data, ensure_ascii=False, default=str)
+            return dumps(data)
 
 # ============================================================================
 # CONTEXT VALIDATORS
@@ -663,27 +961,28 @@ class ContextValidator:
         if thread.updated_at < thread.created_at:
             errors.append("updated_at não pode ser anterior a created_at")
         
-        # Validar mensagens
-        for i, msg in enumerate(thread.messages):
-            msg_errors = ContextValidator._validate_message(msg, i)
-            errors.extend(msg_errors)
-        
-        # Validar sequência temporal das mensagens
-        if len(thread.messages) > 1:
-            for i in range(1, len(thread.messages)):
-                current = thread.messages[i]
-                previous = thread.messages[i-1]
-                
-                if current.timestamp < previous.timestamp:
-                    warnings.append(f"Mensagem {i+1} tem timestamp anterior à mensagem {i}")
+        messages = thread.messages
+        tools_calls = thread.tools_calls
+        message_count = len(messages)
+        tool_call_count = len(tools_calls)
+        validate_message = ContextValidator._validate_message
+        validate_tool_call = ContextValidator._validate_tool_call
+        
+        # Validar mensagens e sequência temporal numa única passada
+        prev_timestamp = None
+        for i, msg in enumerate(messages):
+            errors.extend(validate_message(msg, i))
+            timestamp = msg.timestamp
+            if prev_timestamp is not None and timestamp < prev_timestamp:
+                warnings.append(f"Mensagem {i+1} tem timestamp anterior à mensagem {i}")
+            prev_timestamp = timestamp
         
         # Validar tool calls
-        for i, tc in enumerate(thread.tools_calls):
-            tc_errors = ContextValidator._validate_tool_call(tc, i)
-            errors.extend(tc_errors)
+        for i, tc in enumerate(tools_calls):
+            errors.extend(validate_tool_call(tc, i))
         
         # Verificar coerência geral
-        if len(thread.messages) == 0 and len(thread.tools_calls) > 0:
+        if message_count == 0 and tool_call_count > 0:
             warnings.append("Thread tem tool calls mas nenhuma mensagem")
         
         # Retornar resultado
@@ -698,8 +997,8 @@ class ContextValidator:
             "errors": [],
             "warnings": warnings,
             "valid": True,
-            "message_count": len(thread.messages),
-            "tool_call_count": len(thread.tools_calls)
+            "message_count": message_count,
+            "tool_call_count": tool_call_count
         })
     
     @staticmethod
@@ -713,7 +1012,7 @@ class ContextValidator:
         if not message.role:
             errors.append(f"Mensagem {index+1}: role não pode estar vazio")
         
-        if message.role not in ["system", "user", "assistant", "function"]:
+        if message.role not in VALID_MESSAGE_ROLES:
             errors.append(f"Mensagem {index+1}: role inválido '{message.role}'")
         
         if not message.content and not message.function_call:
@@ -744,7 +1043,7 @@ class ContextValidator:
         if not tool_call.timestamp:
             errors.append(f"Tool call {index+1}: timestamp não pode estar vazio")
         
-        if tool_call.status not in ["pending", "success", "error"]:
+        if tool_call.status not in VALID_TOOL_CALL_STATUSES:
             errors.append(f"Tool call {index+1}: status inválido '{tool_call.status}'")
         
         if tool_call.status == "error" and not tool_call.error:
@@ -761,7 +1060,8 @@ class ContextValidator:
 
 def create_context_manager(max_context_length: int = 8000, 
                           max_messages: int = 50,
-                          compression_enabled: bool = True) -> ContextManager:
+                          compression_enabled: bool = True,
+                          use_cache: bool = True) -> ContextManager:
     """
     Factory function para criar ContextManager.
     Função pura de criação com configurações personalizadas.
@@ -769,7 +1069,8 @@ def create_context_manager(max_context_length: int = 8000,
     return ContextManager(
         max_context_length=max_context_length,
         max_messages=max_messages,
-        compression_enabled=compression_enabled
+        compression_enabled=compression_enabled,
+        use_cache=use_cache
     )
 
 def build_context(thread: Thread, 
@@ -810,72 +1111,111 @@ def validate_thread_integrity(thread: Thread) -> Result:
 class ContextCache:
     """
     Cache simples para contextos processados.
-    Evita reprocessamento desnecessário de contextos idênticos.
+    Guarda cópias dos dicts sem compressão; compression (ex.: ("zstd", "zlib"))
+    é opt-in para caches grandes em que memória pesa mais que CPU.
     """
     
-    def __init__(self, max_size: int = 100):
+    # Abaixo disso a compressão não compensa
+    COMPRESSION_MIN_BYTES = 1024
+    
+    def __init__(self, max_size: int = 100,
+                 compression: Optional[Sequence[str]] = None):
         self.max_size = max_size
-        self._cache: Dict[str, Any] = {}
-        self._access_order: List[str] = []
+        # Ordem de inserção = ordem de acesso (LRU em O(1) com move_to_end)
+        # Valores: (cópia do dict ou bytes comprimidos, validade em epoch ou None)
+        self._cache: "OrderedDict[str, Tuple[Union[Dict[str, Any], bytes], Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.compressor: Optional[Compressor] = get_compressor(compression) if compression else None
+        self.original_bytes = 0
+        self.compressed_bytes = 0
         self.logger = get_logger()
     
+    def _encode(self, context_data: Dict[str, Any]) -> Union[Dict[str, Any], bytes]:
+        """Cópia do payload (comprimida quando vale a pena)"""
+        if self.compressor is None:
+            return deepcopy(context_data)
+        
+        payload = dumps_bytes(context_data)
+        if len(payload) < self.COMPRESSION_MIN_BYTES:
+            return deepcopy(context_data)
+        
+        blob = self.compressor.compress(payload)
+        self.original_bytes += len(payload)
+        self.compressed_bytes += len(blob)
+        return blob
+    
+    def _decode(self, stored: Union[Dict[str, Any], bytes]) -> Dict[str, Any]:
+        """Inverso de _encode (o chamador recebe sempre um dict próprio)"""
+        if isinstance(stored, bytes):
+            return loads(self.compressor.decompress(stored))
+        return deepcopy(stored)
+    
     def get_cache_key(self, thread: Thread, strategy: str) -> str:
         """
         Gera chave de cache baseada em thread e estratégia.
-        Função pura de hash.
+        O(1): instância e version_id mudam sempre que o conteúdo muda.
         """
-        # Usar hash do conteúdo + estratégia + timestamp de atualização
-        content_hash = hash(str(thread.to_dict()))
-        return f"{thread.session_id}_{strategy}_{content_hash}_{thread.updated_at.timestamp()}"
+        return f"{thread.session_id}_{strategy}_{thread.instance_id}v{thread.version_id}"
     
     def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
         """
-        Recupera contexto do cache se existir.
+        Recupera cópia do contexto se existir e ainda for válido.
         Atualiza ordem de acesso (LRU).
         """
-        if cache_key in self._cache:
-            # Mover para o fim (mais recente)
-            self._access_order.remove(cache_key)
-            self._access_order.append(cache_key)
+        with self._lock:
+            entry = self._cache.get(cache_key)
+            if entry is None:
+                return None
+            
+            stored, valid_until = entry
+            if valid_until is not None and time.time() >= valid_until:
+                del self._cache[cache_key]
+                return None
             
-            self.logger.log_info("Context cache hit", cache_key=cache_key)
-            return self._cache[cache_key]
+            # Mover para o fim (mais recente)
+            self._cache.move_to_end(cache_key)
         
-        return None
+        return self._decode(stored)
     
-    def set(self, cache_key: str, context_data: Dict[str, Any]) -> None:
+    def set(self, cache_key: str, context_data: Dict[str, Any],
+            valid_until: Optional[float] = None) -> None:
         """
-        Armazena contexto no cache.
+        Armazena cópia do contexto, válida até valid_until (epoch) se informado.
         Implementa evicção LRU se necessário.
         """
-        # Remover se já existe
-        if cache_key in self._cache:
-            self._access_order.remove(cache_key)
-        
-        # Evicção se cache cheio
-        while len(self._cache) >= self.max_size and self._access_order:
-            oldest_key = self._access_order.pop(0)
-            del self._cache[oldest_key]
-        
-        # Adicionar novo item
-        self._cache[cache_key] = context_data
-        self._access_order.append(cache_key)
+        stored = self._encode(context_data)
         
-        self.logger.log_info("Context cached", cache_key=cache_key, cache_size=len(self._cache))
+        with self._lock:
+            if cache_key in self._cache:
+                self._cache.move_to_end(cache_key)
+            self._cache[cache_key] = (stored, valid_until)
+            
+            # Evicção dos menos recentes se cache cheio
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
     
     def clear(self) -> None:
         """Limpa todo o cache."""
-        self._cache.clear()
-        self._access_order.clear()
+        with self._lock:
+            self._cache.clear()
         self.logger.log_info("Context cache cleared")
     
     def get_stats(self) -> Dict[str, Any]:
         """Retorna estatísticas do cache."""
+        with self._lock:
+            keys = list(self._cache.keys())
+        
         return {
-            "size": len(self._cache),
+            "size": len(keys),
             "max_size": self.max_size,
-            "utilization": len(self._cache) / self.max_size,
-            "keys": list(self._cache.keys())
+            "utilization": len(keys) / self.max_size,
+            "keys": keys,
+            "compression": self.compressor.name if self.compressor else None,
+            "original_bytes": self.original_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "compression_ratio": (
+                self.original_bytes / self.compressed_bytes if self.compressed_bytes else None
+            )
         }
 
 # Cache global (opcional)
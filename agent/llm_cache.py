@@ -0,0 +1,276 @@
+import re
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+from contextlib import contextmanager
+from functools import lru_cache
+
+from models.models import Result
+from agent.context import SESSION_CONTEXT_HEADER
+from agent.logger import get_logger
+from agent.memory import SQLITE_PRAGMAS
+from agent.serialization import dumps, dumps_bytes, loads
+
+# ============================================================================
+# CACHE DE RESPOSTAS LLM
+# ============================================================================
+
+# Campos do contexto da sessão que mudam a cada turno sem alterar o pedido
+# (relógio e contadores); o restante do bloco de sistema faz parte da chave
+VOLATILE_SYSTEM_FIELDS = ("updated_at", "last_activity", "message_count", "tools_used")
+
+_VOLATILE_LINE = re.compile(
+    r"^[ \t]*(?:%s):.*(?:\n|$)" % "|".join(VOLATILE_SYSTEM_FIELDS),
+    re.MULTILINE
+)
+
+def _strip_volatile_fields(content: str) -> str:
+    """Remove do YAML de sistema as linhas dos campos voláteis"""
+    return _VOLATILE_LINE.sub("", content)
+
+def _key_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Mensagem como entra na chave: sem os campos voláteis no prompt de sistema
+    e no bloco de contexto da sessão (anexado à mensagem do usuário).
+    """
+    content = message.get("content") or ""
+    if message.get("role") == "system":
+        return {**message, "content": _strip_volatile_fields(content)}
+    
+    head, header, session_block = content.partition(SESSION_CONTEXT_HEADER)
+    if not header:
+        return message
+    return {**message, "content": head + header + _strip_volatile_fields(session_block)}
+
+class LLMCache:
+    """
+    Cache exato de respostas do LLM persistido em SQLite.
+    A chave é a assinatura determinística da requisição (modelo, mensagens,
+    ferramentas e parâmetros de amostragem).
+    """
+    
+    # Intervalo mínimo entre limpezas automáticas de entradas expiradas
+    CLEANUP_INTERVAL_SECONDS = 3600
+    
+    def __init__(self, db_path: str = "memory.db", ttl_seconds: int = 86400):
+        self.db_path = Path(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.logger = get_logger()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._next_cleanup = 0.0
+        self._conn = self._open_connection()
+        self._initialize_db()
+    
+    def _open_connection(self) -> sqlite3.Connection:
+        """
+        Abre a conexão persistente (reutilizada por todas as operações).
+        Mesmos PRAGMAs da memória, que compartilha o arquivo.
+        """
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        
+        return conn
+    
+    def _initialize_db(self) -> None:
+        """
+        Cria a tabela de cache se necessário e remove entradas expiradas.
+        Efeito colateral controlado na inicialização.
+        """
+        with self._get_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    token_cost INTEGER DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache(created_at)")
+        
+        self._maybe_cleanup()
+    
+    @contextmanager
+    def _get_connection(self):
+        """
+        Context manager para acesso serializado à conexão persistente.
+        """
+        with self._lock:
+            yield self._conn
+    
+    def close(self) -> None:
+        """Fecha a conexão persistente."""
+        with self._lock:
+            self._conn.close()
+    
+    @staticmethod
+    def make_key(call_params: Dict[str, Any]) -> str:
+        """
+        Gera chave determinística para os parâmetros da chamada.
+        Prompt e contexto da sessão entram sem os campos voláteis (VOLATILE_SYSTEM_FIELDS).
+        """
+        signature = {
+            "model": call_params.get("model"),
+            "messages": [_key_message(message) for message in call_params.get("messages") or []],
+            "tools": call_params.get("tools"),
+            "temperature": call_params.get("temperature"),
+            "max_tokens": call_params.get("max_tokens")
+        }
+        return hashlib.sha256(dumps_bytes(signature, sort_keys=True)).hexdigest()
+    
+    def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Recupera resposta do cache se existir e não tiver expirado.
+        """
+        cutoff = (datetime.utcnow() - timedelta(seconds=self.ttl_seconds)).isoformat()
+        
+        try:
+            with self._get_connection() as conn:
+                row = conn.execute(
+                    "SELECT response FROM llm_cache WHERE key = ? AND created_at >= ?",
+                    (cache_key, cutoff)
+                ).fetchone()
+                
+                if row is None:
+                    self.misses += 1
+                    return None
+                
+                self.hits += 1
+        except sqlite3.Error as e:
+            self.logger.log_error(f"Erro ao consultar cache LLM: {str(e)}")
+            return None
+        
+        return loads(row['response'])
+    
+    def set(self, cache_key: str, model: str, response_data: Dict[str, Any]) -> None:
+        """
+        Armazena resposta no cache (upsert).
+        Aproveita a escrita para a limpeza periódica das entradas expiradas.
+        """
+        usage = response_data.get("usage") or {}
+        
+        try:
+            with self._get_connection() as conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO llm_cache
+                    (key, model, response, created_at, token_cost)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (
+                    cache_key,
+                    model,
+                    dumps(response_data),
+                    datetime.utcnow().isoformat(),
+                    usage.get("total_tokens", 0)
+                ))
+        except sqlite3.Error as e:
+            self.logger.log_error(f"Erro ao gravar cache LLM: {str(e)}")
+            return
+        
+        self._maybe_cleanup()
+    
+    async def aget(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Versão assíncrona de get.
+        A consulta SQLite roda no executor padrão, fora do loop de eventos.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get, cache_key)
+    
+    async def aset(self, cache_key: str, model: str, response_data: Dict[str, Any]) -> None:
+        """
+        Versão assíncrona de set.
+        A escrita SQLite roda no executor padrão, fora do loop de eventos.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.set, cache_key, model, response_data)
+    
+    def _maybe_cleanup(self) -> None:
+        """
+        Executa cleanup_expired no máximo uma vez por CLEANUP_INTERVAL_SECONDS.
+        """
+        now = time.monotonic()
+        if now < self._next_cleanup:
+            return
+        
+        self._next_cleanup = now + self.CLEANUP_INTERVAL_SECONDS
+        result = self.cleanup_expired()
+        if not result.success:
+            self.logger.log_error(result.error)
+    
+    def cleanup_expired(self) -> Result:
+        """
+        Remove entradas expiradas do cache.
+        Operação de manutenção.
+        """
+        cutoff = (datetime.utcnow() - timedelta(seconds=self.ttl_seconds)).isoformat()
+        
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (cutoff,))
+                return Result.ok({"removed_entries": cursor.rowcount})
+        except Exception as e:
+            return Result.error(f"Erro na limpeza do cache LLM: {str(e)}")
+    
+    def clear(self) -> None:
+        """Limpa todo o cache."""
+        with self._get_connection() as conn:
+            conn.execute("DELETE FROM llm_cache")
+        self.logger.log_info("LLM cache cleared")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna estatísticas do cache."""
+        with self._get_connection() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) as count, COALESCE(SUM(token_cost), 0) as tokens FROM llm_cache"
+            ).fetchone()
+        
+        lookups = self.hits + self.misses
+        return {
+            "entries": row['count'],
+            "cached_tokens": row['tokens'],
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+# ============================================================================
+# INSTÂNCIA GLOBAL (SINGLETON PATTERN)
+# ============================================================================
+
+# Instâncias criadas por _llm_cache_for (o lru_cache não expõe seus valores)
+_llm_cache_instances: List[LLMCache] = []
+
+@lru_cache(maxsize=None)
+def _llm_cache_for(db_path: str, ttl_seconds: int) -> LLMCache:
+    """Uma instância por (banco, TTL); instâncias em uso nunca são fechadas aqui"""
+    cache = LLMCache(db_path, ttl_seconds)
+    _llm_cache_instances.append(cache)
+    return cache
+
+def get_llm_cache(db_path: str = "memory.db", ttl_seconds: int = 86400) -> LLMCache:
+    """
+    Retorna instância do cache LLM (singleton por db_path e TTL).
+    Agentes com configurações diferentes não fecham o cache uns dos outros.
+    """
+    return _llm_cache_for(str(db_path), ttl_seconds)
+
+def reset_llm_cache() -> None:
+    """
+    Fecha e descarta as instâncias de get_llm_cache (ex.: em testes).
+    Agentes que ainda as referenciam deixam de poder usá-las.
+    """
+    _llm_cache_for.cache_clear()
+    while _llm_cache_instances:
+        _llm_cache_instances.pop().close()
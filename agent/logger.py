@@ -2,27 +2,46 @@ import json
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Iterator, Optional, List
 from contextlib import contextmanager
 import threading
+import atexit
+import queue
+from logging.handlers import QueueHandler, QueueListener
+import time
 from dataclasses import asdict
+from functools import lru_cache
 
 from models.models import Event, EventType, Result
+from agent.serialization import dumps, dumps_bytes, loads
 
 # ============================================================================
 # CONFIGURAÇÃO DE LOGGING ESTRUTURADO
 # ============================================================================
 
+# Nível de log por tipo de evento
+EVENT_LOG_LEVELS: Dict[str, int] = {
+    "error": logging.ERROR,
+    "system": logging.WARNING,
+    "function_call": logging.INFO,
+    "function_result": logging.INFO,
+    "user_message": logging.DEBUG,
+    "assistant_response": logging.DEBUG
+}
+DEFAULT_EVENT_LOG_LEVEL = logging.INFO
+
 class StructuredLogger:
     """
     Logger estruturado thread-safe para observabilidade do agente.
     Segue princípios funcionais e produz logs em formato JSON.
     """
     
-    def __init__(self, log_file: str = "agent.log", level: int = logging.INFO):
+    def __init__(self, log_file: str = "agent.log", level: int = logging.INFO,
+                 buffer_capacity: int = 256, flush_interval: float = 0.1):
         self.log_file = Path(log_file)
+        self.buffer_capacity = buffer_capacity
+        self.flush_interval = flush_interval
         self.level = level
-        self._lock = threading.Lock()
         self._setup_logger()
     
     def _setup_logger(self) -> None:
@@ -39,8 +58,12 @@ class StructuredLogger:
         
         # Evitar duplicação de handlers
         if not self.logger.handlers:
-            # Handler para arquivo
-            file_handler = logging.FileHandler(self.log_file, encoding='utf-8')
+            # Handler para arquivo (gravação em lote, fora do caminho crítico)
+            file_handler = BufferedFileHandler(
+                self.log_file,
+                capacity=self.buffer_capacity,
+                flush_interval=self.flush_interval
+            )
             file_handler.setLevel(self.level)
             
             # Handler para console
@@ -57,7 +80,17 @@ class StructuredLogger:
             )
             console_handler.setFormatter(console_formatter)
             
-            self.logger.addHandler(file_handler)
+            # Arquivo JSON: produtores só enfileiram; uma thread de fundo grava
+            log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+            listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+            queue_handler = InProcessQueueHandler(log_queue, listener)
+            queue_handler.start_listener()
+            atexit.register(queue_handler.stop_listener)
+            
+            self.logger.addHandler(queue_handler)
+            
+            # Console síncrono: avisos saem na ordem do código, sem se intercalar
+            # com o prompt de input() da interface interativa
             self.logger.addHandler(console_handler)
     
     def log_event(self, event: Event) -> Result:
@@ -66,37 +99,46 @@ class StructuredLogger:
         Função com efeito colateral controlado.
         """
         try:
-            with self._lock:
-                log_entry = {
-                    "timestamp": event.timestamp.isoformat(),
-                    "event_type": event.type,
-                    "session_id": event.session_id,
-                    "data": event.data
-                }
-                
-                # Log no nível apropriado baseado no tipo de evento
-                level = self._get_log_level(event.type)
-                self.logger.log(level, json.dumps(log_entry, ensure_ascii=False, default=str))
-                
-                return Result.ok(log_entry)
-                
+            log_entry = {
+                "timestamp": event.timestamp.isoformat(),
+                "event_type": event.type,
+                "session_id": event.session_id,
+                "data": event.data
+            }
+            
+            # Log no nível apropriado baseado no tipo de evento; o dict segue no
+            # record (JsonFormatter não reparseia) e o texto só é gerado se exibido
+            level = self._get_log_level(event.type)
+            self.logger.log(level, LazyJsonMessage(log_entry), extra={"_structured": log_entry})
+            
+            return Result.ok(log_entry)
+            
         except Exception as e:
             return Result.error(f"Erro ao registrar evento: {str(e)}")
     
+    def flush(self) -> None:
+        """
+        Grava no disco os registros ainda em fila/buffer.
+        Chamado no encerramento do agente.
+        """
+        for handler in self.logger.handlers:
+            handler.flush()
+    
+    def close(self) -> None:
+        """
+        Encerra a thread de gravação após drenar a fila.
+        Registros posteriores ficam na fila até um novo flush.
+        """
+        for handler in self.logger.handlers:
+            if isinstance(handler, InProcessQueueHandler):
+                handler.stop_listener()
+    
     def _get_log_level(self, event_type: EventType) -> int:
         """
         Mapeia tipos de evento para níveis de log.
         Função pura de mapeamento.
         """
-        level_mapping = {
-            "error": logging.ERROR,
-            "system": logging.WARNING,
-            "function_call": logging.INFO,
-            "function_result": logging.INFO,
-            "user_message": logging.DEBUG,
-            "assistant_response": logging.DEBUG
-        }
-        return level_mapping.get(event_type, logging.INFO)
+        return EVENT_LOG_LEVELS.get(event_type, DEFAULT_EVENT_LOG_LEVEL)
     
     def log_info(self, message: str, **kwargs) -> Result:
         """Conveniência para logs de informação"""
@@ -141,6 +183,118 @@ class StructuredLogger:
         )
         return self.log_event(event)
 
+class BufferedFileHandler(logging.FileHandler):
+    """
+    FileHandler que acumula linhas formatadas e grava em lote (writelines).
+    Descarrega ao atingir a capacidade, após flush_interval segundos desde a
+    última gravação, em registros ERROR+ e no fechamento.
+    """
+    
+    def __init__(self, filename: Path, capacity: int = 256, flush_interval: float = 0.1,
+                 flush_level: int = logging.ERROR):
+        super().__init__(filename, encoding='utf-8')
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        """Formata e enfileira o registro; grava se necessário"""
+        try:
+            self._buffer.append(self.format(record) + self.terminator)
+            
+            if (len(self._buffer) >= self.capacity
+                    or record.levelno >= self.flush_level
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+        except Exception:
+            self.handleError(record)
+    
+    def flush(self) -> None:
+        """Grava o buffer em uma única chamada de escrita"""
+        self.acquire()
+        try:
+            if self._buffer:
+                if self.stream is None:
+                    self.stream = self._open()
+                self.stream.writelines(self._buffer)
+                self._buffer.clear()
+            self._last_flush = time.monotonic()
+            super().flush()
+        finally:
+            self.release()
+    
+    def close(self) -> None:
+        """Descarrega o buffer antes de fechar o arquivo"""
+        self.flush()
+        super().close()
+
+class InProcessQueueHandler(QueueHandler):
+    """
+    QueueHandler para fila no mesmo processo, ligado ao seu QueueListener.
+    Não pré-formata o record (a mensagem é formatada na thread de gravação).
+    """
+    
+    def __init__(self, log_queue: "queue.SimpleQueue[logging.LogRecord]", listener: QueueListener):
+        super().__init__(log_queue)
+        self.listener = listener
+        self._listener_lock = threading.Lock()
+        self._running = False
+    
+    def start_listener(self) -> None:
+        """Inicia a thread de gravação (idempotente)"""
+        with self._listener_lock:
+            if not self._running:
+                self.listener.start()
+                self._running = True
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Fila em memória: o record segue como está (sem cópia nem str())"""
+        return record
+    
+    def flush(self) -> None:
+        """
+        Drena a fila e descarrega os handlers de destino.
+        A thread de gravação é reiniciada em seguida.
+        """
+        with self._listener_lock:
+            if self._running:
+                self.listener.stop()  # Processa tudo que já foi enfileirado
+            
+            for handler in self.listener.handlers:
+                handler.flush()
+            
+            if self._running:
+                self.listener.start()
+    
+    def stop_listener(self) -> None:
+        """Drena a fila e encerra a thread de gravação (idempotente)"""
+        with self._listener_lock:
+            if self._running:
+                self.listener.stop()
+                self._running = False
+            
+            for handler in self.listener.handlers:
+                try:
+                    handler.flush()
+                except (OSError, ValueError):
+                    pass  # Stream já fechado no encerramento do interpretador
+
+class LazyJsonMessage:
+    """
+    Mensagem de log cuja serialização JSON só ocorre em str().
+    Handlers que não formatam a mensagem (ou filtrados por nível) não pagam o custo.
+    """
+    
+    __slots__ = ("data",)
+    
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+    
+    def __str__(self) -> str:
+        return dumps(self.data)
+
 class JsonFormatter(logging.Formatter):
     """
     Formatter personalizado para saída JSON estruturada.
@@ -150,30 +304,24 @@ class JsonFormatter(logging.Formatter):
         """
         Formata o log record como JSON estruturado.
         """
-        # Tentar parsear como JSON se já estiver formatado
-        try:
-            # Se a mensagem já é JSON, usar diretamente
-            message_data = json.loads(record.getMessage())
-            log_entry = {
-                "level": record.levelname,
-                "logger": record.name,
-                "timestamp": datetime.fromtimestamp(record.created).isoformat(),
-                **message_data
-            }
-        except (json.JSONDecodeError, ValueError):
-            # Se não é JSON, criar estrutura básica
-            log_entry = {
-                "level": record.levelname,
-                "logger": record.name,
-                "timestamp": datetime.fromtimestamp(record.created).isoformat(),
-                "message": record.getMessage()
-            }
+        log_entry = {
+            "level": record.levelname,
+            "logger": record.name,
+            "timestamp": datetime.fromtimestamp(record.created).isoformat()
+        }
+        
+        # Eventos do StructuredLogger trazem o dict pronto (sem parse do texto)
+        structured = getattr(record, "_structured", None)
+        if structured is not None:
+            log_entry.update(structured)
+        else:
+            log_entry["message"] = record.getMessage()
         
         # Adicionar informações de exceção se existirem
         if record.exc_info:
             log_entry["exception"] = self.formatException(record.exc_info)
         
-        return json.dumps(log_entry, ensure_ascii=False, default=str)
+        return dumps(log_entry)
 
 # ============================================================================
 # UTILITÁRIOS E CONTEXTO MANAGERS
@@ -184,47 +332,38 @@ def log_operation(logger: StructuredLogger, operation_name: str,
                  session_id: Optional[str] = None):
     """
     Context manager para log automático de operações.
-    Registra início, fim e duração da operação.
+    Registra um único evento ao final, com status e duração (relógio monotônico).
     """
     start_time = datetime.utcnow()
-    
-    # Log de início
-    logger.log_info(
-        f"Iniciando operação: {operation_name}",
-        operation=operation_name,
-        session_id=session_id,
-        start_time=start_time.isoformat()
-    )
+    started_ns = time.perf_counter_ns()
     
     try:
         yield
         
-        # Log de sucesso
-        end_time = datetime.utcnow()
-        duration = (end_time - start_time).total_seconds()
-        
-        logger.log_info(
-            f"Operação concluída: {operation_name}",
-            operation=operation_name,
-            session_id=session_id,
-            duration_seconds=duration,
-            status="success"
-        )
-        
     except Exception as e:
-        # Log de erro
-        end_time = datetime.utcnow()
-        duration = (end_time - start_time).total_seconds()
-        
-        logger.log_error(
-            f"Erro na operação: {operation_name}",
-            operation=operation_name,
-            session_id=session_id,
-            duration_seconds=duration,
-            error=str(e),
-            status="error"
-        )
+        # Evento montado aqui: log_error usaria "error" para a mensagem
+        logger.log_event(Event(
+            type="error",
+            data={
+                "message": f"Erro na operação: {operation_name}",
+                "operation": operation_name,
+                "session_id": session_id,
+                "start_time": start_time.isoformat(),
+                "duration_seconds": (time.perf_counter_ns() - started_ns) / 1e9,
+                "error": str(e),
+                "status": "error"
+            }
+        ))
         raise
+    
+    logger.log_info(
+        f"Operação concluída: {operation_name}",
+        operation=operation_name,
+        session_id=session_id,
+        start_time=start_time.isoformat(),
+        duration_seconds=(time.perf_counter_ns() - started_ns) / 1e9,
+        status="success"
+    )
 
 def create_event(event_type: EventType, data: Dict[str, Any], 
                 session_id: Optional[str] = None) -> Event:
@@ -251,43 +390,68 @@ class LogAnalyzer:
     def __init__(self, log_file: str = "agent.log"):
         self.log_file = Path(log_file)
     
-    def read_events(self, session_id: Optional[str] = None) -> List[Event]:
+    def _iter_records(self, session_id: Optional[str] = None,
+                      assume_contiguous: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Itera os registros JSON do arquivo de log (em bytes, sem decodificar linhas).
+        assume_contiguous: para ao surgir outra sessão depois da procurada.
+        """
+        # O logger grava session_id com o mesmo serializador: linhas sem esse
+        # literal JSON não podem pertencer à sessão e nem são parseadas
+        needle = dumps_bytes(session_id) if session_id else None
+        seen_target = False
+        
+        with open(self.log_file, 'rb') as f:
+            for line in f:
+                # Depois da sessão, linhas sem o literal ainda são lidas para achar o fim dela
+                if needle is not None and not seen_target and needle not in line:
+                    continue
+                
+                try:
+                    log_data = loads(line)
+                except json.JSONDecodeError:
+                    # Log malformado (ou linha vazia), pular
+                    continue
+                
+                # Filtrar por session_id se especificado
+                if session_id:
+                    record_session = log_data.get("session_id")
+                    if record_session != session_id:
+                        if seen_target and record_session is not None:
+                            break  # Outra sessão começou (registros sem sessão não contam)
+                        continue
+                    seen_target = assume_contiguous
+                
+                yield log_data
+    
+    def read_events(self, session_id: Optional[str] = None,
+                    assume_contiguous: bool = False) -> List[Event]:
         """
         Lê eventos do arquivo de log.
-        Função pura de leitura.
+        Com assume_contiguous=True (uma sessão por trecho do log) para no fim da sessão.
         """
         events = []
         
         if not self.log_file.exists():
             return events
         
+        fromisoformat = datetime.fromisoformat
         try:
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    try:
-                        log_data = json.loads(line)
-                        
-                        # Filtrar por session_id se especificado
-                        if session_id and log_data.get("session_id") != session_id:
-                            continue
-                        
-                        # Converter para Event se possível
-                        if "event_type" in log_data:
-                            event = Event(
-                                type=log_data["event_type"],
-                                data=log_data.get("data", {}),
-                                timestamp=datetime.fromisoformat(log_data["timestamp"]),
-                                session_id=log_data.get("session_id")
-                            )
-                            events.append(event)
-                            
-                    except (json.JSONDecodeError, KeyError, ValueError) as e:
-                        # Log malformado, pular
-                        continue
+            for log_data in self._iter_records(session_id, assume_contiguous):
+                # Converter para Event se possível
+                if "event_type" not in log_data:
+                    continue
+                
+                try:
+                    events.append(Event(
+                        type=log_data["event_type"],
+                        data=log_data.get("data", {}),
+                        timestamp=fromisoformat(log_data["timestamp"]),
+                        session_id=log_data.get("session_id")
+                    ))
+                except (KeyError, ValueError, TypeError):
+                    # Log malformado, pular
+                    continue
                         
         except Exception as e:
             # Erro de leitura, retornar lista vazia
@@ -298,25 +462,45 @@ class LogAnalyzer:
     def get_session_summary(self, session_id: str) -> Dict[str, Any]:
         """
         Gera resumo de uma sessão específica.
-        Função pura de análise.
+        Uma única passada sobre os registros, sem construir Event.
         """
-        events = self.read_events(session_id)
+        event_types: Dict[str, int] = {}
+        start = end = None
+        events_count = 0
         
-        if not events:
-            return {"session_id": session_id, "events_count": 0}
+        if self.log_file.exists():
+            fromisoformat = datetime.fromisoformat
+            try:
+                for log_data in self._iter_records(session_id):
+                    event_type = log_data.get("event_type")
+                    if event_type is None:
+                        continue
+                    
+                    try:
+                        timestamp = fromisoformat(log_data["timestamp"])
+                    except (KeyError, ValueError, TypeError):
+                        # Log malformado, pular (como em read_events)
+                        continue
+                    
+                    events_count += 1
+                    event_types[event_type] = event_types.get(event_type, 0) + 1
+                    if start is None:
+                        start = timestamp
+                    end = timestamp
+            except Exception:
+                # Erro de leitura: mesmo resultado de uma sessão sem eventos
+                events_count = 0
         
-        # Análise básica
-        event_types = {}
-        for event in events:
-            event_types[event.type] = event_types.get(event.type, 0) + 1
+        if not events_count:
+            return {"session_id": session_id, "events_count": 0}
         
         return {
             "session_id": session_id,
-            "events_count": len(events),
+            "events_count": events_count,
             "event_types": event_types,
-            "start_time": events[0].timestamp.isoformat() if events else None,
-            "end_time": events[-1].timestamp.isoformat() if events else None,
-            "duration_minutes": (events[-1].timestamp - events[0].timestamp).total_seconds() / 60 if len(events) > 1 else 0
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+            "duration_minutes": (end - start).total_seconds() / 60 if events_count > 1 else 0
         }
 
 # ============================================================================
@@ -324,19 +508,13 @@ class LogAnalyzer:
 # ============================================================================
 
 # Logger global para uso em todo o sistema
-_global_logger: Optional[StructuredLogger] = None
-
+@lru_cache(maxsize=None)
 def get_logger() -> StructuredLogger:
     """
     Retorna instância global do logger (singleton pattern).
-    Thread-safe lazy initialization.
+    Criada na primeira chamada; get_logger.cache_clear() descarta a instância.
     """
-    global _global_logger
-    
-    if _global_logger is None:
-        _global_logger = StructuredLogger()
-    
-    return _global_logger
+    return StructuredLogger()
 
 # Funções de conveniência para uso direto
 def log_event(event: Event) -> Result:
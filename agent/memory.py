@@ -1,18 +1,84 @@
 import sqlite3
 import json
+import queue
 import threading
+import atexit
+import weakref
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, List, Dict, Any
-from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Literal, Set
+from contextlib import closing, contextmanager
+from functools import lru_cache
 
-from models.models import Thread, Message, Event, Result
+from models.models import Thread, Message, ToolCall, Event, Result
 from agent.logger import get_logger, log_operation
+from agent.serialization import dumps, loads
 
 # ============================================================================
 # SISTEMA DE MEMÓRIA PERSISTENTE COM SQLITE
 # ============================================================================
 
+# Tabelas com contagem mantida por triggers na tabela memory_stats
+COUNTED_TABLES = ("threads", "messages", "events")
+
+# Páginas liberadas por cleanup_old_data via incremental_vacuum
+INCREMENTAL_VACUUM_PAGES = 1000
+
+# Eventos de auditoria gravados em segundo plano: lote máximo e espera por novos itens
+EVENT_BATCH_SIZE = 256
+EVENT_FLUSH_INTERVAL = 0.5
+EVENT_QUEUE_MAX = 10000
+
+# Statements preparados mantidos por conexão (padrão do sqlite3: 128)
+SQLITE_CACHED_STATEMENTS = 256
+
+# Consultas de get_events por (filtra session_id, filtra event_type)
+EVENTS_QUERIES = {
+    (False, False): "SELECT * FROM events ORDER BY timestamp DESC LIMIT ?",
+    (True, False): "SELECT * FROM events WHERE session_id = ? ORDER BY timestamp DESC LIMIT ?",
+    (False, True): "SELECT * FROM events WHERE event_type = ? ORDER BY timestamp DESC LIMIT ?",
+    (True, True): (
+        "SELECT * FROM events WHERE session_id = ? AND event_type = ? "
+        "ORDER BY timestamp DESC LIMIT ?"
+    ),
+}
+
+# Páginas copiadas por passo em backup_memory (libera a origem entre os passos)
+BACKUP_PAGES_PER_STEP = 1000
+
+# Versão do esquema (PRAGMA user_version); 1 = threads.data sem as mensagens
+SCHEMA_VERSION = 1
+
+# Modos de search_messages: índice FTS5, prefixo (índice em content) ou substring (varredura)
+SearchMode = Literal["fts", "prefix", "substring"]
+
+# PRAGMAs aplicados uma vez na abertura da conexão persistente
+SQLITE_PRAGMAS = (
+    # Só vale em banco novo, por isso antes de journal_mode (bancos antigos seguem sem efeito)
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+)
+
+class _ReaderSlot:
+    """Conexão de leitura guardada no threading.local de uma thread"""
+    
+    __slots__ = ("conn", "__weakref__")
+    
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+def _close_reader(registry: Set[sqlite3.Connection], lock: threading.RLock,
+                  conn: sqlite3.Connection) -> None:
+    """Fecha uma conexão de leitura ainda registrada (fim da thread dona)"""
+    with lock:
+        if conn in registry:
+            registry.discard(conn)
+            conn.close()
+
 class AgentMemory:
     """
     Sistema de memória persistente thread-safe usando SQLite.
@@ -23,19 +89,35 @@ class AgentMemory:
     def __init__(self, db_path: str = "memory.db"):
         self.db_path = Path(db_path)
         self.logger = get_logger()
-        self._lock = threading.Lock()
+        self._lock = threading.RLock()  # Serializa apenas as escritas
+        self._conn = self._open_connection()
+        # Leituras: uma conexão por thread, concorrentes com o escritor sob WAL.
+        # Registro das abertas: fechadas ao fim da thread dona ou em close()
+        self._local = threading.local()
+        self._reader_conns: Set[sqlite3.Connection] = set()
+        self._closed = False
+        self._shared_reads = str(db_path) == ":memory:"  # Sem arquivo não há WAL compartilhável
+        self._fts_enabled = False  # Definido em _initialize_db conforme suporte a FTS5
         self._initialize_db()
+        
+        # Eventos de auditoria saem do caminho crítico: fila + executemany em lote
+        self._event_queue: "queue.Queue[Optional[Event]]" = queue.Queue(maxsize=EVENT_QUEUE_MAX)
+        self._event_writer = threading.Thread(
+            target=self._run_event_writer,
+            name="memory-events",
+            daemon=True
+        )
+        self._event_writer.start()
+        atexit.register(self._stop_event_writer)
     
     def _initialize_db(self) -> None:
         """
         Inicializa o banco de dados e cria tabelas necessárias.
         Efeito colateral controlado na inicialização.
         """
-        # Criar diretório se necessário
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        with self._get_connection() as conn:
+        with self._transaction() as conn:
             # Tabela principal de threads/conversas
+            # data guarda só o estado fora de messages (tool calls)
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS threads (
                     session_id TEXT PRIMARY KEY,
@@ -74,82 +156,237 @@ class AgentMemory:
             # Índices para performance
             conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages(timestamp)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_events_session ON events(session_id)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_events_type ON events(event_type)")
+            # Busca por prefixo/substring usa messages_fts; índice sobre o texto completo não compensa
+            conn.execute("DROP INDEX IF EXISTS idx_messages_content")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_threads_updated ON threads(updated_at)")
+            
+            # get_events: filtro + ORDER BY timestamp resolvidos pelo índice (sem sort temporário)
+            conn.execute("DROP INDEX IF EXISTS idx_events_session")
+            conn.execute("DROP INDEX IF EXISTS idx_events_type")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_events_session_ts ON events(session_id, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_events_type_ts ON events(event_type, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events(timestamp)")
+            
+            # Índice de texto para search_messages
+            self._fts_enabled = self._initialize_fts(conn)
+            
+            # Contadores incrementais (atualizados na mesma transação das escritas)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS memory_stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+            
+            for table in COUNTED_TABLES:
+                # Semeia com COUNT(*) apenas na primeira vez (bancos existentes)
+                conn.execute(
+                    f"INSERT OR IGNORE INTO memory_stats (name, value) SELECT ?, COUNT(*) FROM {table}",
+                    (table,)
+                )
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_count_insert AFTER INSERT ON {table}
+                    BEGIN
+                        UPDATE memory_stats SET value = value + 1 WHERE name = '{table}';
+                    END
+                """)
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_count_delete AFTER DELETE ON {table}
+                    BEGIN
+                        UPDATE memory_stats SET value = value - 1 WHERE name = '{table}';
+                    END
+                """)
             
-            conn.commit()
+            # Migração: blobs antigos repetiam as mensagens já normalizadas em messages
+            if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                conn.execute("""
+                    UPDATE threads SET data = json_object(
+                        'tools_calls', json(coalesce(json_extract(data, '$.tools_calls'), '[]'))
+                    )
+                    WHERE json_extract(data, '$.messages') IS NOT NULL
+                """)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
             
+        # Estatísticas para o planner escolher os índices (só na primeira vez)
+        with self._get_connection() as conn:
+            if not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            ).fetchone():
+                conn.execute("ANALYZE")
+        
         self.logger.log_info("Banco de dados inicializado", db_path=str(self.db_path))
     
+    @staticmethod
+    def _initialize_fts(conn: sqlite3.Connection) -> bool:
+        """
+        Cria o índice FTS5 (trigram) espelhando messages.content.
+        Retorna False se o SQLite não tiver FTS5; a busca usa LIKE nesse caso.
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        ).fetchone()
+        
+        try:
+            # trigram casa substrings como o LIKE '%q%' anterior
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                    content, content='messages', content_rowid='id', tokenize='trigram'
+                )
+            """)
+        except sqlite3.OperationalError:
+            return False
+        
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_messages_fts_insert AFTER INSERT ON messages
+            BEGIN
+                INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_messages_fts_delete AFTER DELETE ON messages
+            BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, content)
+                VALUES ('delete', old.id, old.content);
+            END
+        """)
+        
+        if not exists:
+            # Bancos existentes: indexar as mensagens já gravadas
+            conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+        
+        return True
+    
+    def _open_connection(self) -> sqlite3.Connection:
+        """
+        Abre a conexão persistente e aplica os PRAGMAs de desempenho.
+        Transações são controladas explicitamente (isolation_level=None).
+        """
+        # Criar diretório se necessário
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        conn = sqlite3.connect(
+            str(self.db_path),
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=SQLITE_CACHED_STATEMENTS
+        )
+        conn.row_factory = sqlite3.Row  # Acesso por nome de coluna
+        
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        
+        return conn
+    
     @contextmanager
     def _get_connection(self):
         """
-        Context manager para conexões SQLite thread-safe.
-        Garante fechamento adequado da conexão.
+        Context manager para acesso serializado à conexão de escrita.
+        O RLock permite reentrada (ex.: save_thread -> _transaction).
         """
-        conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
-        conn.row_factory = sqlite3.Row  # Acesso por nome de coluna
+        with self._lock:
+            yield self._conn
+    
+    @contextmanager
+    def _read_connection(self):
+        """
+        Context manager de leitura sem lock, sobre a conexão da thread atual.
+        Abre uma transação de leitura para um snapshot consistente; reentrante.
+        """
+        if self._shared_reads:
+            with self._get_connection() as conn:
+                yield conn
+            return
+        
+        slot = getattr(self._local, "slot", None)
+        if slot is None:
+            slot = self._open_reader()
+            self._local.slot = slot
+        conn = slot.conn
+        
+        if conn.in_transaction:
+            # Leitura aninhada (ex.: load_latest_thread -> load_thread)
+            yield conn
+            return
+        
+        conn.execute("BEGIN")
         try:
             yield conn
         finally:
-            conn.close()
+            conn.execute("COMMIT")
+    
+    def _open_reader(self) -> "_ReaderSlot":
+        """
+        Abre e registra a conexão de leitura da thread atual.
+        Ela é fechada quando a thread termina (o slot do threading.local é coletado).
+        """
+        conn = self._open_connection()
+        with self._lock:
+            if self._closed:
+                conn.close()
+                raise sqlite3.ProgrammingError("AgentMemory já foi fechada")
+            self._reader_conns.add(conn)
+        
+        slot = _ReaderSlot(conn)
+        weakref.finalize(slot, _close_reader, self._reader_conns, self._lock, conn)
+        return slot
+    
+    @contextmanager
+    def _transaction(self):
+        """
+        Context manager transacional sobre a conexão de escrita.
+        BEGIN IMMEDIATE reserva a escrita já no início (também entre processos).
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._conn.execute("COMMIT")
+    
+    def reset_connection(self) -> None:
+        """
+        Reabre a conexão persistente.
+        Útil após manutenção (VACUUM/ANALYZE) para renovar planos de consulta.
+        """
+        with self._lock:
+            self._conn.close()
+            self._conn = self._open_connection()
+    
+    def close(self) -> None:
+        """
+        Fecha a conexão de escrita e as conexões de leitura de todas as threads.
+        Grava os eventos pendentes e executa PRAGMA optimize antes de fechar (idempotente).
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        
+        self._stop_event_writer()
+        atexit.unregister(self._stop_event_writer)
+        
+        with self._lock:
+            try:
+                self._conn.execute("PRAGMA optimize")
+            finally:
+                self._conn.close()
+                for conn in self._reader_conns:
+                    conn.close()
+                self._reader_conns.clear()
     
-    def save_thread(self, thread: Thread) -> Result:
+    def save_thread(self, thread: Thread, force: bool = False) -> Result:
         """
         Salva uma thread completa no banco.
-        Operação atômica com rollback em caso de erro.
+        Grava só as mensagens novas; force=True regrava todo o histórico.
         """
         try:
             with self._lock:
                 with log_operation(self.logger, "save_thread", thread.session_id):
-                    with self._get_connection() as conn:
-                        # Serializar thread
-                        thread_data = json.dumps(thread.to_dict(), ensure_ascii=False, default=str)
-                        
-                        # Upsert da thread principal
-                        conn.execute("""
-                            INSERT OR REPLACE INTO threads 
-                            (session_id, data, created_at, updated_at, message_count)
-                            VALUES (?, ?, ?, ?, ?)
-                        """, (
-                            thread.session_id,
-                            thread_data,
-                            thread.created_at.isoformat(),
-                            thread.updated_at.isoformat(),
-                            len(thread.messages)
-                        ))
-                        
-                        # Limpar mensagens antigas desta sessão
-                        conn.execute("DELETE FROM messages WHERE session_id = ?", (thread.session_id,))
-                        
-                        # Inserir mensagens individuais
-                        for message in thread.messages:
-                            conn.execute("""
-                                INSERT INTO messages 
-                                (session_id, role, content, timestamp, function_call, name)
-                                VALUES (?, ?, ?, ?, ?, ?)
-                            """, (
-                                thread.session_id,
-                                message.role,
-                                message.content,
-                                message.timestamp.isoformat(),
-                                json.dumps(message.function_call) if message.function_call else None,
-                                message.name
-                            ))
-                        
-                        conn.commit()
-                        
-                        # Log do evento de salvamento
-                        save_event = Event(
-                            type="system",
-                            data={
-                                "action": "thread_saved",
-                                "session_id": thread.session_id,
-                                "message_count": len(thread.messages)
-                            },
-                            session_id=thread.session_id
-                        )
-                        self._save_event(conn, save_event)
+                    with self._transaction() as conn:
+                        self._write_thread(conn, thread, force)
                         
                         return Result.ok({
                             "session_id": thread.session_id,
@@ -161,30 +398,168 @@ class AgentMemory:
             self.logger.log_error(error_msg, session_id=thread.session_id)
             return Result.error(error_msg)
     
+    def save_threads(self, threads: List[Thread]) -> Result:
+        """
+        Salva várias threads numa única transação.
+        Usado pela gravação em segundo plano para amortizar commits.
+        """
+        if not threads:
+            return Result.ok({"saved_threads": 0})
+        
+        try:
+            with self._lock:
+                with log_operation(self.logger, "save_threads"):
+                    with self._transaction() as conn:
+                        for thread in threads:
+                            self._write_thread(conn, thread)
+                        
+                        return Result.ok({
+                            "saved_threads": len(threads),
+                            "session_ids": [thread.session_id for thread in threads]
+                        })
+                        
+        except Exception as e:
+            error_msg = f"Erro ao salvar threads: {str(e)}"
+            self.logger.log_error(error_msg)
+            return Result.error(error_msg)
+    
+    def _write_thread(self, conn: sqlite3.Connection, thread: Thread,
+                      force: bool = False) -> None:
+        """
+        Grava thread, mensagens e evento de auditoria (sem commit).
+        Método interno compartilhado pelas operações de salvamento.
+        """
+        # Mensagens já persistidas (antes do upsert, que sobrescreve message_count)
+        persisted_count = 0 if force else self._persisted_prefix(conn, thread)
+        
+        # Serializar apenas o que não está em messages (as mensagens vêm das linhas)
+        thread_data = dumps({"tools_calls": [tool_call.to_dict() for tool_call in thread.tools_calls]})
+        
+        # Upsert da thread principal (UPDATE in-place: sem DELETE implícito do REPLACE)
+        conn.execute("""
+            INSERT INTO threads 
+            (session_id, data, created_at, updated_at, message_count)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                data = excluded.data,
+                created_at = excluded.created_at,
+                updated_at = excluded.updated_at,
+                message_count = excluded.message_count
+        """, (
+            thread.session_id,
+            thread_data,
+            thread.created_at_iso,
+            thread.updated_at_iso,
+            len(thread.messages)
+        ))
+        
+        session_id = thread.session_id
+        if persisted_count == 0:
+            # Histórico divergente (ou force): regravar todas as mensagens da sessão
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        
+        # Inserir apenas a cauda nova (um único statement preparado para todas)
+        conn.executemany("""
+            INSERT INTO messages 
+            (session_id, role, content, timestamp, function_call, name)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (
+                session_id,
+                message.role,
+                message.content,
+                message.timestamp_iso,
+                message.function_call_json,
+                message.name
+            )
+            for message in thread.messages[persisted_count:]
+        ])
+        
+        # Evento de salvamento: vai para a fila do writer de eventos (gravado fora desta transação)
+        save_event = Event(
+            type="system",
+            data={
+                "action": "thread_saved",
+                "session_id": thread.session_id,
+                "message_count": len(thread.messages)
+            },
+            session_id=thread.session_id
+        )
+        self._save_event(conn, save_event)
+    
+    @staticmethod
+    def _persisted_prefix(conn: sqlite3.Connection, thread: Thread) -> int:
+        """
+        Quantas mensagens da thread já estão gravadas como prefixo.
+        Confere a última linha gravada; 0 se o histórico não for um prefixo.
+        """
+        row = conn.execute(
+            "SELECT message_count FROM threads WHERE session_id = ?",
+            (thread.session_id,)
+        ).fetchone()
+        persisted_count = row['message_count'] if row else 0
+        if not persisted_count or persisted_count > len(thread.messages):
+            return 0
+        
+        last = conn.execute("""
+            SELECT role, content, timestamp FROM messages
+            WHERE session_id = ? ORDER BY id DESC LIMIT 1
+        """, (thread.session_id,)).fetchone()
+        message = thread.messages[persisted_count - 1]
+        if (last is None or last['role'] != message.role
+                or last['timestamp'] != message.timestamp_iso
+                or last['content'] != message.content):
+            return 0
+        
+        return persisted_count
+    
     def load_thread(self, session_id: str) -> Result:
         """
         Carrega uma thread específica do banco.
         Retorna Result com Thread ou erro.
         """
         try:
-            with self._lock:
-                with log_operation(self.logger, "load_thread", session_id):
-                    with self._get_connection() as conn:
-                        cursor = conn.execute(
-                            "SELECT data FROM threads WHERE session_id = ?",
-                            (session_id,)
+            with log_operation(self.logger, "load_thread", session_id):
+                with self._read_connection() as conn:
+                    cursor = conn.execute(
+                        "SELECT data, created_at, updated_at FROM threads WHERE session_id = ?",
+                        (session_id,)
+                    )
+                    row = cursor.fetchone()
+                    
+                    if not row:
+                        return Result.error(f"Thread não encontrada: {session_id}")
+                    
+                    # Reconstruir mensagens a partir das linhas normalizadas
+                    fromisoformat = datetime.fromisoformat
+                    messages = [
+                        Message(
+                            role=role,
+                            content=content,
+                            timestamp=fromisoformat(timestamp),
+                            function_call=loads(function_call) if function_call else None,
+                            name=name
                         )
-                        row = cursor.fetchone()
-                        
-                        if not row:
-                            return Result.error(f"Thread não encontrada: {session_id}")
-                        
-                        # Deserializar thread
-                        thread_data = json.loads(row['data'])
-                        thread = Thread.from_dict(thread_data)
-                        
-                        return Result.ok(thread)
-                        
+                        for role, content, timestamp, function_call, name in conn.execute("""
+                            SELECT role, content, timestamp, function_call, name
+                            FROM messages WHERE session_id = ? ORDER BY id
+                        """, (session_id,))
+                    ]
+                    
+                    thread_data = loads(row['data'])
+                    thread = Thread(
+                        messages=messages,
+                        tools_calls=[
+                            ToolCall.from_dict(tool_call)
+                            for tool_call in thread_data.get("tools_calls", [])
+                        ],
+                        session_id=session_id,
+                        created_at=fromisoformat(row['created_at']),
+                        updated_at=fromisoformat(row['updated_at'])
+                    )
+                    
+                    return Result.ok(thread)
+                    
         except Exception as e:
             error_msg = f"Erro ao carregar thread: {str(e)}"
             self.logger.log_error(error_msg, session_id=session_id)
@@ -196,23 +571,22 @@ class AgentMemory:
         Útil para continuar conversas.
         """
         try:
-            with self._lock:
-                with self._get_connection() as conn:
-                    cursor = conn.execute("""
-                        SELECT session_id FROM threads 
-                        ORDER BY updated_at DESC 
-                        LIMIT 1
-                    """)
-                    row = cursor.fetchone()
-                    
-                    if not row:
-                        # Criar nova thread vazia
-                        new_thread = Thread()
-                        return Result.ok(new_thread)
-                    
-                    # Carregar thread encontrada
-                    return self.load_thread(row['session_id'])
-                    
+            with self._read_connection() as conn:
+                cursor = conn.execute("""
+                    SELECT session_id FROM threads 
+                    ORDER BY updated_at DESC 
+                    LIMIT 1
+                """)
+                row = cursor.fetchone()
+                
+                if not row:
+                    # Criar nova thread vazia
+                    new_thread = Thread()
+                    return Result.ok(new_thread)
+                
+                # Carregar thread encontrada
+                return self.load_thread(row['session_id'])
+                
         except Exception as e:
             error_msg = f"Erro ao carregar thread mais recente: {str(e)}"
             self.logger.log_error(error_msg)
@@ -224,7 +598,7 @@ class AgentMemory:
         Função read-only para interface.
         """
         try:
-            with self._get_connection() as conn:
+            with self._read_connection() as conn:
                 cursor = conn.execute("""
                     SELECT 
                         session_id,
@@ -236,16 +610,8 @@ class AgentMemory:
                     LIMIT ?
                 """, (limit,))
                 
-                sessions = []
-                for row in cursor.fetchall():
-                    sessions.append({
-                        "session_id": row['session_id'],
-                        "created_at": row['created_at'],
-                        "updated_at": row['updated_at'],
-                        "message_count": row['message_count']
-                    })
-                
-                return Result.ok(sessions)
+                # Colunas já têm os nomes do resultado: dict(row) monta em C
+                return Result.ok([dict(row) for row in cursor])
                 
         except Exception as e:
             error_msg = f"Erro ao listar sessões: {str(e)}"
@@ -258,9 +624,12 @@ class AgentMemory:
         Operação destrutiva com confirmação via logs.
         """
         try:
+            # Eventos pendentes da sessão não podem ser gravados depois da remoção
+            self.flush_events()
+            
             with self._lock:
                 with log_operation(self.logger, "delete_thread", session_id):
-                    with self._get_connection() as conn:
+                    with self._transaction() as conn:
                         # Verificar se thread existe
                         cursor = conn.execute(
                             "SELECT message_count FROM threads WHERE session_id = ?",
@@ -278,9 +647,7 @@ class AgentMemory:
                         conn.execute("DELETE FROM events WHERE session_id = ?", (session_id,))
                         conn.execute("DELETE FROM threads WHERE session_id = ?", (session_id,))
                         
-                        conn.commit()
-                        
-                        # Log da deleção
+                        # Evento de deleção: vai para a fila do writer de eventos
                         delete_event = Event(
                             type="system",
                             data={
@@ -302,61 +669,167 @@ class AgentMemory:
             return Result.error(error_msg)
     
     def search_messages(self, query: str, session_id: Optional[str] = None, 
-                       limit: int = 20) -> Result:
+                       limit: int = 20, match_mode: SearchMode = "fts") -> Result:
         """
         Busca mensagens por conteúdo.
-        Função de pesquisa read-only.
+        match_mode: "fts" (padrão), "prefix" (início do conteúdo) ou "substring".
         """
         try:
-            with self._get_connection() as conn:
+            if match_mode not in ("fts", "prefix", "substring"):
+                return Result.error(f"Modo de busca inválido: {match_mode}")
+            
+            # Curingas do usuário tratados como literais
+            escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            pattern = f"{escaped}%" if match_mode == "prefix" else f"%{escaped}%"
+            
+            # trigram só indexa termos com 3+ caracteres; prefix/substring
+            # usam o índice para achar candidatos e o LIKE para a semântica exata
+            if self._fts_enabled and len(query) >= 3:
+                like_filter = None if match_mode == "fts" else pattern
+                return Result.ok(self._search_fts(query, session_id, limit, like_filter))
+            
+            if match_mode == "substring":
+                self.logger.log_info(
+                    "Busca por substring sem FTS varre toda a tabela messages",
+                    query=query
+                )
+            
+            with self._read_connection() as conn:
                 if session_id:
                     cursor = conn.execute("""
-                        SELECT session_id, role, content, timestamp, name
+                        SELECT session_id, role,
+                               CASE WHEN length(content) > 200 THEN substr(content, 1, 200) || '...'
+                                    ELSE content END AS content,
+                               timestamp, name
                         FROM messages 
-                        WHERE session_id = ? AND content LIKE ?
+                        WHERE session_id = ? AND content LIKE ? ESCAPE '\\'
                         ORDER BY timestamp DESC
                         LIMIT ?
-                    """, (session_id, f"%{query}%", limit))
+                    """, (session_id, pattern, limit))
                 else:
                     cursor = conn.execute("""
-                        SELECT session_id, role, content, timestamp, name
+                        SELECT session_id, role,
+                               CASE WHEN length(content) > 200 THEN substr(content, 1, 200) || '...'
+                                    ELSE content END AS content,
+                               timestamp, name
                         FROM messages 
-                        WHERE content LIKE ?
+                        WHERE content LIKE ? ESCAPE '\\'
                         ORDER BY timestamp DESC
                         LIMIT ?
-                    """, (f"%{query}%", limit))
-                
-                results = []
-                for row in cursor.fetchall():
-                    results.append({
-                        "session_id": row['session_id'],
-                        "role": row['role'],
-                        "content": row['content'][:200] + "..." if len(row['content']) > 200 else row['content'],
-                        "timestamp": row['timestamp'],
-                        "name": row['name']
-                    })
+                    """, (pattern, limit))
                 
-                return Result.ok(results)
+                return Result.ok(self._search_rows(cursor))
                 
         except Exception as e:
             error_msg = f"Erro na busca: {str(e)}"
             self.logger.log_error(error_msg, query=query)
             return Result.error(error_msg)
     
-    def _save_event(self, conn: sqlite3.Connection, event: Event) -> None:
+    def _search_fts(self, query: str, session_id: Optional[str],
+                    limit: int, like_pattern: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Busca via messages_fts (MATCH em vez de varrer messages).
+        A consulta vira uma frase FTS5 literal; like_pattern refina os candidatos.
+        """
+        phrase = '"' + query.replace('"', '""') + '"'
+        
+        conditions = ["messages_fts MATCH ?"]
+        params: List[Any] = [phrase]
+        if session_id:
+            conditions.append("m.session_id = ?")
+            params.append(session_id)
+        if like_pattern is not None:
+            conditions.append("m.content LIKE ? ESCAPE '\\'")
+            params.append(like_pattern)
+        params.append(limit)
+        
+        with self._read_connection() as conn:
+            cursor = conn.execute(f"""
+                SELECT m.session_id, m.role,
+                       CASE WHEN length(m.content) > 200 THEN substr(m.content, 1, 200) || '...'
+                            ELSE m.content END AS content,
+                       m.timestamp, m.name
+                FROM messages_fts f JOIN messages m ON m.id = f.rowid
+                WHERE {" AND ".join(conditions)}
+                ORDER BY m.timestamp DESC
+                LIMIT ?
+            """, params)
+            
+            return self._search_rows(cursor)
+    
+    @staticmethod
+    def _search_rows(cursor: sqlite3.Cursor) -> List[Dict[str, Any]]:
+        """Linhas de busca como dicts (prévia de 200 caracteres já cortada no SQLite)"""
+        return [dict(row) for row in cursor]
+    
+    def _save_event(self, conn: sqlite3.Connection, event: Event, sync: bool = False) -> None:
         """
         Salva evento no banco (método interno).
-        Usado para auditoria e debugging.
+        Por padrão enfileira para o writer; sync=True grava já, na transação de conn.
         """
-        conn.execute("""
+        if not sync and self._event_writer.is_alive():
+            try:
+                self._event_queue.put_nowait(event)
+                return
+            except queue.Full:
+                pass  # Writer atrasado: gravar direto em vez de bloquear
+        
+        self._insert_events(conn, [event])
+    
+    @staticmethod
+    def _insert_events(conn: sqlite3.Connection, events: List[Event]) -> None:
+        """Insere eventos com um único statement preparado"""
+        conn.executemany("""
             INSERT INTO events (session_id, event_type, data, timestamp)
             VALUES (?, ?, ?, ?)
-        """, (
-            event.session_id,
-            event.type,
-            json.dumps(event.data, ensure_ascii=False, default=str),
-            event.timestamp.isoformat()
-        ))
+        """, [
+            (event.session_id, event.type, dumps(event.data), event.timestamp.isoformat())
+            for event in events
+        ])
+    
+    def flush_events(self) -> None:
+        """
+        Bloqueia até que os eventos enfileirados estejam gravados.
+        Não chamar segurando self._lock (o writer precisa dele).
+        """
+        if self._event_writer.is_alive():
+            self._event_queue.join()
+    
+    def _stop_event_writer(self) -> None:
+        """Drena a fila de eventos e encerra o writer (idempotente)."""
+        if self._event_writer.is_alive():
+            self._event_queue.put(None)
+            self._event_writer.join()
+    
+    def _run_event_writer(self) -> None:
+        """Loop do writer: agrupa até EVENT_BATCH_SIZE eventos por transação."""
+        running = True
+        
+        while running:
+            try:
+                item = self._event_queue.get(timeout=EVENT_FLUSH_INTERVAL)
+            except queue.Empty:
+                continue
+            
+            batch = [item]
+            while len(batch) < EVENT_BATCH_SIZE:
+                try:
+                    batch.append(self._event_queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            events = [event for event in batch if event is not None]
+            running = len(events) == len(batch)
+            
+            try:
+                if events:
+                    with self._transaction() as conn:
+                        self._insert_events(conn, events)
+            except Exception as e:
+                self.logger.log_error(f"Erro ao gravar eventos em segundo plano: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._event_queue.task_done()
     
     def get_events(self, session_id: Optional[str] = None, 
                    event_type: Optional[str] = None, limit: int = 100) -> Result:
@@ -365,27 +838,20 @@ class AgentMemory:
         Função read-only para debugging e métricas.
         """
         try:
-            with self._get_connection() as conn:
-                query = "SELECT * FROM events WHERE 1=1"
-                params = []
-                
-                if session_id:
-                    query += " AND session_id = ?"
-                    params.append(session_id)
-                
-                if event_type:
-                    query += " AND event_type = ?"
-                    params.append(event_type)
-                
-                query += " ORDER BY timestamp DESC LIMIT ?"
-                params.append(limit)
-                
+            self.flush_events()  # Incluir os eventos ainda na fila
+            
+            # Variante fixa por combinação de filtros (texto estável no cache de statements)
+            query = EVENTS_QUERIES[(bool(session_id), bool(event_type))]
+            params = [value for value in (session_id, event_type) if value]
+            params.append(limit)
+            
+            with self._read_connection() as conn:
                 cursor = conn.execute(query, params)
                 
                 events = []
-                for row in cursor.fetchall():
+                for row in cursor:
                     try:
-                        event_data = json.loads(row['data'])
+                        event_data = loads(row['data'])
                         events.append({
                             "id": row['id'],
                             "session_id": row['session_id'],
@@ -404,6 +870,43 @@ class AgentMemory:
             self.logger.log_error(error_msg)
             return Result.error(error_msg)
     
+    def get_event_summary(self, session_id: str) -> Result:
+        """
+        Resumo dos eventos de uma sessão agregado no SQLite (GROUP BY).
+        Mesmo formato de LogAnalyzer.get_session_summary.
+        """
+        try:
+            self.flush_events()
+            
+            with self._read_connection() as conn:
+                rows = conn.execute("""
+                    SELECT event_type, COUNT(*), MIN(timestamp), MAX(timestamp)
+                    FROM events WHERE session_id = ?
+                    GROUP BY event_type
+                """, (session_id,)).fetchall()
+            
+            if not rows:
+                return Result.ok({"session_id": session_id, "events_count": 0})
+            
+            event_types = {row[0]: row[1] for row in rows}
+            events_count = sum(event_types.values())
+            start = datetime.fromisoformat(min(row[2] for row in rows))
+            end = datetime.fromisoformat(max(row[3] for row in rows))
+            
+            return Result.ok({
+                "session_id": session_id,
+                "events_count": events_count,
+                "event_types": event_types,
+                "start_time": start.isoformat(),
+                "end_time": end.isoformat(),
+                "duration_minutes": (end - start).total_seconds() / 60 if events_count > 1 else 0
+            })
+            
+        except Exception as e:
+            error_msg = f"Erro ao resumir eventos: {str(e)}"
+            self.logger.log_error(error_msg, session_id=session_id)
+            return Result.error(error_msg)
+    
     def cleanup_old_data(self, days_to_keep: int = 30) -> Result:
         """
         Limpa dados antigos para manter o banco otimizado.
@@ -413,54 +916,46 @@ class AgentMemory:
             cutoff_date = datetime.utcnow().replace(
                 hour=0, minute=0, second=0, microsecond=0
             ) - timedelta(days=days_to_keep)
+            cutoff_iso = cutoff_date.isoformat()
+            
+            self.flush_events()
             
             with self._lock:
                 with log_operation(self.logger, "cleanup_old_data"):
-                    with self._get_connection() as conn:
-                        # Contar dados a serem removidos
-                        cursor = conn.execute("""
-                            SELECT COUNT(*) as count FROM threads 
-                            WHERE updated_at < ?
-                        """, (cutoff_date.isoformat(),))
-                        old_threads = cursor.fetchone()['count']
-                        
-                        cursor = conn.execute("""
-                            SELECT COUNT(*) as count FROM events 
-                            WHERE timestamp < ?
-                        """, (cutoff_date.isoformat(),))
-                        old_events = cursor.fetchone()['count']
-                        
-                        if old_threads == 0 and old_events == 0:
-                            return Result.ok({
-                                "cleaned_threads": 0,
-                                "cleaned_events": 0,
-                                "message": "Nenhum dado antigo encontrado"
-                            })
-                        
-                        # Remover dados antigos
+                    with self._transaction() as conn:
+                        # Remover dados antigos (no-op se nada expirou); as contagens
+                        # vêm do rowcount dos DELETEs (linhas de triggers não entram)
                         conn.execute("""
                             DELETE FROM messages WHERE session_id IN (
                                 SELECT session_id FROM threads WHERE updated_at < ?
                             )
-                        """, (cutoff_date.isoformat(),))
+                        """, (cutoff_iso,))
                         
-                        conn.execute("""
+                        old_threads = conn.execute("""
                             DELETE FROM threads WHERE updated_at < ?
-                        """, (cutoff_date.isoformat(),))
+                        """, (cutoff_iso,)).rowcount
                         
-                        conn.execute("""
+                        old_events = conn.execute("""
                             DELETE FROM events WHERE timestamp < ?
-                        """, (cutoff_date.isoformat(),))
-                        
-                        # Vacuum para otimizar espaço
-                        conn.execute("VACUUM")
-                        conn.commit()
-                        
+                        """, (cutoff_iso,)).rowcount
+                    
+                    if old_threads == 0 and old_events == 0:
                         return Result.ok({
-                            "cleaned_threads": old_threads,
-                            "cleaned_events": old_events,
-                            "cutoff_date": cutoff_date.isoformat()
+                            "cleaned_threads": 0,
+                            "cleaned_events": 0,
+                            "message": "Nenhum dado antigo encontrado"
                         })
+                    
+                    # Devolver páginas livres aos poucos (fora da transação; sem reescrever o banco)
+                    # executescript executa o PRAGMA até o fim (execute liberaria uma página só)
+                    with self._get_connection() as conn:
+                        conn.executescript(f"PRAGMA incremental_vacuum({INCREMENTAL_VACUUM_PAGES})")
+                    
+                    return Result.ok({
+                        "cleaned_threads": old_threads,
+                        "cleaned_events": old_events,
+                        "cutoff_date": cutoff_iso
+                    })
                         
         except Exception as e:
             error_msg = f"Erro na limpeza de dados: {str(e)}"
@@ -470,36 +965,30 @@ class AgentMemory:
     def get_stats(self) -> Result:
         """
         Retorna estatísticas do banco de dados.
-        Função read-only para métricas e monitoramento.
+        Contagens vêm de memory_stats (O(1)); sem varrer as tabelas.
         """
         try:
-            with self._get_connection() as conn:
-                # Contar threads e mensagens
-                cursor = conn.execute("SELECT COUNT(*) as count FROM threads")
-                total_threads = cursor.fetchone()['count']
-                
-                cursor = conn.execute("SELECT COUNT(*) as count FROM messages")
-                total_messages = cursor.fetchone()['count']
-                
-                cursor = conn.execute("SELECT COUNT(*) as count FROM events")
-                total_events = cursor.fetchone()['count']
+            self.flush_events()  # total_events inclui os eventos ainda na fila
+            
+            with self._read_connection() as conn:
+                counts = {
+                    row['name']: row['value']
+                    for row in conn.execute("SELECT name, value FROM memory_stats")
+                }
                 
-                # Thread mais recente
-                cursor = conn.execute("""
-                    SELECT updated_at FROM threads 
-                    ORDER BY updated_at DESC LIMIT 1
-                """)
-                latest_row = cursor.fetchone()
-                latest_activity = latest_row['updated_at'] if latest_row else None
+                # Thread mais recente (via idx_threads_updated)
+                cursor = conn.execute("SELECT MAX(updated_at) as latest FROM threads")
+                latest_activity = cursor.fetchone()['latest']
                 
-                # Tamanho do arquivo de banco
-                db_size_bytes = self.db_path.stat().st_size if self.db_path.exists() else 0
-                db_size_mb = round(db_size_bytes / (1024 * 1024), 2)
+                # Tamanho do banco pelas páginas alocadas
+                page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+                page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+                db_size_mb = round(page_count * page_size / (1024 * 1024), 2)
                 
                 return Result.ok({
-                    "total_threads": total_threads,
-                    "total_messages": total_messages,
-                    "total_events": total_events,
+                    "total_threads": counts.get("threads", 0),
+                    "total_messages": counts.get("messages", 0),
+                    "total_events": counts.get("events", 0),
                     "latest_activity": latest_activity,
                     "db_size_mb": db_size_mb,
                     "db_path": str(self.db_path)
@@ -509,6 +998,26 @@ class AgentMemory:
             error_msg = f"Erro ao obter estatísticas: {str(e)}"
             self.logger.log_error(error_msg)
             return Result.error(error_msg)
+    
+    def refresh_stats(self) -> Result:
+        """
+        Recalcula os contadores de memory_stats com COUNT(*).
+        Operação de manutenção (O(linhas)); não é necessária no uso normal.
+        """
+        try:
+            with self._transaction() as conn:
+                for table in COUNTED_TABLES:
+                    conn.execute(
+                        f"UPDATE memory_stats SET value = (SELECT COUNT(*) FROM {table}) WHERE name = ?",
+                        (table,)
+                    )
+            
+            return self.get_stats()
+            
+        except Exception as e:
+            error_msg = f"Erro ao recalcular estatísticas: {str(e)}"
+            self.logger.log_error(error_msg)
+            return Result.error(error_msg)
 
 # ============================================================================
 # MEMORY FACTORY E UTILITÁRIOS
@@ -516,19 +1025,127 @@ class AgentMemory:
 
 from datetime import timedelta
 
-_global_memory: Optional[AgentMemory] = None
+# Instâncias criadas por _memory_for_path (o lru_cache não expõe seus valores)
+_memory_instances: List[AgentMemory] = []
+
+@lru_cache(maxsize=None)
+def _memory_for_path(db_path: str) -> AgentMemory:
+    """Uma instância por caminho de banco (cache indexado pelo caminho normalizado)"""
+    memory = AgentMemory(db_path)
+    _memory_instances.append(memory)
+    return memory
 
 def get_memory(db_path: str = "memory.db") -> AgentMemory:
     """
-    Retorna instância global de memória (singleton pattern).
-    Thread-safe lazy initialization.
+    Retorna instância de memória do caminho (singleton por db_path).
+    reset_memory() fecha e descarta as instâncias (ex.: em testes).
+    """
+    return _memory_for_path(str(db_path))
+
+def reset_memory() -> None:
+    """
+    Fecha as instâncias de get_memory (writer, leitores e hooks de atexit)
+    e as descarta; a próxima chamada de get_memory abre uma nova.
+    """
+    _memory_for_path.cache_clear()
+    while _memory_instances:
+        _memory_instances.pop().close()
+
+class BackgroundThreadWriter:
+    """
+    Gravação de threads em segundo plano (write-behind).
+    Tira o SQLite do caminho crítico da conversa: snapshots enfileirados são
+    coalescidos por session_id (mantendo o maior version_id) e gravados em lote.
     """
-    global _global_memory
     
-    if _global_memory is None or str(_global_memory.db_path) != db_path:
-        _global_memory = AgentMemory(db_path)
+    _STOP = object()
+    
+    def __init__(self, memory: AgentMemory, flush_interval: float = 0.5):
+        self.memory = memory
+        self.flush_interval = flush_interval
+        self.logger = get_logger()
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._run,
+            name="memory-writer",
+            daemon=True
+        )
+        self._closed = False
+        self._close_lock = threading.Lock()  # submit não enfileira depois do sinal de parada
+        self._worker.start()
+        # Worker é daemon: drenar a fila na saída do interpretador
+        atexit.register(self.close)
+    
+    def submit(self, thread: Thread) -> None:
+        """
+        Enfileira snapshot da thread para gravação (não bloqueia).
+        Depois de close() grava de forma síncrona, registrando o uso indevido.
+        """
+        with self._close_lock:
+            if not self._closed:
+                self._queue.put_nowait(thread)
+                return
+        
+        self.logger.log_error(
+            "BackgroundThreadWriter.submit após close(); gravando de forma síncrona",
+            session_id=thread.session_id
+        )
+        result = self.memory.save_thread(thread)
+        if not result.success:
+            self.logger.log_error(f"Erro na gravação síncrona: {result.error}")
+    
+    def flush(self) -> None:
+        """Bloqueia até que todos os snapshots enfileirados sejam gravados."""
+        self._queue.join()
+    
+    def close(self) -> None:
+        """Drena a fila e encerra o worker (idempotente)."""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put_nowait(self._STOP)
+        
+        atexit.unregister(self.close)
+        self._worker.join()
     
-    return _global_memory
+    def _run(self) -> None:
+        """Loop do worker: agrupa o que estiver na fila e grava numa transação."""
+        running = True
+        
+        while running:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            
+            batch = [item]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            pending: Dict[str, Thread] = {}
+            for item in batch:
+                if item is self._STOP:
+                    running = False
+                    continue
+                
+                current = pending.get(item.session_id)
+                if current is None or item.version_id >= current.version_id:
+                    pending[item.session_id] = item
+            
+            try:
+                if pending:
+                    result = self.memory.save_threads(list(pending.values()))
+                    if not result.success:
+                        self.logger.log_error(f"Erro na gravação em segundo plano: {result.error}")
+            except Exception as e:
+                self.logger.log_error(f"Erro inesperado na gravação em segundo plano: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
 
 def create_empty_thread(session_id: Optional[str] = None) -> Thread:
     """
@@ -557,12 +1174,14 @@ def backup_memory(source_db: str = "memory.db", backup_path: Optional[str] = Non
         backup_path = Path(backup_path)
         backup_path.parent.mkdir(parents=True, exist_ok=True)
         
-        # Copiar arquivo
-        import shutil
-        shutil.copy2(source_path, backup_path)
+        # API de backup online: copia páginas num snapshot consistente (inclui o WAL),
+        # em blocos, sem bloquear escritores na origem
+        with closing(sqlite3.connect(str(source_path))) as source, \
+                closing(sqlite3.connect(str(backup_path))) as target:
+            source.backup(target, pages=BACKUP_PAGES_PER_STEP)
         
-        # Verificar integridade do backup
-        with sqlite3.connect(str(backup_path)) as conn:
+        # Verificar integridade do backup (defesa extra)
+        with closing(sqlite3.connect(str(backup_path))) as conn:
             cursor = conn.execute("PRAGMA integrity_check")
             integrity = cursor.fetchone()[0]
             
@@ -0,0 +1,99 @@
+import json
+import zlib
+from typing import Any, Callable, Dict, NamedTuple, Optional, Sequence, Union
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional; sem ele usa-se o json padrão
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard é opcional; sem ele usa-se zlib
+    zstandard = None
+
+# ============================================================================
+# SERIALIZAÇÃO JSON (ORJSON COM FALLBACK)
+# ============================================================================
+
+def dumps_bytes(obj: Any, sort_keys: bool = False, indent: Optional[int] = None) -> bytes:
+    """
+    Serializa objeto para JSON UTF-8 (bytes), sem escape ASCII.
+    Usa orjson quando disponível; tipos desconhecidos viram str.
+    """
+    if orjson is not None and indent in (None, 2):
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        
+        try:
+            return orjson.dumps(obj, default=str, option=option)
+        except TypeError:
+            pass  # Ex.: inteiros acima de 64 bits - usar json padrão
+    
+    return json.dumps(
+        obj, ensure_ascii=False, default=str, sort_keys=sort_keys, indent=indent
+    ).encode("utf-8")
+
+def dumps(obj: Any, sort_keys: bool = False, indent: Optional[int] = None) -> str:
+    """
+    Serializa objeto para string JSON.
+    Mesmo comportamento de dumps_bytes.
+    """
+    return dumps_bytes(obj, sort_keys, indent).decode("utf-8")
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Desserializa JSON (str ou bytes).
+    Erros são subclasses de json.JSONDecodeError em ambos os caminhos.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    
+    return json.loads(data)
+
+# ============================================================================
+# REGISTRO DE COMPRESSORES
+# ============================================================================
+
+class Compressor(NamedTuple):
+    """Par de funções de compressão/descompressão de bytes"""
+    name: str
+    compress: Callable[[bytes], bytes]
+    decompress: Callable[[bytes], bytes]
+
+_COMPRESSORS: Dict[str, Compressor] = {}
+
+def register_compressor(name: str, compress: Callable[[bytes], bytes],
+                        decompress: Callable[[bytes], bytes]) -> Compressor:
+    """
+    Registra (ou substitui) um compressor pelo nome.
+    Retorna o Compressor registrado.
+    """
+    compressor = Compressor(name, compress, decompress)
+    _COMPRESSORS[name] = compressor
+    return compressor
+
+def get_compressor(preferred: Sequence[str] = ("zstd", "zlib")) -> Optional[Compressor]:
+    """
+    Primeiro compressor disponível na ordem de preferência.
+    None se nenhum dos nomes estiver registrado.
+    """
+    for name in preferred:
+        compressor = _COMPRESSORS.get(name)
+        if compressor is not None:
+            return compressor
+    return None
+
+register_compressor(
+    "zlib",
+    lambda data: zlib.compress(data, 6),
+    zlib.decompress
+)
+
+if zstandard is not None:
+    _zstd_compressor = zstandard.ZstdCompressor(level=3)
+    _zstd_decompressor = zstandard.ZstdDecompressor()
+    register_compressor("zstd", _zstd_compressor.compress, _zstd_decompressor.decompress)
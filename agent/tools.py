@@ -1,21 +1,36 @@
+import ast
+import sys
+import copy
 import json
-import uuid
+import operator
+import types
 import inspect
-import asyncio
 from datetime import datetime
-from typing import Dict, Any, List, Optional, Callable, Union, Type
+from typing import Dict, Any, List, Optional, Callable, Union, Type, Tuple
 from dataclasses import dataclass, field
-from functools import wraps
-import traceback
+from functools import wraps, lru_cache
 
 from models.models import ToolCall, Result, Event
 from agent.logger import get_logger, log_operation
+from agent.serialization import loads
+
+# Strings de argumentos recentes do LLM mantidas já parseadas
+ARGUMENTS_CACHE_SIZE = 1024
 
 # ============================================================================
 # TIPOS E METADADOS DE FERRAMENTAS
 # ============================================================================
 
-@dataclass(frozen=True)
+# Tipo do schema -> (tipos Python aceitos, mensagem de erro)
+_TYPE_CHECKS: Dict[str, Tuple[Union[type, Tuple[type, ...]], str]] = {
+    "string": (str, "deve ser uma string"),
+    "number": ((int, float), "deve ser um número"),
+    "boolean": (bool, "deve ser um boolean"),
+    "array": (list, "deve ser um array"),
+    "object": (dict, "deve ser um objeto"),
+}
+
+@dataclass(frozen=True, slots=True)
 class ToolParameter:
     """
     Representa um parâmetro de ferramenta de forma imutável.
@@ -27,6 +42,28 @@ class ToolParameter:
     required: bool = True
     enum: Optional[List[Any]] = None
     default: Optional[Any] = None
+    _enum_set: Optional[frozenset] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __post_init__(self) -> None:
+        # Conjunto do enum para busca O(1); valores não-hasháveis mantêm a lista
+        if self.enum:
+            try:
+                object.__setattr__(self, "_enum_set", frozenset(self.enum))
+            except TypeError:
+                pass
+    
+    def accepts_enum_value(self, value: Any) -> bool:
+        """Verifica se o valor pertence ao enum (sempre verdadeiro sem enum)"""
+        if not self.enum:
+            return True
+        
+        if self._enum_set is not None:
+            try:
+                return value in self._enum_set
+            except TypeError:
+                pass
+        
+        return value in self.enum
     
     def to_schema(self) -> Dict[str, Any]:
         """Converte para schema JSON compatível com OpenAI"""
@@ -43,7 +80,16 @@ class ToolParameter:
             
         return schema
 
-@dataclass(frozen=True)
+def _compile_parameter_check(param: ToolParameter) -> Tuple[Optional[Callable[[Any], bool]], Any, Optional[str], Optional[List[Any]]]:
+    """
+    Compila a verificação de um parâmetro: (checagem de enum, tipos aceitos, mensagem, enum).
+    Sem enum a checagem é None; tipo desconhecido aceita qualquer valor (object).
+    """
+    enum_check = param.accepts_enum_value if param.enum else None
+    expected_types, type_message = _TYPE_CHECKS.get(param.type, (object, None))
+    return enum_check, expected_types, type_message, param.enum
+
+@dataclass(frozen=True, slots=True)
 class ToolMetadata:
     """
     Metadados imutáveis de uma ferramenta.
@@ -58,24 +104,39 @@ class ToolMetadata:
     is_dangerous: bool = False
     max_retries: int = 3
     timeout_seconds: int = 30
+    _openai_schema: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
+    _required_names: frozenset = field(init=False, repr=False, compare=False)
+    _valid_names: frozenset = field(init=False, repr=False, compare=False)
+    _params_by_name: Dict[str, Tuple[Optional[Callable[[Any], bool]], Any, Optional[str], Optional[List[Any]]]] = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self) -> None:
+        # Conjuntos de nomes e tabela de verificação usados por validate_arguments, calculados uma vez
+        object.__setattr__(self, "_required_names", frozenset(p.name for p in self.parameters if p.required))
+        object.__setattr__(self, "_valid_names", frozenset(p.name for p in self.parameters))
+        object.__setattr__(self, "_params_by_name", {
+            p.name: _compile_parameter_check(p) for p in self.parameters
+        })
     
     def to_openai_schema(self) -> Dict[str, Any]:
         """
         Converte para schema OpenAI Function Calling.
-        Função pura de transformação.
+        Calculado na primeira chamada (metadados imutáveis); o dict é somente leitura.
         """
-        required_params = [p.name for p in self.parameters if p.required]
-        properties = {p.name: p.to_schema() for p in self.parameters}
-        
-        return {
-            "name": self.name,
-            "description": self.description,
-            "parameters": {
-                "type": "object",
-                "properties": properties,
-                "required": required_params
-            }
-        }
+        if self._openai_schema is None:
+            required_params = [p.name for p in self.parameters if p.required]
+            properties = {p.name: p.to_schema() for p in self.parameters}
+            
+            object.__setattr__(self, "_openai_schema", {
+                "name": self.name,
+                "description": self.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": required_params
+                }
+            })
+        
+        return self._openai_schema
     
     def validate_arguments(self, arguments: Dict[str, Any]) -> Result:
         """
@@ -85,59 +146,86 @@ class ToolMetadata:
         errors = []
         
         # Verificar parâmetros obrigatórios
-        required_params = {p.name for p in self.parameters if p.required}
-        provided_params = set(arguments.keys())
+        provided_params = arguments.keys()
         
-        missing_params = required_params - provided_params
+        missing_params = self._required_names - provided_params
         if missing_params:
             errors.append(f"Parâmetros obrigatórios faltando: {', '.join(missing_params)}")
         
         # Verificar parâmetros extras
-        valid_params = {p.name for p in self.parameters}
-        extra_params = provided_params - valid_params
+        extra_params = provided_params - self._valid_names
         if extra_params:
             errors.append(f"Parâmetros desconhecidos: {', '.join(extra_params)}")
         
-        # Validar tipos e valores
-        for param in self.parameters:
-            if param.name in arguments:
-                value = arguments[param.name]
-                validation_error = self._validate_parameter_value(param, value)
-                if validation_error:
-                    errors.append(f"Parâmetro '{param.name}': {validation_error}")
+        # Validar tipos e valores (uma busca por argumento na tabela pré-calculada)
+        params_by_name = self._params_by_name
+        for name, value in arguments.items():
+            entry = params_by_name.get(name)
+            if entry is None:
+                continue
+            
+            enum_check, expected_types, type_message, enum = entry
+            if enum_check is not None and not enum_check(value):
+                errors.append(f"Parâmetro '{name}': deve ser um dos valores: {enum}")
+            elif not isinstance(value, expected_types):
+                errors.append(f"Parâmetro '{name}': {type_message}")
         
         if errors:
             return Result.error("; ".join(errors))
         
         return Result.ok("Argumentos válidos")
-    
-    def _validate_parameter_value(self, param: ToolParameter, value: Any) -> Optional[str]:
-        """
-        Valida valor individual de parâmetro.
-        Função auxiliar pura.
-        """
-        # Validação de enum
-        if param.enum and value not in param.enum:
-            return f"deve ser um dos valores: {param.enum}"
-        
-        # Validação básica de tipo
-        if param.type == "string" and not isinstance(value, str):
-            return "deve ser uma string"
-        elif param.type == "number" and not isinstance(value, (int, float)):
-            return "deve ser um número"
-        elif param.type == "boolean" and not isinstance(value, bool):
-            return "deve ser um boolean"
-        elif param.type == "array" and not isinstance(value, list):
-            return "deve ser um array"
-        elif param.type == "object" and not isinstance(value, dict):
-            return "deve ser um objeto"
-        
-        return None
 
 # ============================================================================
 # DECORATORS PARA REGISTRO DE FERRAMENTAS
 # ============================================================================
 
+# Anotação Python -> tipo do schema; anotações ausentes ou desconhecidas viram "string"
+_ANNOT_TO_TYPE: Dict[Any, str] = {
+    int: "number",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    dict: "object",
+    str: "string",
+}
+
+# Marca parâmetro sem anotação ou sem valor padrão
+_EMPTY = object()
+
+def _function_parameters(func: Callable) -> List[Tuple[str, Any, Any]]:
+    """
+    Extrai (nome, anotação, padrão) dos parâmetros de uma função.
+    Lê __code__/__defaults__ direto; demais callables passam por inspect.signature.
+    """
+    code = getattr(func, "__code__", None)
+    if (not isinstance(func, types.FunctionType) or code is None
+            or code.co_flags & (inspect.CO_VARARGS | inspect.CO_VARKEYWORDS)
+            or hasattr(func, "__wrapped__")):
+        empty = inspect.Parameter.empty
+        return [
+            (param.name,
+             _EMPTY if param.annotation is empty else param.annotation,
+             _EMPTY if param.default is empty else param.default)
+            for param in inspect.signature(func).parameters.values()
+        ]
+    
+    positional_count = code.co_argcount
+    names = code.co_varnames[:positional_count + code.co_kwonlyargcount]
+    annotations = func.__annotations__
+    defaults = func.__defaults__ or ()
+    kwdefaults = func.__kwdefaults__ or {}
+    first_default = positional_count - len(defaults)
+    
+    parameters = []
+    for index, param_name in enumerate(names):
+        if index < positional_count:
+            default = defaults[index - first_default] if index >= first_default else _EMPTY
+        else:
+            default = kwdefaults.get(param_name, _EMPTY)
+        parameters.append((param_name, annotations.get(param_name, _EMPTY), default))
+    
+    return parameters
+
 def tool(name: Optional[str] = None,
          description: str = "",
          category: str = "general",
@@ -159,24 +247,14 @@ def tool(name: Optional[str] = None,
         tool_name = name or func.__name__
         
         # Extrair parâmetros da assinatura da função
-        sig = inspect.signature(func)
         parameters = []
         
-        for param_name, param in sig.parameters.items():
-            # Determinar tipo do parâmetro
-            param_type = "string"  # padrão
-            if param.annotation != inspect.Parameter.empty:
-                if param.annotation == int or param.annotation == float:
-                    param_type = "number"
-                elif param.annotation == bool:
-                    param_type = "boolean"
-                elif param.annotation == list:
-                    param_type = "array"
-                elif param.annotation == dict:
-                    param_type = "object"
+        for param_name, annotation, default in _function_parameters(func):
+            # Determinar tipo do parâmetro (padrão: string)
+            param_type = _ANNOT_TO_TYPE.get(annotation, "string")
             
             # Determinar se é obrigatório
-            required = param.default == inspect.Parameter.empty
+            required = default is _EMPTY
             
             # Criar parâmetro
             tool_param = ToolParameter(
@@ -184,7 +262,7 @@ def tool(name: Optional[str] = None,
                 type=param_type,
                 description=f"Parâmetro {param_name}",
                 required=required,
-                default=param.default if not required else None
+                default=default if not required else None
             )
             parameters.append(tool_param)
         
@@ -250,8 +328,14 @@ class ToolExecutor:
     
     def __init__(self):
         self.logger = get_logger()
-        self._registered_tools: Dict[str, Callable] = {}
-        self._tool_metadata: Dict[str, ToolMetadata] = {}
+        # Nome (internado) -> (função, metadados): uma única busca por execução
+        self._tools: Dict[str, Tuple[Callable, ToolMetadata]] = {}
+        
+        # Versão do registro: incrementada a cada registro, invalida caches
+        self._registry_version = 0
+        self._available_tools_cache: Optional[Tuple[int, List[Dict[str, Any]]]] = None
+        self._categories_cache: Optional[Tuple[int, Dict[str, List[str]]]] = None
+        self._stats_cache: Optional[Tuple[int, Dict[str, Any]]] = None
     
     def register_tool(self, func: Callable, metadata: Optional[ToolMetadata] = None) -> Result:
         """
@@ -268,12 +352,12 @@ class ToolExecutor:
                 return Result.error(f"Função {func.__name__} não possui metadados de ferramenta")
             
             # Validar se não há conflito de nomes
-            if tool_metadata.name in self._registered_tools:
+            if tool_metadata.name in self._tools:
                 return Result.error(f"Ferramenta '{tool_metadata.name}' já registrada")
             
             # Registrar
-            self._registered_tools[tool_metadata.name] = func
-            self._tool_metadata[tool_metadata.name] = tool_metadata
+            self._tools[sys.intern(tool_metadata.name)] = (func, tool_metadata)
+            self._registry_version += 1
             
             self.logger.log_info(
                 f"Ferramenta registrada: {tool_metadata.name}",
@@ -306,14 +390,14 @@ class ToolExecutor:
         try:
             with log_operation(self.logger, f"execute_tool_{tool_call.name}", session_id):
                 # Verificar se ferramenta está registrada
-                if tool_call.name not in self._registered_tools:
+                entry = self._tools.get(tool_call.name)
+                if entry is None:
                     return self._create_error_result(
                         tool_call, 
                         f"Ferramenta '{tool_call.name}' não encontrada"
                     )
                 
-                func = self._registered_tools[tool_call.name]
-                metadata = self._tool_metadata[tool_call.name]
+                func, metadata = entry
                 
                 # Validar argumentos
                 validation_result = metadata.validate_arguments(tool_call.arguments)
@@ -402,50 +486,132 @@ class ToolExecutor:
     def get_available_tools(self) -> List[Dict[str, Any]]:
         """
         Retorna lista de ferramentas disponíveis no formato OpenAI.
-        Função read-only pura.
+        Memoizada pela versão do registro; a lista retornada é somente leitura.
         """
-        return [metadata.to_openai_schema() for metadata in self._tool_metadata.values()]
+        cached = self._available_tools_cache
+        if cached and cached[0] == self._registry_version:
+            return cached[1]
+        
+        tools = [metadata.to_openai_schema() for _, metadata in self._tools.values()]
+        self._available_tools_cache = (self._registry_version, tools)
+        return tools
     
     def get_tool_metadata(self, tool_name: str) -> Optional[ToolMetadata]:
         """
         Retorna metadados de uma ferramenta específica.
         Função read-only pura.
         """
-        return self._tool_metadata.get(tool_name)
+        entry = self._tools.get(tool_name)
+        return entry[1] if entry else None
     
     def list_tools_by_category(self) -> Dict[str, List[str]]:
         """
         Agrupa ferramentas por categoria.
-        Função read-only pura.
+        Memoizada pela versão do registro; o resultado é somente leitura.
         """
+        cached = self._categories_cache
+        if cached and cached[0] == self._registry_version:
+            return cached[1]
+        
         categories = {}
-        for name, metadata in self._tool_metadata.items():
+        for name, (_, metadata) in self._tools.items():
             if metadata.category not in categories:
                 categories[metadata.category] = []
             categories[metadata.category].append(name)
         
+        self._categories_cache = (self._registry_version, categories)
         return categories
     
     def get_stats(self) -> Dict[str, Any]:
         """
         Retorna estatísticas das ferramentas registradas.
-        Função read-only pura.
+        Memoizado pela versão do registro.
         """
-        total_tools = len(self._registered_tools)
+        cached = self._stats_cache
+        if cached and cached[0] == self._registry_version:
+            return cached[1]
+        
+        total_tools = len(self._tools)
         categories = self.list_tools_by_category()
-        dangerous_tools = sum(1 for m in self._tool_metadata.values() if m.is_dangerous)
+        dangerous_tools = sum(1 for _, m in self._tools.values() if m.is_dangerous)
         
-        return {
+        stats = {
             "total_tools": total_tools,
             "categories": categories,
             "dangerous_tools": dangerous_tools,
             "tools_by_category": {cat: len(tools) for cat, tools in categories.items()}
         }
+        self._stats_cache = (self._registry_version, stats)
+        return stats
 
 # ============================================================================
 # FERRAMENTAS BÁSICAS PRÉ-DEFINIDAS
 # ============================================================================
 
+# Operadores aceitos por calculate, resolvidos uma única vez
+_BINARY_OPERATORS: Dict[type, Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPERATORS: Dict[type, Callable[[Any], Any]] = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+# Limite de tamanho (em bits) para resultados inteiros intermediários
+MAX_INT_BITS = 4096
+
+class _UnsupportedExpression(ValueError):
+    """Nó da expressão fora da aritmética permitida"""
+
+@lru_cache(maxsize=256)
+def _compile_expression(expression: str) -> ast.Expression:
+    """Parseia a expressão uma vez; chamadas repetidas reaproveitam a AST"""
+    return ast.parse(expression.strip(), mode="eval")
+
+def _check_result_size(op: Callable[[Any, Any], Any], left: Any, right: Any) -> None:
+    """
+    Estima o tamanho do resultado inteiro antes de calcular.
+    Recusa potências e produtos acima de MAX_INT_BITS (floats estouram sozinhos).
+    """
+    if type(left) is not int or type(right) is not int:
+        return
+    
+    if op is operator.pow:
+        estimated_bits = left.bit_length() * right if abs(left) > 1 else 0
+    elif op is operator.mul:
+        estimated_bits = left.bit_length() + right.bit_length()
+    else:
+        return
+    
+    if estimated_bits > MAX_INT_BITS:
+        raise ValueError(f"resultado excede {MAX_INT_BITS} bits")
+
+def _evaluate_node(node: ast.AST) -> Union[int, float]:
+    """
+    Avalia a AST percorrendo apenas números e operadores da whitelist.
+    Qualquer outro nó (nomes, chamadas, atributos) é rejeitado.
+    """
+    if isinstance(node, ast.Constant):
+        if type(node.value) in (int, float):
+            return node.value
+    elif isinstance(node, ast.BinOp):
+        op = _BINARY_OPERATORS.get(type(node.op))
+        if op is not None:
+            left = _evaluate_node(node.left)
+            right = _evaluate_node(node.right)
+            _check_result_size(op, left, right)
+            return op(left, right)
+    elif isinstance(node, ast.UnaryOp):
+        op = _UNARY_OPERATORS.get(type(node.op))
+        if op is not None:
+            return op(_evaluate_node(node.operand))
+    
+    raise _UnsupportedExpression(type(node).__name__)
+
 @tool(
     name="get_current_time",
     description="Obtém a data e hora atual",
@@ -459,27 +625,19 @@ def get_current_time() -> str:
     name="calculate",
     description="Realiza cálculos matemáticos simples",
     category="math",
-    is_dangerous=True  # eval pode ser perigoso
+    is_dangerous=True  # avalia expressões vindas do LLM
 )
 def calculate(expression: str) -> Union[float, str]:
     """
     Calcula expressões matemáticas simples.
-    ATENÇÃO: Usa eval() - apenas para demonstração!
+    Avalia apenas números e operadores aritméticos via AST (sem eval).
     """
     try:
-        # Lista de operações permitidas (segurança básica)
-        allowed_chars = set('0123456789+-*/()., ')
-        if not all(c in allowed_chars for c in expression):
-            return "Erro: Expressão contém caracteres não permitidos"
-        
-        # Evitar algumas funções perigosas
-        dangerous_keywords = ['import', 'exec', 'eval', '__', 'open', 'file']
-        if any(keyword in expression.lower() for keyword in dangerous_keywords):
-            return "Erro: Expressão contém operações não permitidas"
-        
-        result = eval(expression)
-        return float(result) if isinstance(result, (int, float)) else str(result)
+        result = _evaluate_node(_compile_expression(expression).body)
+        return float(result)
     
+    except _UnsupportedExpression:
+        return "Erro: Expressão contém operações não permitidas"
     except Exception as e:
         return f"Erro no cálculo: {str(e)}"
 
@@ -502,12 +660,13 @@ def echo(text: str, repeat: int = 1) -> str:
 )
 def count_words(text: str) -> Dict[str, Any]:
     """Conta palavras, caracteres e linhas em um texto"""
-    words = text.split()
+    # Contagens via str.count: sem alocar cópias do texto
+    character_count = len(text)
     return {
-        "word_count": len(words),
-        "character_count": len(text),
-        "character_count_no_spaces": len(text.replace(" ", "")),
-        "line_count": len(text.split("\n"))
+        "word_count": len(text.split()),
+        "character_count": character_count,
+        "character_count_no_spaces": character_count - text.count(" "),
+        "line_count": text.count("\n") + 1
     }
 
 @tool(
@@ -530,10 +689,12 @@ def format_json(json_string: str, indent: int = 2) -> str:
 )
 def generate_uuid(version: int = 4) -> str:
     """Gera UUID nas versões 1 ou 4"""
+    from uuid import uuid1, uuid4  # import tardio: só quando a ferramenta é usada
+    
     if version == 1:
-        return str(uuid.uuid1())
+        return str(uuid1())
     elif version == 4:
-        return str(uuid.uuid4())
+        return str(uuid4())
     else:
         return "Erro: Apenas versões 1 e 4 são suportadas"
 
@@ -633,14 +794,42 @@ def create_tool_call(tool_name: str, arguments: Dict[str, Any],
     Factory function para criar ToolCall.
     Função pura de criação.
     """
+    if not call_id:
+        from uuid import uuid4  # import tardio: só quando é preciso gerar id
+        call_id = str(uuid4())
+    
     return ToolCall(
-        id=call_id or str(uuid.uuid4()),
-        name=tool_name,
+        id=call_id,
+        name=sys.intern(tool_name) if type(tool_name) is str else tool_name,
         arguments=arguments,
         timestamp=datetime.utcnow()
     )
 
-def parse_function_call(function_call_data: Dict[str, Any]) -> Result:
+@lru_cache(maxsize=ARGUMENTS_CACHE_SIZE)
+def _parse_arguments(arguments_str: str) -> Tuple[bool, Any]:
+    """
+    Parseia a string JSON de argumentos com cache LRU.
+    Retorna (True, valor) ou (False, mensagem de erro); o valor não deve ser mutado.
+    """
+    try:
+        return True, loads(arguments_str)
+    except json.JSONDecodeError as e:
+        return False, str(e)
+
+def _copy_arguments(arguments: Any) -> Any:
+    """
+    Copia argumentos vindos do cache para que ferramentas possam mutá-los.
+    Cópia rasa no caso comum de valores escalares.
+    """
+    if not isinstance(arguments, dict):
+        return copy.deepcopy(arguments)
+    
+    if any(isinstance(value, (dict, list)) for value in arguments.values()):
+        return copy.deepcopy(arguments)
+    
+    return dict(arguments)
+
+def parse_function_call(function_call_data: Dict[str, Any], call_id: Optional[str] = None) -> Result:
     """
     Parseia dados de function call do formato OpenAI.
     Função pura de parsing.
@@ -652,14 +841,17 @@ def parse_function_call(function_call_data: Dict[str, Any]) -> Result:
         if not tool_name:
             return Result.error("Nome da função não fornecido")
         
-        # Parsear argumentos JSON
-        try:
-            arguments = json.loads(arguments_str) if isinstance(arguments_str, str) else arguments_str
-        except json.JSONDecodeError as e:
-            return Result.error(f"Argumentos JSON inválidos: {str(e)}")
+        # Parsear argumentos JSON (chamadas repetidas reaproveitam o cache)
+        if isinstance(arguments_str, str):
+            parsed_ok, parsed = _parse_arguments(arguments_str)
+            if not parsed_ok:
+                return Result.error(f"Argumentos JSON inválidos: {parsed}")
+            arguments = _copy_arguments(parsed)
+        else:
+            arguments = arguments_str
         
         # Criar ToolCall
-        tool_call = create_tool_call(tool_name, arguments)
+        tool_call = create_tool_call(tool_name, arguments, call_id)
         return Result.ok(tool_call)
         
     except Exception as e:
@@ -310,7 +310,7 @@ class DeployContextAgent(FunctionalAgent):
         )
         
         # Adicionar à thread
-        self.current_thread = self.current_thread.add_message(slack_message)
+        self.current_thread.append_message(slack_message)
         
         # 2. Processar via agente
         response_result = self.process_user_message(
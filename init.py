@@ -55,13 +55,16 @@ from .agent import (
     AsyncFunctionalAgent,
     AgentMiddleware,
     ContentFilterMiddleware,
-    RateLimitMiddleware
+    RateLimitMiddleware,
+    MiddlewareChain,
+    MiddlewareReject
 )
 
 # Sistema de memória
 from .memory import (
     AgentMemory,
     get_memory,
+    reset_memory,
     create_empty_thread,
     backup_memory
 )
@@ -82,6 +85,13 @@ from .context import (
     get_context_cache
 )
 
+# Cache de respostas LLM
+from .llm_cache import (
+    LLMCache,
+    get_llm_cache,
+    reset_llm_cache
+)
+
 # Sistema de ferramentas
 from .tools import (
     ToolExecutor,
@@ -272,9 +282,9 @@ Config = AgentConfig
 Builder = AgentBuilder
 
 # Funções de compatibilidade
-def create_agent(config=None, session_id=None):
-    """Alias para FunctionalAgent(config, session_id)"""
-    return FunctionalAgent(config, session_id)
+def create_agent(config=None, session_id=None, client=None):
+    """Alias para FunctionalAgent(config, session_id, client)"""
+    return FunctionalAgent(config, session_id, client)
 
 def get_default_tools():
     """Alias para get_tools()"""
@@ -295,10 +305,13 @@ __all__ = [
     "AgentMiddleware",
     "ContentFilterMiddleware",
     "RateLimitMiddleware",
+    "MiddlewareChain",
+    "MiddlewareReject",
     
     # Memória
     "AgentMemory",
     "get_memory",
+    "reset_memory",
     "create_empty_thread",
     "backup_memory",
     
@@ -316,6 +329,11 @@ __all__ = [
     "validate_thread_integrity",
     "get_context_cache",
     
+    # Cache LLM
+    "LLMCache",
+    "get_llm_cache",
+    "reset_llm_cache",
+    
     # Ferramentas
     "ToolExecutor",
     "ToolRegistry",
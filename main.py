@@ -60,6 +60,7 @@ Exemplos de uso:
   python main.py --export-config              # Exportar configuração padrão
   python main.py --backup-memory              # Fazer backup da memória
   python main.py --stats                      # Mostrar estatísticas
+  python main.py --batch prompts.jsonl        # Responder prompts em lote
 
 Variáveis de ambiente suportadas:
   OPENROUTER_API_KEY      # Chave da API (obrigatória)
@@ -126,7 +127,7 @@ Variáveis de ambiente suportadas:
     # Estratégias de contexto
     parser.add_argument(
         "--context-strategy",
-        choices=["default", "recent_only", "compressed", "minimal"],
+        choices=["default", "recent_only", "compressed", "minimal", "stable_prefix"],
         help="Estratégia de gerenciamento de contexto"
     )
     
@@ -192,6 +193,20 @@ Variáveis de ambiente suportadas:
         help="Validar ambiente e dependências"
     )
     
+    parser.add_argument(
+        "--batch",
+        type=str,
+        metavar="FILE.jsonl",
+        help="Responder em paralelo os prompts de um arquivo JSONL e sair"
+    )
+    
+    parser.add_argument(
+        "--batch-output",
+        type=str,
+        default="batch_results.jsonl",
+        help="Arquivo JSONL de saída do modo --batch (padrão: batch_results.jsonl)"
+    )
+    
     parser.add_argument(
         "--verbose", "-v",
         action="store_true",
@@ -469,6 +484,78 @@ def export_config_command(args: argparse.Namespace) -> int:
         print(f"❌ Erro ao exportar configuração: {str(e)}")
         return 1
 
+def load_batch_prompts(batch_path: str) -> Result:
+    """
+    Lê prompts de um arquivo JSONL.
+    Cada linha é uma string JSON ou um objeto com "prompt" ou "message".
+    """
+    try:
+        prompts = []
+        
+        with open(batch_path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                
+                item = json.loads(line)
+                prompt = item if isinstance(item, str) else item.get("prompt") or item.get("message")
+                
+                if not isinstance(prompt, str) or not prompt:
+                    return Result.error(f"Linha {line_number} sem prompt válido")
+                
+                prompts.append(prompt)
+        
+        return Result.ok(prompts)
+        
+    except FileNotFoundError:
+        return Result.error(f"Arquivo não encontrado: {batch_path}")
+    except (json.JSONDecodeError, AttributeError) as e:
+        return Result.error(f"Erro no JSONL de entrada: {str(e)}")
+
+def batch_command(args: argparse.Namespace, agent: FunctionalAgent) -> int:
+    """
+    Responde os prompts do arquivo --batch e grava resultados em JSONL.
+    Retorna 1 se algum prompt falhar.
+    """
+    try:
+        prompts_result = load_batch_prompts(args.batch)
+        if not prompts_result.success:
+            print(f"❌ {prompts_result.error}")
+            return 1
+        
+        prompts = prompts_result.data
+        
+        if not args.quiet:
+            print(f"📦 Processando {len(prompts)} prompts em lote...")
+        
+        results = agent.batch_process(prompts)
+        
+        with open(args.batch_output, 'w', encoding='utf-8') as f:
+            for index, (prompt, result) in enumerate(zip(prompts, results)):
+                record = {"index": index, "prompt": prompt, "success": result.success}
+                if result.success:
+                    record["response"] = result.data
+                else:
+                    record["error"] = result.error
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        
+        failed = sum(1 for result in results if not result.success)
+        
+        if not args.quiet:
+            print(f"✅ {len(results) - failed} respostas gravadas em {args.batch_output}")
+            if failed:
+                print(f"⚠️  {failed} prompts falharam")
+        
+        return 1 if failed else 0
+        
+    except Exception as e:
+        print(f"❌ Erro no processamento em lote: {str(e)}")
+        return 1
+        
+    finally:
+        agent.close()
+
 # ============================================================================
 # FUNÇÃO PRINCIPAL
 # ============================================================================
@@ -575,6 +662,10 @@ def main() -> int:
                 tools_enabled=config.enable_function_calling
             )
         
+        # Modo lote: responde o arquivo e sai
+        if args.batch:
+            return batch_command(args, agent)
+        
         # Iniciar conversa
         if not args.quiet:
             print("🚀 Iniciando agente...")
@@ -1,7 +1,11 @@
 from dataclasses import dataclass, field
-from typing import List, Dict, Any, Optional, Literal, Union
-from datetime import datetime
+from typing import List, Dict, Any, Optional, Literal, Tuple, Union
+from datetime import datetime, timezone
 import json
+import sys
+from itertools import count
+
+from agent.serialization import dumps
 
 # ============================================================================
 # TIPOS LITERAIS E ENUMS
@@ -15,17 +19,56 @@ ToolCallStatus = Literal["pending", "success", "error"]
 # MODELOS IMUTÁVEIS PRINCIPAIS
 # ============================================================================
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Message:
     """
     Representa uma mensagem imutável na conversa.
     Seguindo o padrão OpenAI ChatCompletion API.
+    Usa __slots__: sem __dict__ por instância (uma por turno/resultado).
     """
     role: MessageRole
     content: str
     timestamp: datetime = field(default_factory=datetime.utcnow)
     function_call: Optional[Dict[str, Any]] = None
     name: Optional[str] = None  # Para mensagens de função
+    content_len: int = field(init=False, repr=False, compare=False)  # len(content), calculado uma vez
+    _timestamp_iso: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    _timestamp_epoch: Optional[float] = field(default=None, init=False, repr=False, compare=False)
+    _function_call_json: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __post_init__(self) -> None:
+        # Roles vindos de JSON/SQLite são strings novas: internar torna as
+        # comparações com os literais ("system", ...) uma checagem de identidade
+        if type(self.role) is str:
+            object.__setattr__(self, "role", sys.intern(self.role))
+        
+        # Mensagem imutável: o tamanho do conteúdo nunca muda
+        object.__setattr__(self, "content_len", len(self.content) if self.content else 0)
+    
+    @property
+    def timestamp_iso(self) -> str:
+        """timestamp.isoformat(), calculado na primeira leitura"""
+        if self._timestamp_iso is None:
+            object.__setattr__(self, "_timestamp_iso", self.timestamp.isoformat())
+        return self._timestamp_iso
+    
+    @property
+    def timestamp_epoch(self) -> float:
+        """timestamp (UTC ingênuo) em segundos desde a época, calculado na primeira leitura"""
+        if self._timestamp_epoch is None:
+            object.__setattr__(
+                self, "_timestamp_epoch", self.timestamp.replace(tzinfo=timezone.utc).timestamp()
+            )
+        return self._timestamp_epoch
+    
+    @property
+    def function_call_json(self) -> Optional[str]:
+        """function_call serializado em JSON (None se ausente), calculado na primeira leitura"""
+        if self._function_call_json is None and self.function_call:
+            object.__setattr__(
+                self, "_function_call_json", dumps(self.function_call)
+            )
+        return self._function_call_json
     
     def to_dict(self) -> Dict[str, Any]:
         """Converte para dicionário compatível com OpenAI API"""
@@ -50,7 +93,7 @@ class Message:
             name=data.get("name")
         )
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ToolCall:
     """
     Representa uma chamada de ferramenta/função imutável.
@@ -62,6 +105,14 @@ class ToolCall:
     result: Optional[Any] = None
     error: Optional[str] = None
     timestamp: datetime = field(default_factory=datetime.utcnow)
+    _timestamp_iso: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    
+    @property
+    def timestamp_iso(self) -> str:
+        """timestamp.isoformat(), calculado na primeira leitura"""
+        if self._timestamp_iso is None:
+            object.__setattr__(self, "_timestamp_iso", self.timestamp.isoformat())
+        return self._timestamp_iso
     
     def to_dict(self) -> Dict[str, Any]:
         """Serializa para persistência"""
@@ -72,7 +123,7 @@ class ToolCall:
             "status": self.status,
             "result": self.result,
             "error": self.error,
-            "timestamp": self.timestamp.isoformat()
+            "timestamp": self.timestamp_iso
         }
     
     @classmethod
@@ -88,7 +139,7 @@ class ToolCall:
             timestamp=datetime.fromisoformat(data["timestamp"])
         )
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Event:
     """
     Representa um evento imutável no sistema.
@@ -119,17 +170,136 @@ class Event:
             session_id=data.get("session_id")
         )
 
-@dataclass(frozen=True)
+class _SerializedThread:
+    """
+    to_dict() incremental das listas de uma Thread.
+    Só reaproveita os dicts quando version_id avançou exatamente pelos itens
+    anexados; qualquer outra alteração (troca, edição, remoção) reserializa tudo.
+    """
+    
+    __slots__ = ("version_id", "messages", "tools_calls", "message_dicts", "tool_call_dicts")
+    
+    def __init__(self):
+        self.version_id: Optional[int] = None
+        self.messages: Optional[list] = None
+        self.tools_calls: Optional[list] = None
+        self.message_dicts: List[Dict[str, Any]] = []
+        self.tool_call_dicts: List[Dict[str, Any]] = []
+    
+    def sync(self, thread: "Thread") -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Serializa os itens novos e retorna os dicts de todos (listas internas)"""
+        new_messages = len(thread.messages) - len(self.message_dicts)
+        new_tool_calls = len(thread.tools_calls) - len(self.tool_call_dicts)
+        appended_only = (
+            self.version_id is not None
+            and thread.messages is self.messages
+            and thread.tools_calls is self.tools_calls
+            and new_messages >= 0 and new_tool_calls >= 0
+            and thread.version_id - self.version_id == new_messages + new_tool_calls
+        )
+        
+        if not appended_only:
+            self.messages, self.tools_calls = thread.messages, thread.tools_calls
+            self.message_dicts, self.tool_call_dicts = [], []
+        
+        self.message_dicts.extend(item.to_dict() for item in thread.messages[len(self.message_dicts):])
+        self.tool_call_dicts.extend(item.to_dict() for item in thread.tools_calls[len(self.tool_call_dicts):])
+        self.version_id = thread.version_id
+        
+        return self.message_dicts, self.tool_call_dicts
+
+# Fonte de Thread.instance_id
+_thread_instance_ids = count(1)
+
+@dataclass(slots=True)
 class Thread:
     """
-    Representa uma thread de conversa imutável.
+    Representa uma thread de conversa.
     Estado principal do agente - evolui através de eventos.
+    Mensagens (imutáveis) são anexadas em O(1) via append_*; version_id
+    muda a cada alteração e serve para invalidar caches derivados.
     """
     messages: List[Message] = field(default_factory=list)
     tools_calls: List[ToolCall] = field(default_factory=list)
     session_id: str = field(default_factory=lambda: f"session_{datetime.utcnow().timestamp()}")
     created_at: datetime = field(default_factory=datetime.utcnow)
     updated_at: datetime = field(default_factory=datetime.utcnow)
+    version_id: int = field(default=0, compare=False)
+    # Identidade da instância (única no processo, nunca reutilizada como id()):
+    # com version_id, identifica o conteúdo para caches compartilhados
+    instance_id: int = field(default_factory=lambda: next(_thread_instance_ids),
+                             init=False, repr=False, compare=False)
+    _iso_cache: Dict[str, Tuple[datetime, str]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    # Dicts já serializados de mensagens/tool calls (válidos enquanto version_id os acompanhar)
+    _dict_cache: Optional["_SerializedThread"] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    
+    def _cached_iso(self, attr: str) -> str:
+        """
+        isoformat() do atributo datetime, reaproveitado enquanto ele não mudar.
+        Atribuir um novo datetime invalida a entrada (comparação por identidade).
+        """
+        value = getattr(self, attr)
+        cached = self._iso_cache.get(attr)
+        if cached is None or cached[0] is not value:
+            cached = (value, value.isoformat())
+            self._iso_cache[attr] = cached
+        return cached[1]
+    
+    @property
+    def created_at_iso(self) -> str:
+        """created_at em ISO 8601 (memoizado)"""
+        return self._cached_iso("created_at")
+    
+    @property
+    def updated_at_iso(self) -> str:
+        """updated_at em ISO 8601 (memoizado até a próxima alteração)"""
+        return self._cached_iso("updated_at")
+    
+    def append_message(self, message: Message) -> None:
+        """
+        Adiciona mensagem à própria thread (append O(1)).
+        Incrementa version_id.
+        """
+        self.messages.append(message)
+        self.updated_at = datetime.utcnow()
+        self.version_id += 1
+    
+    def append_tool_call(self, tool_call: ToolCall) -> None:
+        """
+        Adiciona tool call à própria thread (append O(1)).
+        Incrementa version_id.
+        """
+        self.tools_calls.append(tool_call)
+        self.updated_at = datetime.utcnow()
+        self.version_id += 1
+    
+    @property
+    def message_count(self) -> int:
+        """Número de mensagens (O(1) independente da representação)"""
+        return len(self.messages)
+    
+    @property
+    def tool_call_count(self) -> int:
+        """Número de tool calls (O(1) independente da representação)"""
+        return len(self.tools_calls)
+    
+    def snapshot(self) -> 'Thread':
+        """
+        Cópia rasa consistente da thread (listas copiadas, itens compartilhados).
+        Segura para leitura em outra thread de execução.
+        """
+        return Thread(
+            messages=list(self.messages),
+            tools_calls=list(self.tools_calls),
+            session_id=self.session_id,
+            created_at=self.created_at,
+            updated_at=self.updated_at,
+            version_id=self.version_id
+        )
     
     def add_message(self, message: Message) -> 'Thread':
         """
@@ -138,10 +308,11 @@ class Thread:
         """
         return Thread(
             messages=self.messages + [message],
-            tools_calls=self.tools_calls,
+            tools_calls=list(self.tools_calls),
             session_id=self.session_id,
             created_at=self.created_at,
-            updated_at=datetime.utcnow()
+            updated_at=datetime.utcnow(),
+            version_id=self.version_id + 1
         )
     
     def add_tool_call(self, tool_call: ToolCall) -> 'Thread':
@@ -150,11 +321,12 @@ class Thread:
         Função pura - não modifica o estado atual.
         """
         return Thread(
-            messages=self.messages,
+            messages=list(self.messages),
             tools_calls=self.tools_calls + [tool_call],
             session_id=self.session_id,
             created_at=self.created_at,
-            updated_at=datetime.utcnow()
+            updated_at=datetime.utcnow(),
+            version_id=self.version_id + 1
         )
     
     def to_openai_format(self) -> List[Dict[str, Any]]:
@@ -172,13 +344,22 @@ class Thread:
         return self.messages[-n:] if len(self.messages) > n else self.messages
     
     def to_dict(self) -> Dict[str, Any]:
-        """Serializa thread completa"""
+        """
+        Serializa thread completa.
+        Só os itens anexados desde a última chamada são convertidos; o chamador
+        recebe cópias rasas dos dicts (alterá-las não afeta o cache).
+        """
+        if self._dict_cache is None:
+            self._dict_cache = _SerializedThread()
+        
+        message_dicts, tool_call_dicts = self._dict_cache.sync(self)
+        
         return {
-            "messages": [msg.to_dict() for msg in self.messages],
-            "tools_calls": [tc.to_dict() for tc in self.tools_calls],
+            "messages": [dict(item) for item in message_dicts],
+            "tools_calls": [dict(item) for item in tool_call_dicts],
             "session_id": self.session_id,
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat()
+            "created_at": self.created_at_iso,
+            "updated_at": self.updated_at_iso
         }
     
     @classmethod
@@ -0,0 +1,85 @@
+"""
+Configuração compartilhada do pytest.
+Torna os pacotes do projeto (agent, models) importáveis e fornece um cliente LLM falso.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+# ============================================================================
+# CLIENTE LLM FALSO (SEM REDE)
+# ============================================================================
+
+def make_completion(content="ok", usage_tokens=5, tool_calls=None):
+    """
+    Resposta no formato ChatCompletion do SDK openai.
+    tool_calls: lista de (id, nome, argumentos JSON).
+    """
+    from openai.types.chat import ChatCompletion
+    
+    message = {"role": "assistant", "content": content}
+    if tool_calls:
+        message["tool_calls"] = [
+            {"id": call_id, "type": "function", "function": {"name": name, "arguments": arguments}}
+            for call_id, name, arguments in tool_calls
+        ]
+    
+    return ChatCompletion.model_validate({
+        "id": "test", "object": "chat.completion", "created": 0, "model": "test-model",
+        "choices": [{"index": 0, "message": message,
+                     "finish_reason": "tool_calls" if tool_calls else "stop"}],
+        "usage": {"prompt_tokens": usage_tokens - 2, "completion_tokens": 2,
+                  "total_tokens": usage_tokens},
+    })
+
+class FakeCompletions:
+    """chat.completions falso: registra chamadas e devolve respostas da fila"""
+    
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+    
+    async def create(self, **params):
+        self.calls.append(params)
+        response = self.responses.pop(0) if self.responses else make_completion()
+        if callable(response):
+            response = await response(params)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+class FakeLLMClient:
+    """Substituto de AsyncOpenAI injetável em FunctionalAgent"""
+    
+    def __init__(self, responses=()):
+        self.completions = FakeCompletions(responses)
+        self.chat = self
+        self.closed = False
+    
+    async def close(self):
+        self.closed = True
+
+@pytest.fixture
+def fake_llm_client():
+    """Fábrica de clientes LLM falsos"""
+    return FakeLLMClient
+
+@pytest.fixture
+def agent_config(tmp_path):
+    """Configuração de agente isolada em banco temporário, sem streaming"""
+    from agent.agent import AgentConfig
+    
+    return AgentConfig(
+        api_key="test-key",
+        memory_db_path=str(tmp_path / "agent.db"),
+        enable_memory_persistence=False,
+        enable_streaming=False,
+        enable_llm_cache=False,
+        retry_delay_seconds=0.01
+    )
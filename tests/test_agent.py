@@ -628,14 +628,4 @@ try:
     setup_test_environment()
 except Exception:
     # Falha silenciosa se não conseguir configurar
-    pass00:00"
-    },
-    {
-        "role": "assistant", 
-        "content": "Estou bem, obrigado! Como posso ajudar você hoje?",
-        "timestamp": "2023-01-01T10:00:01"
-    },
-    {
-        "role": "user",
-        "content": "Preciso de ajuda com um cálculo matemático.",
-        "timestamp": "2023-01-01T10:
+    pass
@@ -0,0 +1,187 @@
+"""
+Testes do gerenciamento de contexto (agent/context.py).
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import agent.context as context_module
+
+from agent.context import SESSION_CONTEXT_HEADER, ContextBuilder, ContextCache, ContextManager
+from models.models import Message, Thread
+
+# ============================================================================
+# CONTEXT CACHE
+# ============================================================================
+
+def _thread(content, timestamp, session_id="session_lote"):
+    thread = Thread(
+        messages=[Message(role="user", content=content, timestamp=timestamp)],
+        session_id=session_id
+    )
+    thread.updated_at = timestamp
+    return thread
+
+class TestContextCacheKey:
+    
+    def test_same_shape_different_content_gets_different_keys(self):
+        # Regressão: threads de lote compartilham session_id e, em relógios
+        # grosseiros, timestamps; só o conteúdo as distingue
+        timestamp = datetime(2026, 1, 1, 12, 0, 0)
+        cache = ContextCache()
+        
+        first = cache.get_cache_key(_thread("pergunta A", timestamp), "default")
+        second = cache.get_cache_key(_thread("pergunta B", timestamp), "default")
+        
+        assert first != second
+    
+    def test_key_follows_thread_version(self):
+        thread = _thread("pergunta", datetime(2026, 1, 1, 12, 0, 0))
+        cache = ContextCache()
+        
+        before = cache.get_cache_key(thread, "default")
+        assert cache.get_cache_key(thread, "default") == before
+        
+        thread.append_message(Message(role="assistant", content="resposta"))
+        assert cache.get_cache_key(thread, "default") != before
+    
+    def test_key_depends_on_strategy(self):
+        thread = _thread("pergunta", datetime(2026, 1, 1, 12, 0, 0))
+        cache = ContextCache()
+        
+        assert cache.get_cache_key(thread, "default") != cache.get_cache_key(thread, "minimal")
+
+class TestPrepareContextCache:
+    
+    def test_hits_do_not_share_mutable_state(self):
+        manager = ContextManager(use_cache=False)
+        manager.cache = ContextCache()
+        thread = _conversation(1)
+        
+        first = manager.prepare_context(thread).data
+        first["messages"].append({"role": "user", "content": "injetada"})
+        first["metadata"]["roles_distribution"]["user"] = 99
+        second = manager.prepare_context(thread).data
+        second["messages"][1]["content"] = "alterada"
+        third = manager.prepare_context(thread).data
+        
+        assert [m["content"] for m in third["messages"][1:]] == [m.content for m in thread.messages]
+        assert third["metadata"]["roles_distribution"]["user"] == 2
+    
+    def test_time_since_last_message_is_recomputed_on_hit(self, monkeypatch):
+        manager = ContextManager(use_cache=False)
+        manager.cache = ContextCache()
+        thread = _conversation(1)
+        
+        manager.prepare_context(thread)
+        later = time.time() + 600
+        monkeypatch.setattr(time, "time", lambda: later)
+        metadata = manager.prepare_context(thread).data["metadata"]
+        
+        assert metadata["time_since_last_message_minutes"] >= 10
+    
+    def test_entry_expires_when_a_message_leaves_the_time_window(self, monkeypatch):
+        manager = ContextManager(use_cache=False)
+        manager.cache = ContextCache()
+        thread = Thread(session_id="s1")
+        thread.append_message(Message(role="user", content="antiga",
+                                      timestamp=datetime.utcnow() - timedelta(hours=47)))
+        thread.append_message(Message(role="user", content="nova"))
+        
+        assert len(manager.prepare_context(thread).data["messages"]) == 3
+        
+        # Duas horas depois a primeira mensagem já está fora da janela de 48h
+        future = datetime.utcnow() + timedelta(hours=2)
+        monkeypatch.setattr(time, "time", lambda: future.replace(tzinfo=timezone.utc).timestamp())
+        monkeypatch.setattr(context_module, "datetime", _FrozenDatetime(future))
+        
+        assert [m["content"] for m in manager.prepare_context(thread).data["messages"][1:]] == ["nova"]
+
+class _FrozenDatetime:
+    """Substituto de datetime com utcnow fixo"""
+    
+    def __init__(self, now):
+        self._now = now
+    
+    def utcnow(self):
+        return self._now
+    
+    def __getattr__(self, name):
+        return getattr(datetime, name)
+
+class TestMinimalStrategy:
+    
+    def test_keeps_last_five_without_system_messages(self):
+        thread = _conversation(3)
+        thread.messages.insert(-2, Message(role="system", content="aviso"))
+        
+        kept = ContextManager(use_cache=False)._minimal_strategy(thread.messages)
+        
+        assert [m.content for m in kept] == ["resposta 1", "pergunta 2", "resposta 2", "pergunta atual"]
+
+# ============================================================================
+# PREFIXO ESTÁVEL
+# ============================================================================
+
+def _conversation(turns):
+    thread = Thread(session_id="s1")
+    for index in range(turns):
+        thread.append_message(Message(role="user", content=f"pergunta {index}"))
+        thread.append_message(Message(role="assistant", content=f"resposta {index}"))
+    thread.append_message(Message(role="user", content="pergunta atual"))
+    return thread
+
+def _history(messages):
+    """Mensagens antes da que leva o contexto da sessão"""
+    return messages[:ContextBuilder.last_user_index(messages)]
+
+class TestStablePrefix:
+    
+    def test_session_context_goes_into_last_user_message(self):
+        messages = ContextBuilder().build_messages_for_llm(_conversation(2), stable_prefix=True)
+        
+        assert [message["role"] for message in messages].count("system") == 1
+        assert messages[-1]["role"] == "user"
+        assert messages[-1]["content"].startswith("pergunta atual\n\n" + SESSION_CONTEXT_HEADER)
+        assert SESSION_CONTEXT_HEADER not in "".join(m["content"] for m in messages[:-1])
+    
+    def test_thread_messages_are_not_modified(self):
+        thread = _conversation(1)
+        ContextBuilder().build_messages_for_llm(thread, stable_prefix=True)
+        
+        assert thread.messages[-1].content == "pergunta atual"
+    
+    def test_history_is_trimmed_in_steps(self):
+        builder = ContextBuilder(max_messages=8)
+        assert builder.history_trim_step == 2
+        thread = _conversation(3)
+        
+        starts = []
+        for turn in range(6):
+            messages = builder.build_messages_for_llm(thread, stable_prefix=True)
+            assert len(messages) - 1 <= builder.max_messages
+            starts.append(messages[1]["content"])
+            thread.append_message(Message(role="assistant", content=f"resposta extra {turn}"))
+        
+        # Janela deslizante mudaria o início a cada mensagem; em degraus, a cada 2
+        assert starts == ["pergunta 0", "pergunta 0", "pergunta 1", "pergunta 1", "pergunta 2", "pergunta 2"]
+    
+    def test_prefix_is_stable_within_a_step(self):
+        builder = ContextBuilder(max_messages=16)
+        thread = _conversation(8)
+        
+        first = builder.build_messages_for_llm(thread, stable_prefix=True)
+        thread.append_message(Message(role="assistant", content="resposta atual"))
+        thread.append_message(Message(role="user", content="próxima"))
+        second = builder.build_messages_for_llm(thread, stable_prefix=True)
+        
+        assert second[:len(_history(first))] == _history(first)
+    
+    def test_cache_breakpoint_precedes_session_context(self):
+        context = ContextManager(use_cache=False).prepare_context(_conversation(2), strategy="stable_prefix")
+        
+        assert context.success, context.error
+        messages = context.data["messages"]
+        (breakpoint,) = context.data["metadata"]["cache_breakpoints"]
+        assert breakpoint == len(messages) - 2
+        assert SESSION_CONTEXT_HEADER in messages[breakpoint + 1]["content"]
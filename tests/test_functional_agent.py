@@ -0,0 +1,260 @@
+"""
+Testes do loop do agente (agent/agent.py) com cliente LLM falso.
+"""
+
+import asyncio
+from dataclasses import replace
+
+import pytest
+
+from agent.agent import FunctionalAgent
+from conftest import make_completion
+
+@pytest.fixture
+def make_agent(agent_config, fake_llm_client):
+    """Fábrica de agentes com cliente falso; encerra todos ao final"""
+    agents = []
+    
+    def factory(responses=(), config=None):
+        agent = FunctionalAgent(config or agent_config, client=fake_llm_client(responses))
+        agents.append(agent)
+        return agent
+    
+    yield factory
+    
+    for agent in agents:
+        agent.close()
+
+# ============================================================================
+# INTERFACE SÍNCRONA
+# ============================================================================
+
+class TestSyncInterface:
+    
+    def test_process_user_message(self, make_agent):
+        agent = make_agent([make_completion("olá!")])
+        
+        result = agent.process_user_message("oi")
+        
+        assert result.success
+        assert result.data == "olá!"
+    
+    def test_rejects_call_inside_running_loop(self, make_agent):
+        agent = make_agent()
+        
+        async def call_sync_api():
+            return agent.process_user_message("oi")
+        
+        with pytest.raises(RuntimeError, match="process_user_message_async"):
+            asyncio.run(call_sync_api())
+        
+        assert agent._client.completions.calls == []
+
+# ============================================================================
+# ENCERRAMENTO
+# ============================================================================
+
+class TestShutdown:
+    
+    def test_closes_owned_client_after_sync_use(self, make_agent):
+        agent = make_agent([make_completion("olá!")])
+        agent._owns_client = True
+        agent.process_user_message("oi")
+        
+        agent.close()
+        
+        assert agent._client.closed
+    
+    def test_closes_owned_client_without_sync_use(self, make_agent):
+        agent = make_agent([make_completion("olá!")])
+        agent._owns_client = True
+        asyncio.run(agent.process_user_message_async("oi"))
+        
+        agent.close()
+        
+        assert agent._client.closed
+    
+    def test_closes_client_from_running_loop(self, make_agent):
+        agent = make_agent([make_completion("olá!")])
+        agent._owns_client = True
+        
+        async def use_and_shutdown():
+            await agent.process_user_message_async("oi")
+            agent.close()
+            await agent._client_close_task
+        
+        asyncio.run(use_and_shutdown())
+        
+        assert agent._client.closed
+    
+    def test_close_is_idempotent(self, make_agent):
+        agent = make_agent([make_completion("olá!")])
+        agent._owns_client = True
+        agent.process_user_message("oi")
+        
+        agent.close()
+        agent.close()
+        
+        assert agent.is_closed and agent._client.closed
+    
+    def test_context_manager_closes_agent(self, agent_config, fake_llm_client):
+        client = fake_llm_client([make_completion("olá!")])
+        
+        with FunctionalAgent(agent_config, client=client) as agent:
+            agent._owns_client = True
+            assert agent.process_user_message("oi").success
+        
+        assert agent.is_closed and client.closed
+    
+    def test_keeps_injected_client_open(self, make_agent):
+        agent = make_agent()
+        
+        agent.close()
+        
+        assert not agent._client.closed
+
+# ============================================================================
+# FERRAMENTAS
+# ============================================================================
+
+class TestToolCalls:
+    
+    def test_parallel_tool_calls_keep_order(self, make_agent):
+        agent = make_agent([make_completion("", tool_calls=[
+            ("c1", "echo", '{"text": "um"}'),
+            ("c2", "echo", '{"text": "dois", "repeat": 2}'),
+            ("c3", "count_words", '{"text": "a b c"}'),
+        ])])
+        
+        result = agent.process_user_message("use as ferramentas")
+        
+        assert result.success
+        lines = result.data.split("\n")
+        assert len(lines) == 3
+        assert "um" in lines[0] and "dois | dois" in lines[1] and "word_count" in lines[2]
+        assert [call.name for call in agent.current_thread.tools_calls] == ["echo", "echo", "count_words"]
+    
+    def test_tool_pool_bounds_concurrency(self, make_agent):
+        agent = make_agent()
+        
+        assert agent._tool_pool._max_workers == agent.config.tool_concurrency_limit
+
+# ============================================================================
+# STREAMING
+# ============================================================================
+
+def _stream(parts, fail_after=None):
+    """Stream falso de ChatCompletionChunk; fail_after levanta erro após N fragmentos"""
+    from openai.types.chat import ChatCompletionChunk
+    
+    chunks = [
+        ChatCompletionChunk.model_validate({
+            "id": "test", "object": "chat.completion.chunk", "created": 0, "model": "test-model",
+            "choices": [{"index": 0, "delta": {"content": part}, "finish_reason": None}]
+        })
+        for part in parts
+    ]
+    
+    async def generate():
+        for index, chunk in enumerate(chunks):
+            if index == fail_after:
+                raise ConnectionError("conexão perdida")
+            yield chunk
+    
+    return generate()
+
+class TestStreamingRetry:
+    
+    def test_no_retry_after_tokens_were_emitted(self, make_agent, agent_config):
+        config = replace(agent_config, enable_streaming=True, max_retries=3)
+        agent = make_agent([_stream(["Olá", ", mundo", "!"], fail_after=2),
+                            _stream(["Olá", ", mundo", "!"])], config=config)
+        tokens = []
+        
+        result = agent.process_user_message("oi", on_token=tokens.append)
+        
+        assert not result.success
+        assert "texto parcial" in result.error
+        assert tokens == ["Olá", ", mundo"]
+        assert len(agent._client.completions.calls) == 1
+    
+    def test_retries_when_nothing_was_emitted(self, make_agent, agent_config):
+        config = replace(agent_config, enable_streaming=True, max_retries=3)
+        agent = make_agent([_stream(["x"], fail_after=0), _stream(["Olá", "!"])], config=config)
+        tokens = []
+        
+        result = agent.process_user_message("oi", on_token=tokens.append)
+        
+        assert result.success
+        assert result.data == "Olá!"
+        assert tokens == ["Olá", "!"]
+        assert len(agent._client.completions.calls) == 2
+
+# ============================================================================
+# LOTE
+# ============================================================================
+
+def _echo(in_flight=None, delay=0.0):
+    """Resposta falsa que ecoa a última mensagem; in_flight registra o pico de chamadas"""
+    async def respond(params):
+        content = params["messages"][-1]["content"]
+        if in_flight is not None:
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            if in_flight is not None:
+                in_flight["now"] -= 1
+        if content == "falha":
+            return ConnectionError("serviço indisponível")
+        return make_completion("re:" + content)
+    
+    return respond
+
+class TestBatchProcess:
+    
+    def test_results_follow_input_order(self, make_agent):
+        messages = [f"m{index}" for index in range(6)]
+        agent = make_agent([_echo(delay=0.01)] * len(messages))
+        
+        results = agent.batch_process(messages)
+        
+        assert [result.data for result in results] == [f"re:{message}" for message in messages]
+    
+    def test_failure_is_isolated(self, make_agent, agent_config):
+        agent = make_agent([_echo()] * 3, config=replace(agent_config, max_retries=1))
+        
+        results = agent.batch_process(["a", "falha", "b"])
+        
+        assert [result.success for result in results] == [True, False, True]
+        assert "serviço indisponível" in results[1].error
+        assert results[2].data == "re:b"
+    
+    def test_concurrency_is_bounded(self, make_agent, agent_config):
+        in_flight = {"now": 0, "peak": 0}
+        config = replace(agent_config, batch_concurrency=2)
+        agent = make_agent([_echo(in_flight, delay=0.02)] * 6, config=config)
+        
+        results = agent.batch_process([f"m{index}" for index in range(6)])
+        
+        assert all(result.success for result in results)
+        assert in_flight["peak"] == 2
+    
+    def test_does_not_touch_current_thread(self, make_agent):
+        agent = make_agent([_echo()] * 3)
+        agent.process_user_message("conversa")
+        before = list(agent.current_thread.messages)
+        
+        agent.batch_process(["a", "b"])
+        
+        assert agent.current_thread.messages == before
+    
+    def test_each_message_gets_its_own_context(self, make_agent):
+        agent = make_agent([_echo()] * 2)
+        
+        agent.batch_process(["a", "b"])
+        
+        for call in agent._client.completions.calls:
+            user_messages = [m["content"] for m in call["messages"] if m["role"] == "user"]
+            assert len(user_messages) == 1
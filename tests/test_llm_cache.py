@@ -0,0 +1,152 @@
+"""
+Testes do cache de respostas LLM (agent/llm_cache.py).
+"""
+
+import asyncio
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+from agent.agent import FunctionalAgent
+from agent.llm_cache import LLMCache, get_llm_cache, reset_llm_cache
+from conftest import make_completion
+
+def _call_params(system_content, question="Quanto é 2+2?"):
+    return {
+        "model": "test-model",
+        "messages": [
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": question},
+        ],
+        "max_tokens": 100,
+        "temperature": 0.7,
+    }
+
+def _session_block(session_id, updated_at, message_count, **additional_context):
+    lines = ["Contexto atual da sessão:", "", "session_info:",
+             f"  session_id: {session_id}", f"  updated_at: '{updated_at}'",
+             f"  message_count: {message_count}", "  tools_used: 0"]
+    if additional_context:
+        lines.append("additional_context:")
+        lines.extend(f"  {key}: {value}" for key, value in additional_context.items())
+    return "\n".join(lines) + "\n"
+
+# ============================================================================
+# CHAVE
+# ============================================================================
+
+class TestMakeKey:
+    """A chave ignora os campos voláteis do bloco da sessão e depende do restante"""
+    
+    def test_ignores_volatile_session_fields(self):
+        first = LLMCache.make_key(_call_params(_session_block("s1", "10:00", 1)))
+        second = LLMCache.make_key(_call_params(_session_block("s1", "10:01", 3)))
+        assert first == second
+    
+    def test_depends_on_session_context(self):
+        base = LLMCache.make_key(_call_params(_session_block("s1", "10:00", 1)))
+        assert LLMCache.make_key(_call_params(_session_block("s2", "10:00", 1))) != base
+        assert LLMCache.make_key(_call_params(_session_block("s1", "10:00", 1, idioma="en"))) != base
+    
+    def test_ignores_volatile_fields_in_user_session_block(self):
+        def params(updated_at, message_count):
+            return {"model": "m", "messages": [
+                {"role": "system", "content": "prompt estável"},
+                {"role": "user", "content": "Quanto é 2+2?\n\n" + _session_block("s1", updated_at, message_count)},
+            ]}
+        
+        assert LLMCache.make_key(params("10:00", 1)) == LLMCache.make_key(params("10:05", 3))
+    
+    def test_depends_on_system_prompt_and_history(self):
+        base = LLMCache.make_key(_call_params("prompt estável"))
+        assert LLMCache.make_key(_call_params("outro prompt")) != base
+        assert LLMCache.make_key(_call_params("prompt estável", "Quanto é 3+3?")) != base
+
+# ============================================================================
+# ARMAZENAMENTO
+# ============================================================================
+
+class TestLLMCacheStorage:
+    
+    def test_reuses_one_connection(self, tmp_path):
+        cache = LLMCache(str(tmp_path / "cache.db"))
+        conn = cache._conn
+        
+        cache.set("k", "test-model", {"content": "4", "usage": {"total_tokens": 7}})
+        assert cache.get("k") == {"content": "4", "usage": {"total_tokens": 7}}
+        assert cache._conn is conn
+        assert cache.get_stats()["cached_tokens"] == 7
+        cache.close()
+    
+    def test_async_roundtrip(self, tmp_path):
+        cache = LLMCache(str(tmp_path / "cache.db"))
+        
+        async def roundtrip():
+            await cache.aset("k", "test-model", {"content": "4"})
+            return await cache.aget("k"), await cache.aget("outra")
+        
+        assert asyncio.run(roundtrip()) == ({"content": "4"}, None)
+        assert (cache.hits, cache.misses) == (1, 1)
+        cache.close()
+    
+    def test_expired_entries_are_cleaned_on_write(self, tmp_path):
+        cache = LLMCache(str(tmp_path / "cache.db"), ttl_seconds=60)
+        old = (datetime.utcnow() - timedelta(seconds=120)).isoformat()
+        with cache._get_connection() as conn:
+            conn.execute(
+                "INSERT INTO llm_cache (key, model, response, created_at) VALUES (?, ?, ?, ?)",
+                ("velha", "test-model", "{}", old)
+            )
+        
+        assert cache.get("velha") is None
+        cache._next_cleanup = 0.0
+        cache.set("nova", "test-model", {"content": "x"})
+        
+        assert cache.get_stats()["entries"] == 1
+        cache.close()
+
+class TestGetLLMCache:
+    
+    def test_other_configs_do_not_close_a_shared_instance(self, tmp_path):
+        db_path = str(tmp_path / "cache.db")
+        try:
+            first = get_llm_cache(db_path, ttl_seconds=60)
+            second = get_llm_cache(db_path, ttl_seconds=120)
+            
+            assert second is not first
+            assert get_llm_cache(db_path, ttl_seconds=60) is first
+            first.set("k", "test-model", {"content": "4"})
+            assert first.get("k") == {"content": "4"}
+        finally:
+            reset_llm_cache()
+
+# ============================================================================
+# INTEGRAÇÃO COM O AGENTE
+# ============================================================================
+
+def test_agent_hits_cache_across_turn_metadata(agent_config, fake_llm_client):
+    client = fake_llm_client([make_completion("4")])
+    agent = FunctionalAgent(replace(agent_config, enable_llm_cache=True, temperature=0.0), client=client)
+    
+    async def ask_twice():
+        first = await agent._acall_llm(_call_params(_session_block("s1", "10:00", 1))["messages"])
+        second = await agent._acall_llm(_call_params(_session_block("s1", "10:02", 3))["messages"])
+        return first, second
+    
+    first, second = asyncio.run(ask_twice())
+    
+    assert first.data["content"] == second.data["content"] == "4"
+    assert len(client.completions.calls) == 1
+
+def test_agent_skips_cache_for_sampled_answers(agent_config, fake_llm_client):
+    client = fake_llm_client([make_completion("10:00"), make_completion("10:05")])
+    agent = FunctionalAgent(replace(agent_config, enable_llm_cache=True, temperature=0.7), client=client)
+    messages = _call_params("s", "Que horas são?")["messages"]
+    
+    async def ask_twice():
+        return await agent._acall_llm(messages), await agent._acall_llm(messages)
+    
+    first, second = asyncio.run(ask_twice())
+    
+    assert (first.data["content"], second.data["content"]) == ("10:00", "10:05")
+    assert len(client.completions.calls) == 2
+    agent.close()
@@ -0,0 +1,81 @@
+"""
+Testes do logging estruturado (agent/logger.py).
+"""
+
+import logging
+import threading
+
+import pytest
+
+from agent.logger import InProcessQueueHandler, get_logger, log_operation
+
+class RecordingLogger:
+    """Captura os eventos no lugar do StructuredLogger"""
+    
+    def __init__(self):
+        self.events = []
+    
+    def log_event(self, event):
+        self.events.append((event.type, event.data))
+    
+    def log_info(self, message, **kwargs):
+        self.events.append(("system", {"message": message, **kwargs}))
+
+# ============================================================================
+# LOG_OPERATION
+# ============================================================================
+
+class TestLogOperation:
+    
+    def test_success_record_keeps_the_log_schema(self):
+        logger = RecordingLogger()
+        
+        with log_operation(logger, "salvar", "s1"):
+            pass
+        
+        ((event_type, data),) = logger.events
+        assert event_type == "system"
+        assert data["status"] == "success"
+        assert data["operation"] == "salvar"
+        assert data["duration_seconds"] >= 0
+        assert "start_time" in data
+    
+    def test_error_record_keeps_the_error_field(self):
+        logger = RecordingLogger()
+        
+        with pytest.raises(ValueError):
+            with log_operation(logger, "salvar", "s1"):
+                raise ValueError("disco cheio")
+        
+        ((event_type, data),) = logger.events
+        assert event_type == "error"
+        assert data["error"] == "disco cheio"
+        assert data["status"] == "error"
+        assert data["duration_seconds"] >= 0
+
+# ============================================================================
+# HANDLERS
+# ============================================================================
+
+class TestHandlers:
+    
+    def test_console_is_written_on_the_calling_thread(self, monkeypatch):
+        logger = get_logger()
+        console = next(
+            handler for handler in logger.logger.handlers
+            if type(handler) is logging.StreamHandler
+        )
+        emitted_on = []
+        monkeypatch.setattr(console, "emit", lambda record: emitted_on.append(threading.current_thread()))
+        
+        logger.log_error("aviso de teste")
+        
+        assert emitted_on == [threading.current_thread()]
+    
+    def test_only_the_file_handler_is_queued(self):
+        queue_handler = next(
+            handler for handler in get_logger().logger.handlers
+            if isinstance(handler, InProcessQueueHandler)
+        )
+        
+        assert [type(handler).__name__ for handler in queue_handler.listener.handlers] == ["BufferedFileHandler"]
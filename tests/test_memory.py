@@ -0,0 +1,296 @@
+"""
+Testes da memória persistente (agent/memory.py).
+"""
+
+import gc
+import sqlite3
+import threading
+
+import pytest
+
+from agent.memory import AgentMemory, BackgroundThreadWriter, get_memory, reset_memory
+from models.models import Message, Thread
+
+@pytest.fixture
+def memory(tmp_path):
+    """AgentMemory isolada em banco temporário"""
+    instance = AgentMemory(str(tmp_path / "memory.db"))
+    yield instance
+    instance.close()
+
+def _save(memory, session_id, *contents):
+    thread = Thread(session_id=session_id)
+    for index, content in enumerate(contents):
+        thread.append_message(Message(role="user" if index % 2 == 0 else "assistant", content=content))
+    assert memory.save_thread(thread).success
+    return thread
+
+def _contents(result):
+    assert result.success, result.error
+    return sorted(row["content"] for row in result.data)
+
+# ============================================================================
+# SALVAMENTO INCREMENTAL
+# ============================================================================
+
+def _message_rows(memory, session_id):
+    with memory._get_connection() as conn:
+        return [tuple(row) for row in conn.execute(
+            "SELECT id, role, content FROM messages WHERE session_id = ? ORDER BY id",
+            (session_id,)
+        )]
+
+class TestIncrementalSave:
+    
+    def test_second_save_appends_only_new_messages(self, memory):
+        thread = _save(memory, "s1", "primeira", "segunda")
+        before = _message_rows(memory, "s1")
+        
+        thread.append_message(Message(role="user", content="terceira"))
+        assert memory.save_thread(thread).success
+        
+        after = _message_rows(memory, "s1")
+        # Linhas antigas mantêm o id: nada foi apagado e regravado
+        assert after[:2] == before
+        assert [row[2] for row in after] == ["primeira", "segunda", "terceira"]
+    
+    def test_unchanged_thread_writes_nothing(self, memory):
+        thread = _save(memory, "s1", "única")
+        before = _message_rows(memory, "s1")
+        
+        assert memory.save_thread(thread).success
+        
+        assert _message_rows(memory, "s1") == before
+    
+    def test_diverging_history_is_rewritten(self, memory):
+        _save(memory, "s1", "antiga", "resposta antiga")
+        
+        # Mesma sessão, histórico diferente (ex.: thread recriada)
+        _save(memory, "s1", "nova", "resposta nova", "mais uma")
+        
+        assert [row[2] for row in _message_rows(memory, "s1")] == ["nova", "resposta nova", "mais uma"]
+    
+    def test_shorter_history_is_rewritten(self, memory):
+        _save(memory, "s1", "a", "b", "c")
+        _save(memory, "s1", "a")
+        
+        assert [row[2] for row in _message_rows(memory, "s1")] == ["a"]
+    
+    def test_force_rewrites_all_rows(self, memory):
+        thread = _save(memory, "s1", "primeira", "segunda")
+        before = _message_rows(memory, "s1")
+        
+        assert memory.save_thread(thread, force=True).success
+        
+        after = _message_rows(memory, "s1")
+        assert [row[1:] for row in after] == [row[1:] for row in before]
+        assert after[0][0] > before[-1][0]
+    
+    def test_load_roundtrip_after_appends(self, memory):
+        thread = _save(memory, "s1", "primeira")
+        for content in ("segunda", "terceira"):
+            thread.append_message(Message(role="assistant", content=content))
+            assert memory.save_thread(thread).success
+        
+        result = memory.load_thread("s1")
+        
+        assert result.success, result.error
+        assert [(m.role, m.content) for m in result.data.messages] == [
+            (m.role, m.content) for m in thread.messages
+        ]
+
+# ============================================================================
+# BUSCA FTS5
+# ============================================================================
+
+class TestFullTextSearch:
+    
+    def test_fts_index_is_used(self, memory):
+        assert memory._fts_enabled
+        _save(memory, "s1", "o gato subiu no telhado", "cachorro latindo")
+        
+        assert _contents(memory.search_messages("gato")) == ["o gato subiu no telhado"]
+    
+    def test_matches_substrings_case_insensitively(self, memory):
+        _save(memory, "s1", "Paralelepípedo", "outra coisa")
+        
+        assert _contents(memory.search_messages("LELEP")) == ["Paralelepípedo"]
+    
+    @pytest.mark.parametrize("query, expected", [
+        ('diga "olá"', ['ele disse: diga "olá" agora']),
+        ("gato AND cão", ["gato AND cão juntos"]),
+        ("NEAR(a b)", ["texto com NEAR(a b) literal"]),
+        ("pre*", ["pre* com asterisco"]),
+        ("col:valor", ["col:valor literal"]),
+    ])
+    def test_query_syntax_is_literal(self, memory, query, expected):
+        # Operadores FTS5 na consulta do usuário não podem quebrar nem ampliar a busca
+        _save(memory, "s1", 'ele disse: diga "olá" agora', "gato AND cão juntos", "gato e cão",
+              "texto com NEAR(a b) literal", "pre* com asterisco", "prefixo", "col:valor literal")
+        
+        assert _contents(memory.search_messages(query)) == expected
+    
+    def test_filters_by_session(self, memory):
+        _save(memory, "s1", "gato da sessão um")
+        _save(memory, "s2", "gato da sessão dois")
+        
+        assert _contents(memory.search_messages("gato", session_id="s2")) == ["gato da sessão dois"]
+    
+    def test_short_query_falls_back_to_like(self, memory):
+        _save(memory, "s1", "ok", "nada")
+        
+        assert _contents(memory.search_messages("ok")) == ["ok"]
+    
+    def test_deleted_threads_leave_the_index(self, memory):
+        _save(memory, "s1", "gato removido")
+        assert memory.delete_thread("s1").success
+        
+        assert _contents(memory.search_messages("gato")) == []
+    
+    def test_long_content_is_truncated_in_results(self, memory):
+        _save(memory, "s1", "gato " + "x" * 300)
+        
+        (row,) = memory.search_messages("gato").data
+        assert len(row["content"]) == 203 and row["content"].endswith("...")
+
+# ============================================================================
+# BUSCA: PREFIXO E SUBSTRING
+# ============================================================================
+
+class TestPrefixAndSubstringSearch:
+    
+    def test_no_full_text_btree_index(self, memory):
+        with memory._get_connection() as conn:
+            indexes = {row["name"] for row in conn.execute("PRAGMA index_list(messages)")}
+        
+        assert "idx_messages_content" not in indexes
+    
+    def test_prefix_matches_only_start_of_content(self, memory):
+        _save(memory, "s1", "Gato subiu no telhado", "o gato dormiu", "gatos e cães")
+        
+        assert _contents(memory.search_messages("gato", match_mode="prefix")) == [
+            "Gato subiu no telhado", "gatos e cães"
+        ]
+    
+    def test_substring_matches_anywhere(self, memory):
+        _save(memory, "s1", "Gato subiu no telhado", "o gato dormiu", "cachorro")
+        
+        assert _contents(memory.search_messages("gato", match_mode="substring")) == [
+            "Gato subiu no telhado", "o gato dormiu"
+        ]
+    
+    def test_short_prefix_falls_back_to_like(self, memory):
+        _save(memory, "s1", "ok, feito", "tudo ok")
+        
+        assert _contents(memory.search_messages("ok", match_mode="prefix")) == ["ok, feito"]
+    
+    def test_prefix_wildcards_are_literal(self, memory):
+        _save(memory, "s1", "100% certo", "1000 vezes", "a_b_c", "abbc")
+        
+        assert _contents(memory.search_messages("100%", match_mode="prefix")) == ["100% certo"]
+        assert _contents(memory.search_messages("a_b", match_mode="prefix")) == ["a_b_c"]
+
+# ============================================================================
+# CONEXÕES DE LEITURA
+# ============================================================================
+
+def _read_in_thread(memory):
+    """Faz uma leitura numa thread nova e devolve a conexão que ela usou"""
+    used = []
+    
+    def read():
+        assert memory.load_thread("s1").success
+        used.append(memory._local.slot.conn)
+    
+    worker = threading.Thread(target=read)
+    worker.start()
+    worker.join()
+    return used[0]
+
+def _is_closed(conn):
+    try:
+        conn.execute("SELECT 1")
+    except sqlite3.ProgrammingError:
+        return True
+    return False
+
+class TestReaderConnections:
+    
+    def test_reader_is_closed_when_its_thread_ends(self, memory):
+        _save(memory, "s1", "olá")
+        
+        conn = _read_in_thread(memory)
+        gc.collect()
+        
+        assert _is_closed(conn)
+        assert conn not in memory._reader_conns
+    
+    def test_close_closes_every_reader(self, memory):
+        _save(memory, "s1", "olá")
+        assert memory.load_thread("s1").success
+        conn = memory._local.slot.conn
+        
+        memory.close()
+        
+        assert _is_closed(conn)
+        assert not memory._reader_conns
+    
+    def test_close_is_idempotent(self, memory):
+        memory.close()
+        memory.close()
+
+# ============================================================================
+# INSTÂNCIAS COMPARTILHADAS
+# ============================================================================
+
+class TestResetMemory:
+    
+    def test_reset_closes_cached_instances(self, tmp_path):
+        db_path = str(tmp_path / "memory.db")
+        memory = get_memory(db_path)
+        assert get_memory(db_path) is memory
+        
+        reset_memory()
+        
+        assert memory._closed
+        assert not memory._event_writer.is_alive()
+        fresh = get_memory(db_path)
+        try:
+            assert fresh is not memory
+            assert fresh.save_thread(Thread(session_id="s1")).success
+        finally:
+            reset_memory()
+
+# ============================================================================
+# GRAVAÇÃO EM SEGUNDO PLANO
+# ============================================================================
+
+class TestBackgroundThreadWriter:
+    
+    def test_close_drains_pending_snapshots(self, memory):
+        writer = BackgroundThreadWriter(memory, flush_interval=0.01)
+        thread = Thread(session_id="s1")
+        thread.append_message(Message(role="user", content="olá"))
+        
+        writer.submit(thread.snapshot())
+        writer.close()
+        writer.close()  # idempotente
+        
+        assert memory.load_thread("s1").data.message_count == 1
+    
+    def test_submit_after_close_saves_synchronously(self, memory):
+        writer = BackgroundThreadWriter(memory, flush_interval=0.01)
+        writer.close()
+        thread = Thread(session_id="s2")
+        thread.append_message(Message(role="user", content="tarde demais"))
+        
+        writer.submit(thread)
+        
+        assert memory.load_thread("s2").data.messages[0].content == "tarde demais"
+    
+    def test_events_are_visible_after_flush(self, memory):
+        _save(memory, "s3", "olá")
+        
+        events = memory.get_events(session_id="s3").data
+        
+        assert [event["data"]["action"] for event in events] == ["thread_saved"]
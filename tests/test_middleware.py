@@ -0,0 +1,210 @@
+"""
+Testes da cadeia de middlewares pré-composta (agent/agent.py).
+"""
+
+import pytest
+
+from agent.agent import (
+    AgentBuilder, AgentMiddleware, ContentFilterMiddleware, FunctionalAgent,
+    MiddlewareChain, MiddlewareReject, RateLimitMiddleware
+)
+from models.models import Result
+from conftest import make_completion
+
+class Suffix(AgentMiddleware):
+    """Middleware rápido que acrescenta um sufixo à mensagem e à resposta"""
+    
+    def __init__(self, suffix, calls=None):
+        self.suffix = suffix
+        self.calls = calls if calls is not None else []
+    
+    def before_user_message_fast(self, message, session_id):
+        self.calls.append(("before", self.suffix))
+        return message + self.suffix
+    
+    def after_user_message_fast(self, message, response, session_id):
+        self.calls.append(("after", self.suffix))
+        return response + self.suffix
+
+class LegacyUpper(AgentMiddleware):
+    """Middleware antigo, que só sobrescreve o hook Result"""
+    
+    def before_user_message(self, message, session_id):
+        if message == "proibido":
+            return Result.error("recusado pelo legado")
+        return Result.ok(message.upper())
+
+class TagMessages(AgentMiddleware):
+    """before_llm_call que marca a última mensagem; para com erro se pedido"""
+    
+    def __init__(self, tag, fail=False, calls=None):
+        self.tag = tag
+        self.fail = fail
+        self.calls = calls if calls is not None else []
+    
+    def before_llm_call(self, messages, session_id):
+        self.calls.append(self.tag)
+        if self.fail:
+            return Result.error(f"falha em {self.tag}")
+        tagged = dict(messages[-1], content=messages[-1]["content"] + self.tag)
+        return Result.ok(messages[:-1] + [tagged])
+
+class RecordErrors(AgentMiddleware):
+    
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+    
+    def on_error(self, error, context, session_id):
+        self.calls.append((self.name, context))
+
+@pytest.fixture
+def make_agent(agent_config, fake_llm_client):
+    """Fábrica de agentes com middlewares e cliente falso"""
+    agents = []
+    
+    def factory(middlewares, responses=()):
+        agent = FunctionalAgent(agent_config, client=fake_llm_client(responses))
+        agent.use_middlewares(middlewares)
+        agents.append(agent)
+        return agent
+    
+    yield factory
+    
+    for agent in agents:
+        agent.close()
+
+# ============================================================================
+# COMPILAÇÃO
+# ============================================================================
+
+class TestCompile:
+    
+    def test_empty_chain_has_no_hooks(self):
+        assert MiddlewareChain.compile([]) == MiddlewareChain()
+    
+    def test_inherited_hooks_are_skipped(self):
+        chain = MiddlewareChain.compile([ContentFilterMiddleware(["ruim"])])
+        
+        assert chain.before_user_message is not None
+        assert chain.after_user_message is not None
+        assert chain.before_llm_call is None
+        assert chain.after_llm_call is None
+        assert chain.on_tool_execution is None
+        assert chain.on_error is None
+    
+    def test_fast_hooks_run_in_registration_order(self):
+        calls = []
+        chain = MiddlewareChain.compile([Suffix("-a", calls), Suffix("-b", calls)])
+        
+        assert chain.before_user_message("msg", "s") == "msg-a-b"
+        assert chain.after_user_message("resp", "msg", "s") == "resp-a-b"
+        assert calls == [("before", "-a"), ("before", "-b"), ("after", "-a"), ("after", "-b")]
+    
+    def test_none_keeps_value_unchanged(self):
+        chain = MiddlewareChain.compile([ContentFilterMiddleware(["ruim"]), Suffix("!")])
+        
+        assert chain.before_user_message("tudo certo", "s") == "tudo certo!"
+    
+    def test_legacy_result_hook_is_adapted(self):
+        chain = MiddlewareChain.compile([LegacyUpper(), Suffix("!")])
+        
+        assert chain.before_user_message("oi", "s") == "OI!"
+        with pytest.raises(MiddlewareReject, match="recusado pelo legado"):
+            chain.before_user_message("proibido", "s")
+    
+    def test_result_hooks_stop_at_first_error(self):
+        calls = []
+        chain = MiddlewareChain.compile([
+            TagMessages("-a", calls=calls),
+            TagMessages("-b", fail=True, calls=calls),
+            TagMessages("-c", calls=calls),
+        ])
+        
+        result = chain.before_llm_call([{"role": "user", "content": "oi"}], "s")
+        
+        assert not result.success
+        assert result.error == "falha em -b"
+        assert calls == ["-a", "-b"]
+    
+    def test_result_hooks_thread_values(self):
+        chain = MiddlewareChain.compile([TagMessages("-a"), TagMessages("-b")])
+        
+        result = chain.before_llm_call([{"role": "user", "content": "oi"}], "s")
+        
+        assert result.data == [{"role": "user", "content": "oi-a-b"}]
+    
+    def test_notification_hooks_fan_out(self):
+        calls = []
+        chain = MiddlewareChain.compile([RecordErrors("um", calls), Suffix("!"), RecordErrors("dois", calls)])
+        
+        chain.on_error(ValueError("x"), "contexto", "s")
+        
+        assert calls == [("um", "contexto"), ("dois", "contexto")]
+
+# ============================================================================
+# INTEGRAÇÃO COM O AGENTE
+# ============================================================================
+
+class TestAgentMiddleware:
+    
+    def test_content_filter_rejects_before_llm_call(self, make_agent):
+        agent = make_agent([ContentFilterMiddleware(["segredo"])])
+        
+        result = agent.process_user_message("conte o SEGREDO")
+        
+        assert not result.success
+        assert result.error == "Mensagem contém conteúdo não permitido"
+        assert agent._client.completions.calls == []
+        assert agent.current_thread.messages == []
+    
+    def test_content_filter_replaces_blocked_response(self, make_agent):
+        agent = make_agent([ContentFilterMiddleware(["segredo"])], [make_completion("o segredo é 42")])
+        
+        result = agent.process_user_message("qual é?")
+        
+        assert result.success
+        assert result.data == "Desculpe, não posso fornecer essa informação."
+        assert agent.current_thread.messages[-1].content == result.data
+    
+    def test_hooks_shape_the_llm_request(self, make_agent):
+        agent = make_agent([Suffix("-a"), TagMessages("-llm")], [make_completion("resposta")])
+        
+        result = agent.process_user_message("oi")
+        
+        (call,) = agent._client.completions.calls
+        assert call["messages"][-1]["content"] == "oi-a-llm"
+        assert result.data == "resposta-a"
+    
+    def test_before_llm_error_is_returned(self, make_agent):
+        agent = make_agent([TagMessages("-x", fail=True)])
+        
+        result = agent.process_user_message("oi")
+        
+        assert not result.success
+        assert "falha em -x" in result.error
+        assert agent._client.completions.calls == []
+    
+    def test_rate_limit_rejects_over_limit(self, make_agent):
+        agent = make_agent([RateLimitMiddleware(max_requests_per_minute=1)])
+        
+        assert agent.process_user_message("primeira").success
+        result = agent.process_user_message("segunda")
+        
+        assert not result.success
+        assert "Limite: 1/minuto" in result.error
+
+class TestBuilder:
+    
+    def test_build_installs_middlewares(self, agent_config):
+        agent = (AgentBuilder()
+                 .with_api_key("test-key")
+                 .with_memory_persistence(False, agent_config.memory_db_path)
+                 .with_content_filter(["segredo"])
+                 .build())
+        
+        try:
+            assert len(agent.middlewares) == 1
+            assert agent._middleware.before_user_message is not None
+        finally:
+            agent.close()
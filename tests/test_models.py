@@ -0,0 +1,86 @@
+"""
+Testes dos modelos de dados (models/models.py).
+"""
+
+from agent.serialization import dumps, loads
+from models.models import Message, Thread, ToolCall
+
+def _thread(*contents):
+    thread = Thread(session_id="s1")
+    for content in contents:
+        thread.append_message(Message(role="user", content=content))
+    return thread
+
+def _contents(data):
+    return [message["content"] for message in data["messages"]]
+
+# ============================================================================
+# SERIALIZAÇÃO INCREMENTAL
+# ============================================================================
+
+class TestThreadToDict:
+    
+    def test_appends_are_serialized_incrementally(self):
+        thread = _thread("a", "b")
+        first = thread.to_dict()
+        cached = thread._dict_cache.message_dicts[0]
+        
+        thread.append_message(Message(role="assistant", content="c"))
+        thread.append_tool_call(ToolCall(id="t1", name="echo", arguments={}))
+        second = thread.to_dict()
+        
+        assert _contents(first) == ["a", "b"]
+        assert _contents(second) == ["a", "b", "c"]
+        assert [call["id"] for call in second["tools_calls"]] == ["t1"]
+        assert thread._dict_cache.message_dicts[0] is cached
+    
+    def test_edit_in_the_middle_is_reserialized(self):
+        thread = _thread("a", "b", "c")
+        thread.to_dict()
+        
+        thread.messages[1] = Message(role="user", content="B")
+        thread.version_id += 1
+        
+        assert _contents(thread.to_dict()) == ["a", "B", "c"]
+    
+    def test_append_without_version_bump_is_reserialized(self):
+        thread = _thread("a", "b")
+        thread.to_dict()
+        
+        thread.messages[0] = Message(role="user", content="A")
+        thread.messages.append(Message(role="user", content="c"))
+        
+        assert _contents(thread.to_dict()) == ["A", "b", "c"]
+    
+    def test_replaced_list_is_reserialized(self):
+        thread = _thread("a", "b")
+        thread.to_dict()
+        
+        thread.messages = [Message(role="user", content="x")]
+        
+        assert _contents(thread.to_dict()) == ["x"]
+    
+    def test_callers_get_copies(self):
+        thread = _thread("a")
+        
+        data = thread.to_dict()
+        data["messages"][0]["content"] = "alterado"
+        data["messages"].append({"role": "user", "content": "extra"})
+        
+        assert _contents(thread.to_dict()) == ["a"]
+
+# ============================================================================
+# FUNCTION_CALL_JSON
+# ============================================================================
+
+class TestFunctionCallJson:
+    
+    def test_uses_the_shared_serializer(self):
+        call = {"name": "buscar", "arguments": {"termo": "ação"}}
+        message = Message(role="assistant", content="", function_call=call)
+        
+        assert message.function_call_json == dumps(call)
+        assert loads(message.function_call_json) == call
+    
+    def test_absent_call_is_none(self):
+        assert Message(role="user", content="oi").function_call_json is None
@@ -0,0 +1,100 @@
+"""
+Testes do sistema de ferramentas (agent/tools.py).
+"""
+
+import time
+
+import pytest
+
+from agent.tools import calculate, MAX_INT_BITS, ToolMetadata, ToolParameter
+
+# ============================================================================
+# VALIDAÇÃO DE ARGUMENTOS
+# ============================================================================
+
+@pytest.fixture
+def metadata():
+    return ToolMetadata(
+        name="teste",
+        description="Ferramenta de teste",
+        parameters=[
+            ToolParameter("quantidade", "number", "Quantidade"),
+            ToolParameter("modo", "string", "Modo", required=False, enum=["rápido", "lento"]),
+            ToolParameter("itens", "array", "Itens", required=False),
+            ToolParameter("filtro", "object", "Filtro", required=False, enum=[{"a": 1}, "todos"]),
+        ]
+    )
+
+class TestValidateArguments:
+    
+    def test_valid_arguments(self, metadata):
+        assert metadata.validate_arguments({"quantidade": 2, "modo": "lento", "itens": []}).success
+    
+    def test_missing_and_unknown(self, metadata):
+        result = metadata.validate_arguments({"extra": 1})
+        
+        assert result.error == "Parâmetros obrigatórios faltando: quantidade; Parâmetros desconhecidos: extra"
+    
+    def test_type_and_enum_errors(self, metadata):
+        result = metadata.validate_arguments({"quantidade": "2", "modo": "médio", "itens": {}})
+        
+        assert result.error == (
+            "Parâmetro 'quantidade': deve ser um número; "
+            "Parâmetro 'modo': deve ser um dos valores: ['rápido', 'lento']; "
+            "Parâmetro 'itens': deve ser um array"
+        )
+    
+    def test_unhashable_enum_values(self, metadata):
+        assert metadata.validate_arguments({"quantidade": 1, "filtro": {"a": 1}}).success
+        assert not metadata.validate_arguments({"quantidade": 1, "filtro": [1]}).success
+
+# ============================================================================
+# CALCULADORA (AVALIADOR AST)
+# ============================================================================
+
+class TestCalculate:
+    """Avaliação de expressões pela whitelist de nós AST"""
+    
+    @pytest.mark.parametrize("expression, expected", [
+        ("2+3*4", 14.0),
+        (" (1.5-0.5)/2", 0.5),
+        ("-2**3", -8.0),
+        ("7//2", 3.0),
+        ("2**-1", 0.5),
+        ("9**999 // 9**998", 9.0),
+    ])
+    def test_arithmetic(self, expression, expected):
+        assert calculate(expression) == expected
+    
+    @pytest.mark.parametrize("expression", [
+        '__import__("os")',
+        "abs(1)",
+        "x + 1",
+        "1,2",
+        "True+1",
+        "'a'*3",
+        "1 << 2",
+    ])
+    def test_rejects_non_arithmetic(self, expression):
+        assert calculate(expression) == "Erro: Expressão contém operações não permitidas"
+    
+    def test_syntax_and_runtime_errors(self):
+        assert calculate("1 +").startswith("Erro no cálculo:")
+        assert calculate("1/0") == "Erro no cálculo: division by zero"
+    
+    @pytest.mark.parametrize("expression", [
+        "9**9**9",
+        "((9**999)**999)**999",
+        "(2**4000)*(2**4000)",
+        "(7**1000)**10",
+    ])
+    def test_bounds_large_integer_results(self, expression):
+        # Regressão: potências aninhadas não podem travar o loop do agente
+        started = time.perf_counter()
+        result = calculate(expression)
+        
+        assert result == f"Erro no cálculo: resultado excede {MAX_INT_BITS} bits"
+        assert time.perf_counter() - started < 1.0
+    
+    def test_float_overflow_is_reported(self):
+        assert calculate("1.5**100000").startswith("Erro no cálculo:")